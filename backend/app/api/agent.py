@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, status
+
+from app.models.request import AgentSessionCreateRequest, AgentTurnRequest
+from app.models.response import AgentSessionResponse, AgentTurnResponse
+from app.core.config import settings
+from app.services.agent_session_service import AgentSessionService
+from app.api.auth import get_current_user_payload
+from app.api.llm import llm_service
+from app.utils.disconnect import CancelOnDisconnectRoute
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Stop an agent turn's LLM call when the client goes away; the session only advances on success
+router = APIRouter(route_class=CancelOnDisconnectRoute)
+
+# Initialize service
+agent_session_service = AgentSessionService(
+    llm_service=llm_service,
+    ttl_seconds=settings.AGENT_SESSION_TTL_SECONDS,
+    max_sessions=settings.AGENT_SESSION_MAX_SESSIONS,
+    context_cache_min_chars=settings.AGENT_SESSION_CONTEXT_CACHE_MIN_CHARS,
+    context_cache_timeout=settings.AGENT_SESSION_CONTEXT_CACHE_TIMEOUT_SECONDS
+)
+
+
+@router.post("/sessions", response_model=AgentSessionResponse, status_code=status.HTTP_201_CREATED,
+             summary="Open an agent session")
+async def create_agent_session_endpoint(
+    request: AgentSessionCreateRequest,
+    user: dict = Depends(get_current_user_payload)
+):
+    """
+    Open an agent session. The task, file context and instructions are sent
+    once here and reused by every later turn.
+    """
+    session = await agent_session_service.create_session(user["user_id"], request)
+    return AgentSessionResponse(
+        session_id=session.session_id,
+        context_cached=bool(session.cached_content),
+        expires_in=settings.AGENT_SESSION_TTL_SECONDS
+    )
+
+
+@router.post("/sessions/{session_id}/turns", response_model=AgentTurnResponse, summary="Run one agent step")
+async def agent_turn_endpoint(
+    session_id: str,
+    request: AgentTurnRequest,
+    user: dict = Depends(get_current_user_payload)
+):
+    """
+    Run one agent step. Send the full page_state on the first turn and after
+    navigation; otherwise send page_state_edits against the previous turn
+    together with the page_state_hash it returned as base_hash.
+    """
+    logger.info("Received agent turn for session %s", session_id)
+    reply, session = await agent_session_service.run_turn(session_id, user["user_id"], request)
+    return AgentTurnResponse(reply=reply, turn=session.turn, page_state_hash=session.page_state_hash)
+
+
+@router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Close an agent session")
+async def close_agent_session_endpoint(
+    session_id: str,
+    user: dict = Depends(get_current_user_payload)
+):
+    await agent_session_service.close_session(session_id, user["user_id"])
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+
+from app.models.request import AgentSessionCreateRequest, AgentTurnRequest
+from app.core.config import settings
+from app.core.metrics import AGENT_WS_CONNECTIONS_ACTIVE, AGENT_WS_MESSAGES, AGENT_WS_CLOSES
+from app.api.auth import app_security
+from app.api.agent import agent_session_service
+from app.services.agent_session_service import AgentSessionService
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+# Protocol close code for a data type the endpoint does not accept (RFC 6455 section 7.4.1)
+WS_CLOSE_UNSUPPORTED_DATA = 1003
+
+# Application close codes (4000-4999 are reserved for applications)
+WS_CLOSE_UNAUTHORIZED = 4401
+WS_CLOSE_IDLE_TIMEOUT = 4408
+WS_CLOSE_HEARTBEAT_TIMEOUT = 4409
+WS_CLOSE_SLOW_CONSUMER = 4429
+
+CLIENT_MESSAGE_TYPES = {"auth", "open", "turn", "cancel", "ping", "pong"}
+
+
+class SlowConsumerError(Exception):
+    """The client is not reading messages fast enough."""
+    pass
+
+
+async def receive_text_frame(websocket: WebSocket) -> Optional[str]:
+    """
+    Wait for the next frame and return its text, or None for a binary frame.
+
+    Raises:
+        WebSocketDisconnect: If the client went away.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    return message.get("text")
+
+
+def utf8_length_exceeds(text: str, limit: int) -> bool:
+    """Whether the text is more than `limit` bytes as UTF-8, encoding it only when the length alone cannot tell."""
+    if len(text) > limit:
+        return True
+    if len(text) * 4 <= limit:
+        return False
+    return len(text.encode("utf-8")) > limit
+
+
+class AgentConnection:
+    """
+    One authenticated agent WebSocket connection.
+
+    Outbound messages go through a bounded queue drained by a single sender
+    task. When the client stops reading, the queue fills, the model stream
+    stops being consumed (pausing upstream reads) and, after a send timeout,
+    the connection is closed. Only one open or turn runs at a time, in its
+    own task; inbound messages are still read while it runs so pings and
+    cancels are handled.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, session_service: AgentSessionService):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.session_service = session_service
+        self.session_id: Optional[str] = None
+        self.last_received = time.monotonic()  # any client message, including pongs
+        self.last_activity = time.monotonic()  # last open/turn/cancel or finished turn
+        self._outbound: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self._turn_task: Optional[asyncio.Task] = None
+        self._close_code: Optional[int] = None
+        self._close_reason = ""
+        self._closed = False
+
+    async def run(self) -> None:
+        sender = asyncio.create_task(self._send_loop())
+        watchdog = asyncio.create_task(self._watchdog_loop())
+        try:
+            await self.send({"type": "ready", "user_id": self.user_id})
+            await self._receive_loop()
+        except (WebSocketDisconnect, SlowConsumerError, asyncio.CancelledError):
+            pass
+        finally:
+            self._closed = True
+            tasks = [task for task in (self._turn_task, watchdog, sender) if task]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._close_session()
+            if self._close_code is not None:
+                AGENT_WS_CLOSES.labels(reason=self._close_reason).inc()
+                try:
+                    await self.websocket.close(code=self._close_code, reason=self._close_reason)
+                except Exception:
+                    pass
+            else:
+                AGENT_WS_CLOSES.labels(reason="client").inc()
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        """Queue a message for the client, applying backpressure when the client falls behind."""
+        try:
+            await asyncio.wait_for(self._outbound.put(message), timeout=settings.WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Agent WebSocket client for user {self.user_id} is not reading; closing")
+            self._request_close(WS_CLOSE_SLOW_CONSUMER, "slow_consumer")
+            raise SlowConsumerError()
+
+    def _request_close(self, code: int, reason: str) -> None:
+        if self._close_code is None:
+            self._close_code = code
+            self._close_reason = reason
+
+    async def _send_loop(self) -> None:
+        while True:
+            message = await self._outbound.get()
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+            AGENT_WS_MESSAGES.labels(direction="out", type=message["type"]).inc()
+
+    async def _watchdog_loop(self) -> None:
+        """Send heartbeats and close the connection when the client is gone or idle."""
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_INTERVAL_SECONDS)
+            now = time.monotonic()
+            turn_running = self._turn_task is not None and not self._turn_task.done()
+
+            if now - self.last_received > settings.WS_HEARTBEAT_TIMEOUT_SECONDS:
+                logger.info(f"Agent WebSocket for user {self.user_id} missed heartbeats; closing")
+                self._request_close(WS_CLOSE_HEARTBEAT_TIMEOUT, "heartbeat_timeout")
+            elif not turn_running and now - self.last_activity > settings.WS_IDLE_TIMEOUT_SECONDS:
+                logger.info(f"Agent WebSocket for user {self.user_id} idle; closing")
+                self._request_close(WS_CLOSE_IDLE_TIMEOUT, "idle_timeout")
+            else:
+                try:
+                    await self.send({"type": "ping"})
+                    continue
+                except SlowConsumerError:
+                    pass
+
+            # Closing the socket makes the pending receive raise, which ends the receive loop
+            await self._close_socket()
+            return
+
+    async def _close_socket(self) -> None:
+        try:
+            await self.websocket.close(code=self._close_code, reason=self._close_reason)
+        except Exception:
+            pass
+
+    async def _receive_loop(self) -> None:
+        while self._close_code is None:
+            try:
+                raw = await receive_text_frame(self.websocket)
+            except RuntimeError:
+                # Socket already closed by the watchdog
+                return
+
+            if raw is None:
+                logger.info(f"Agent WebSocket for user {self.user_id} sent a binary frame; closing")
+                self._request_close(WS_CLOSE_UNSUPPORTED_DATA, "unsupported_data")
+                return
+
+            self.last_received = time.monotonic()
+            message = self._parse(raw)
+            if message is None:
+                await self.send_error(status.HTTP_400_BAD_REQUEST, "Invalid message")
+                continue
+
+            message_type = message.get("type")
+            AGENT_WS_MESSAGES.labels(direction="in", type=message_type).inc()
+            if message_type in ("open", "turn", "cancel"):
+                self.last_activity = self.last_received
+            await self._dispatch(message_type, message)
+
+    @staticmethod
+    def _parse(raw: str) -> Optional[Dict[str, Any]]:
+        # Frames above the server's ws_max_size never get here; this covers servers run without that setting
+        if utf8_length_exceeds(raw, settings.WS_MAX_MESSAGE_BYTES):
+            return None
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(message, dict) or message.get("type") not in CLIENT_MESSAGE_TYPES:
+            return None
+        return message
+
+    async def _dispatch(self, message_type: str, message: Dict[str, Any]) -> None:
+        if message_type == "ping":
+            await self.send({"type": "pong"})
+        elif message_type in ("pong", "auth"):
+            pass
+        elif message_type == "cancel":
+            if self._turn_task and not self._turn_task.done():
+                self._turn_task.cancel()
+        elif message_type in ("open", "turn"):
+            # Opening can wait on context cache creation, so it runs off the receive loop like a turn does
+            if self._turn_task and not self._turn_task.done():
+                await self.send_error(status.HTTP_409_CONFLICT, "A session open or turn is already in progress")
+                return
+            work = self._open_session if message_type == "open" else self._run_turn
+            self._turn_task = asyncio.create_task(self._run_task(work, message))
+
+    async def _open_session(self, message: Dict[str, Any]) -> None:
+        try:
+            request = AgentSessionCreateRequest(**{k: v for k, v in message.items() if k != "type"})
+        except ValidationError as e:
+            await self.send_error(status.HTTP_422_UNPROCESSABLE_ENTITY, e.errors(include_url=False, include_context=False))
+            return
+
+        # One conversation per connection; opening again starts over
+        await self._close_session()
+        session = await self.session_service.create_session(self.user_id, request)
+        self.session_id = session.session_id
+        await self.send({
+            "type": "session",
+            "session_id": session.session_id,
+            "context_cached": bool(session.cached_content)
+        })
+
+    async def _run_turn(self, message: Dict[str, Any]) -> None:
+        if self.session_id is None:
+            await self.send_error(status.HTTP_409_CONFLICT, "Open a session before sending turns")
+            return
+        try:
+            request = AgentTurnRequest(**{k: v for k, v in message.items() if k != "type"})
+        except ValidationError as e:
+            await self.send_error(status.HTTP_422_UNPROCESSABLE_ENTITY, e.errors(include_url=False, include_context=False))
+            return
+
+        events = self.session_service.run_turn_stream(self.session_id, self.user_id, request)
+        async for event in events:
+            await self.send({"type": event.event, **event.data})
+        self.last_activity = time.monotonic()
+
+    async def _run_task(self, work: Callable[[Dict[str, Any]], Awaitable[None]], message: Dict[str, Any]) -> None:
+        """Run an open or a turn in the background, reporting its failures to the client."""
+        try:
+            await work(message)
+        except HTTPException as e:
+            await self.send_error(e.status_code, e.detail)
+        except asyncio.CancelledError:
+            if not self._closed:
+                try:
+                    self._outbound.put_nowait({"type": "cancelled"})
+                except asyncio.QueueFull:
+                    pass
+            raise
+        except SlowConsumerError:
+            await self._close_socket()
+        except Exception as e:
+            logger.error(f"Unexpected error in agent WebSocket {work.__name__}: {e}", exc_info=True)
+            await self.send_error(status.HTTP_500_INTERNAL_SERVER_ERROR, "An unexpected error occurred")
+
+    async def send_error(self, status_code: int, detail: Any) -> None:
+        await self.send({"type": "error", "status_code": status_code, "detail": detail})
+
+    async def _close_session(self) -> None:
+        if self.session_id is None:
+            return
+        session_id, self.session_id = self.session_id, None
+        try:
+            await self.session_service.close_session(session_id, self.user_id)
+        except HTTPException:
+            pass  # Already expired
+
+
+async def authenticate_websocket(websocket: WebSocket) -> Optional[dict]:
+    """
+    Authenticate once per connection.
+
+    Non-browser clients may send `Authorization: Bearer <token>` on the
+    handshake; browsers cannot, so they send {"type": "auth", "token": ...}
+    as the first message instead.
+    """
+    authorization = websocket.headers.get("authorization")
+    try:
+        if authorization and authorization.lower().startswith("bearer "):
+            return app_security.verify_jwt_token(authorization[7:].strip())
+
+        raw = await asyncio.wait_for(receive_text_frame(websocket), timeout=settings.WS_AUTH_TIMEOUT_SECONDS)
+        if raw is None or utf8_length_exceeds(raw, settings.WS_MAX_MESSAGE_BYTES):
+            return None
+        message = json.loads(raw)
+        if not isinstance(message, dict) or message.get("type") != "auth" or not message.get("token"):
+            return None
+        return app_security.verify_jwt_token(message["token"])
+    except (HTTPException, asyncio.TimeoutError, json.JSONDecodeError, WebSocketDisconnect):
+        return None
+
+
+@router.websocket("/ws/agent")
+async def agent_websocket_endpoint(websocket: WebSocket):
+    """
+    WebSocket transport for the agent loop.
+
+    Client messages: auth, open (AgentSessionCreateRequest fields), turn
+    (AgentTurnRequest fields), cancel, ping and pong. Server messages: ready,
+    session, delta, done, error, cancelled, ping and pong.
+    """
+    await websocket.accept()
+
+    payload = await authenticate_websocket(websocket)
+    if payload is None:
+        AGENT_WS_CLOSES.labels(reason="unauthorized").inc()
+        await websocket.close(code=WS_CLOSE_UNAUTHORIZED, reason="unauthorized")
+        return
+
+    logger.info(f"Agent WebSocket connected for user {payload['user_id']}")
+    AGENT_WS_CONNECTIONS_ACTIVE.inc()
+    try:
+        await AgentConnection(websocket, payload["user_id"], agent_session_service).run()
+    finally:
+        AGENT_WS_CONNECTIONS_ACTIVE.dec()
+        logger.info(f"Agent WebSocket closed for user {payload['user_id']}")
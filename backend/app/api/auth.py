@@ -34,7 +34,7 @@ async def google_verify_id_token_endpoint(request_body: GoogleVerifyTokenRequest
     logger.info("Received ID token for verification (token not logged for security).")
 
     app_user_info = google_auth_service.verify_and_get_user_info(request_body.id_token)
-    logger.info(f"User info extracted for: {app_user_info.email}")
+    logger.info("User info extracted for: %s", app_user_info.email)
 
     # TODO: Implement your logic here to find or create a user in your database
     # E.g., user_in_db = await find_or_create_user(google_id=app_user_info.id, email=app_user_info.email, name=app_user_info.name, picture=app_user_info.picture)
@@ -65,7 +65,7 @@ async def google_verify_access_token_endpoint(request_body: GoogleAccessTokenReq
             detail="ID token is required"
         )
 
-    logger.info(f"Received user info for: {request_body.access_token}")
+    logger.info("Received access token for verification (token not logged for security).")
 
 
     # Verify the access token with Google
@@ -89,7 +89,6 @@ async def google_verify_access_token_endpoint(request_body: GoogleAccessTokenReq
 # Dependency for protected routes
 # This will now expect the token in the 'Authorization: Bearer <token>' header
 def get_current_user_payload(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    logger.info(f"Received credentials: {credentials}")
     # credentials.credentials will contain the token string
     token = credentials.credentials
     return app_security.verify_jwt_token(token) # Assuming app_security.verify_jwt_token expects just the token string
\ No newline at end of file
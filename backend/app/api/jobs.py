@@ -0,0 +1,62 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.models.request import JobCreateRequest
+from app.models.response import JobResponse, JobStatsResponse
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.job_queue import JobQueue
+from app.api.auth import get_current_user_payload
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+# Initialize the job queue; jobs are run by scripts/run_job_worker.py, not by this process
+job_queue = JobQueue(
+    session_factory=SessionLocal,
+    max_attempts=settings.LLM_JOB_MAX_ATTEMPTS,
+    lease_seconds=settings.LLM_JOB_LEASE_SECONDS,
+    retry_base_seconds=settings.LLM_JOB_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.LLM_JOB_RETRY_MAX_SECONDS
+)
+
+
+@router.post("", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED, summary="Queue an offline LLM job")
+async def create_job_endpoint(request: JobCreateRequest, user: dict = Depends(get_current_user_payload)):
+    """
+    Queue a chat request to be answered by a background worker. Poll
+    GET /jobs/{id} until its status is "succeeded" or "dead".
+    """
+    payload = {
+        "content": request.message,
+        "use_search": request.use_search,
+        "model_tier": request.model_tier,
+        "temperature": request.temperature,
+        "max_tokens": request.max_tokens,
+    }
+    job = await asyncio.to_thread(job_queue.enqueue, user["user_id"], payload)
+    logger.info(f"Queued job {job.id}")
+    return JobResponse.model_validate(job)
+
+
+@router.get("/stats", response_model=JobStatsResponse, summary="Progress of your jobs")
+async def job_stats_endpoint(user: dict = Depends(get_current_user_payload)):
+    return JobStatsResponse(**await asyncio.to_thread(job_queue.stats, user["user_id"]))
+
+
+@router.get("/{job_id}", response_model=JobResponse, summary="Poll an offline LLM job")
+async def get_job_endpoint(job_id: str, user: dict = Depends(get_current_user_payload)):
+    job = await asyncio.to_thread(job_queue.get, job_id, user["user_id"])
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return JobResponse.model_validate(job)
+
+
+@router.post("/{job_id}/retry", response_model=JobResponse, summary="Requeue a dead-lettered job")
+async def retry_job_endpoint(job_id: str, user: dict = Depends(get_current_user_payload)):
+    if not await asyncio.to_thread(job_queue.retry_dead, job_id, user["user_id"]):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Only dead-lettered jobs can be retried")
+    return JobResponse.model_validate(await asyncio.to_thread(job_queue.get, job_id, user["user_id"]))
@@ -1,81 +1,347 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
-from typing import Optional, List
-import base64
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from typing import Optional, List, AsyncIterator
 
-from app.models.request import ChatRequest, ChatWithImageRequest, ChatWithSearchRequest
-from app.models.response import ChatResponse
+from app.models.request import ChatBatchRequest, ChatRequest, ChatWithImageRequest, ChatWithSearchRequest, ImageData
+from app.models.response import ChatBatchItemResult, ChatBatchResponse, ChatResponse
 from app.core.config import settings
-from app.services.llm_service import LlmService, ContentMessage, ImageContent
+from app.core.database import SessionLocal
+from app.services.file_registry import FileRegistry
+from app.services.health_monitor import LlmHealthMonitor
+from app.services.gemini_client_pool import GeminiClientPool, parse_api_keys
+from app.services.image_preprocessor import ImagePreprocessor
+from app.services.llm_cache import LlmResponseCache, PostgresCacheTier, CACHE_MODES
+from app.services.llm_providers import DEFAULT_GEMINI_MODEL, GeminiProvider, OpenAICompatibleProvider, ProviderRouter
+from app.services.model_router import ModelRouter
+from app.services.token_budget import TokenBudget
+from app.services.llm_service import LlmService, ContentMessage, ImageContent, LlmStreamEvent, is_retryable_genai_error
 from app.api.auth import get_current_user_payload # Import the dependency
+from app.utils.circuit_breaker import CircuitBreakerRegistry
+from app.utils.concurrency_limiter import AdaptiveConcurrencyLimiter
+from app.utils.disconnect import CancelOnDisconnectRoute
+from app.utils.hedging import RequestHedger
 from app.utils.logger import get_logger
+from app.utils.retry_policy import RetryBudget, RetryPolicy
+from app.utils.single_flight import SingleFlight
+from app.utils.sse import format_sse
+from app.utils.uploads import ALLOWED_IMAGE_TYPES, SNIFF_BYTES, BoundedUploadRoute, sniff_image_mime
 
 logger = get_logger(__name__)
 
-router = APIRouter()
+class LlmRoute(CancelOnDisconnectRoute, BoundedUploadRoute):
+    """Cancels upstream work when the client disconnects; multipart forms are parsed within upload limits."""
+
+
+# Multipart forms on this router are parsed with upload limits enforced as the body streams in
+router = APIRouter(route_class=LlmRoute)
+
+base64_images_adapter = TypeAdapter(List[ImageData])
+
+# Initialize response cache
+response_cache = None
+if settings.LLM_CACHE_ENABLED:
+    response_cache = LlmResponseCache(
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        max_bytes=settings.LLM_CACHE_MAX_BYTES,
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+        max_temperature=settings.LLM_CACHE_MAX_TEMPERATURE,
+        shared_tier=PostgresCacheTier(SessionLocal, settings.LLM_CACHE_TTL_SECONDS) if settings.LLM_CACHE_SHARED_ENABLED else None
+    )
+
+# Initialize image preprocessing
+image_preprocessor = None
+if settings.IMAGE_PREPROCESS_ENABLED:
+    image_preprocessor = ImagePreprocessor(
+        max_edge=settings.IMAGE_MAX_EDGE,
+        output_format=settings.IMAGE_OUTPUT_FORMAT,
+        quality=settings.IMAGE_OUTPUT_QUALITY,
+        cache_max_entries=settings.IMAGE_PREPROCESS_CACHE_MAX_ENTRIES,
+        cache_max_bytes=settings.IMAGE_PREPROCESS_CACHE_MAX_BYTES
+    )
+
+# Initialize uploaded image registry
+file_registry = None
+if settings.LLM_FILE_REGISTRY_ENABLED:
+    file_registry = FileRegistry(
+        max_entries=settings.LLM_FILE_REGISTRY_MAX_ENTRIES,
+        min_bytes=settings.LLM_FILE_REGISTRY_MIN_BYTES,
+        expiry_margin_seconds=settings.LLM_FILE_REGISTRY_EXPIRY_MARGIN_SECONDS
+    )
+
+# Initialize upstream concurrency limiter
+concurrency_limiter = None
+if settings.LLM_CONCURRENCY_ENABLED:
+    concurrency_limiter = AdaptiveConcurrencyLimiter(
+        name="llm",
+        initial_limit=settings.LLM_CONCURRENCY_INITIAL_LIMIT,
+        min_limit=settings.LLM_CONCURRENCY_MIN_LIMIT,
+        max_limit=settings.LLM_CONCURRENCY_MAX_LIMIT,
+        max_queue=settings.LLM_CONCURRENCY_MAX_QUEUE,
+        queue_timeout=settings.LLM_CONCURRENCY_QUEUE_TIMEOUT_SECONDS,
+        latency_tolerance=settings.LLM_CONCURRENCY_LATENCY_TOLERANCE
+    )
+
+# Initialize request hedging
+hedger = None
+if settings.LLM_HEDGING_ENABLED:
+    hedger = RequestHedger(
+        name="llm_chat",
+        percentile=settings.LLM_HEDGE_PERCENTILE,
+        budget_ratio=settings.LLM_HEDGE_BUDGET_RATIO,
+        min_delay=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+        min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+    )
+
+# Initialize circuit breakers
+circuit_breakers = None
+if settings.LLM_CIRCUIT_BREAKER_ENABLED:
+    circuit_breakers = CircuitBreakerRegistry(
+        failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout=settings.LLM_CIRCUIT_RECOVERY_SECONDS,
+        half_open_probes=settings.LLM_CIRCUIT_HALF_OPEN_PROBES
+    )
+
+# Initialize the API key pool; each key has its own connection pool
+client_pool = GeminiClientPool(
+    api_keys=parse_api_keys(settings.GEMINI_API_KEY, settings.GEMINI_EXTRA_API_KEYS),
+    requests_per_minute=settings.LLM_KEY_REQUESTS_PER_MINUTE,
+    drain_seconds=settings.LLM_KEY_DRAIN_SECONDS,
+    timeout=max(settings.LLM_CONNECT_TIMEOUT, settings.LLM_READ_TIMEOUT, settings.LLM_WRITE_TIMEOUT),
+    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS
+)
+
+# Initialize model tier routing
+model_router = None
+if settings.LLM_MODEL_ROUTING_ENABLED:
+    model_router = ModelRouter.from_settings(settings.LLM_MODEL_TIERS, settings.LLM_DEFAULT_MODEL_TIER)
+
+# Initialize pre-flight token accounting
+token_budget = None
+if settings.LLM_TOKEN_BUDGET_ENABLED:
+    token_budget = TokenBudget(
+        context_limits=settings.LLM_CONTEXT_TOKEN_LIMITS,
+        default_context_limit=settings.LLM_DEFAULT_CONTEXT_TOKEN_LIMIT,
+        trim_order=settings.LLM_TRIM_ORDER,
+        user_tokens_per_window=settings.LLM_USER_INPUT_TOKENS_PER_HOUR,
+        window_seconds=3600,
+        count_tokens=client_pool.count_tokens if settings.LLM_COUNT_TOKENS_ENABLED else None,
+        count_margin=settings.LLM_COUNT_TOKENS_MARGIN,
+        count_cache_max_entries=settings.LLM_COUNT_TOKENS_CACHE_MAX_ENTRIES
+    )
+
+# Initialize providers; Gemini always uses the key pool
+provider_factories = {
+    "gemini": lambda: GeminiProvider(
+        client_pool.primary.client, model_router.default.model if model_router else DEFAULT_GEMINI_MODEL, client_pool
+    ),
+    "openai_compat": lambda: OpenAICompatibleProvider(
+        base_url=settings.OPENAI_COMPAT_BASE_URL,
+        model_name=settings.OPENAI_COMPAT_MODEL,
+        api_key=settings.OPENAI_COMPAT_API_KEY or None,
+        timeout=max(settings.LLM_CONNECT_TIMEOUT, settings.LLM_READ_TIMEOUT, settings.LLM_WRITE_TIMEOUT),
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS
+    ),
+}
+providers = ProviderRouter(
+    providers=[provider_factories[name.strip()]() for name in settings.LLM_PROVIDERS.split(",") if name.strip()],
+    max_error_rate=settings.LLM_FAILOVER_ERROR_RATE,
+    max_p95_seconds=settings.LLM_FAILOVER_P95_SECONDS,
+    window_seconds=settings.LLM_PROVIDER_STATS_WINDOW_SECONDS,
+    min_samples=settings.LLM_PROVIDER_MIN_SAMPLES
+)
+
+# Initialize retry policy; the budget is shared by every LLM call in this process.
+# A 429's retry hint only binds its own key, so it is ignored while another key has quota.
+retry_policy = RetryPolicy(
+    name="llm",
+    retryable=is_retryable_genai_error,
+    max_attempts=settings.LLM_RETRY_MAX_ATTEMPTS,
+    base_delay=settings.LLM_RETRY_BASE_DELAY_SECONDS,
+    max_delay=settings.LLM_RETRY_MAX_DELAY_SECONDS,
+    max_hint_delay=settings.LLM_RETRY_MAX_HINT_SECONDS,
+    deadline_seconds=settings.LLM_RETRY_DEADLINE_SECONDS,
+    budget=RetryBudget(name="llm", ratio=settings.RETRY_BUDGET_RATIO, max_tokens=settings.RETRY_BUDGET_MAX_TOKENS),
+    log=logger,
+    hint_applies=lambda e: not client_pool.has_available_key()
+)
 
 # Initialize service
 llm_service = LlmService(
     gemini_api_key=settings.GEMINI_API_KEY, 
     connect_timeout=settings.LLM_CONNECT_TIMEOUT,
     read_timeout=settings.LLM_READ_TIMEOUT,
-    write_timeout=settings.LLM_WRITE_TIMEOUT
+    write_timeout=settings.LLM_WRITE_TIMEOUT,
+    response_cache=response_cache,
+    single_flight=SingleFlight(name="llm_chat") if settings.LLM_SINGLE_FLIGHT_ENABLED else None,
+    image_preprocessor=image_preprocessor,
+    file_registry=file_registry,
+    concurrency_limiter=concurrency_limiter,
+    hedger=hedger,
+    circuit_breakers=circuit_breakers,
+    retry_policy=retry_policy,
+    client_pool=client_pool,
+    providers=providers,
+    model_router=model_router,
+    token_budget=token_budget
 )
 
+# Readiness from cached signals; the app starts and stops its background prober
+health_monitor = LlmHealthMonitor(
+    llm_service,
+    probe_interval=settings.LLM_HEALTH_PROBE_INTERVAL_SECONDS,
+    stale_seconds=settings.LLM_HEALTH_STALE_SECONDS,
+    probe_timeout=settings.LLM_HEALTH_PROBE_TIMEOUT_SECONDS
+)
+
+
+def get_cache_mode(
+    x_llm_cache: Optional[str] = Header(None, description="Response cache override: 'bypass' or 'enable'")
+) -> Optional[str]:
+    """Read the per-request cache override from the X-LLM-Cache header."""
+    if x_llm_cache is None:
+        return None
+    cache_mode = x_llm_cache.strip().lower()
+    if cache_mode not in CACHE_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid X-LLM-Cache header. Allowed: {CACHE_MODES}"
+        )
+    return cache_mode
+
+
+def sse_response(events: AsyncIterator[LlmStreamEvent]) -> StreamingResponse:
+    """Wrap LLM stream events in a text/event-stream response."""
+    async def event_source():
+        async for event in events:
+            yield format_sse(event.event, event.data)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def get_model_tier(
+    request: Request,
+    x_llm_model_tier: Optional[str] = Header(None, description="Model tier override, e.g. 'lite' or 'standard'")
+) -> Optional[str]:
+    """Read the per-request model tier from the X-LLM-Model-Tier header, falling back to the route's default."""
+    if x_llm_model_tier is None:
+        return settings.LLM_ROUTE_MODEL_TIERS.get(request.scope["route"].path)
+    model_tier = x_llm_model_tier.strip().lower()
+    if model_router is not None and model_tier not in model_router.tiers:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid X-LLM-Model-Tier header. Allowed: {list(model_router.tiers)}"
+        )
+    return model_tier
 
-@router.post("/chat", response_model=ChatResponse, summary="Chat with LLM",
-             dependencies=[Depends(get_current_user_payload)])
-async def chat_with_llm_endpoint(request: ChatRequest):
+@router.post("/chat", response_model=ChatResponse, summary="Chat with LLM")
+async def chat_with_llm_endpoint(
+    request: ChatRequest,
+    cache_mode: Optional[str] = Depends(get_cache_mode),
+    model_tier: Optional[str] = Depends(get_model_tier),
+    user: dict = Depends(get_current_user_payload)
+):
     """
     Basic endpoint to send a text message to an LLM (Gemini 2.0 Flash) and get a response.
     """
-    logger.info(f"Received basic chat request")
-    reply = await llm_service.chat_with_llm(request.message)
+    logger.info("Received basic chat request")
+    reply = await llm_service.chat_with_llm(request.message, cache_mode=cache_mode, model_tier=model_tier, user_id=user["user_id"])
     return ChatResponse(reply=reply)
 
 
-@router.post("/chat/search", response_model=ChatResponse, summary="Chat with LLM and Search",
-             dependencies=[Depends(get_current_user_payload)])
-async def chat_with_search_endpoint(request: ChatWithSearchRequest):
+@router.post("/chat/stream", summary="Stream chat with LLM")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    model_tier: Optional[str] = Depends(get_model_tier),
+    user: dict = Depends(get_current_user_payload)
+):
+    """
+    Stream the LLM reply as Server-Sent Events.
+    Emits "delta" events with partial text, then a final "done" event carrying
+    usage metadata, or an "error" event if the response is blocked mid-stream.
+    """
+    logger.info("Received streaming chat request")
+    events = await llm_service.open_chat_stream(request.message, model_tier=model_tier, user_id=user["user_id"])
+    return sse_response(events)
+
+
+@router.post("/chat/search", response_model=ChatResponse, summary="Chat with LLM and Search")
+async def chat_with_search_endpoint(
+    request: ChatWithSearchRequest,
+    cache_mode: Optional[str] = Depends(get_cache_mode),
+    model_tier: Optional[str] = Depends(get_model_tier),
+    user: dict = Depends(get_current_user_payload)
+):
     """
     Endpoint to chat with LLM with Google Search enabled.
     """
-    logger.info(f"Received chat request with search enabled")
+    logger.info("Received chat request with search enabled")
     reply = await llm_service.chat_with_search(
         request.message, 
+        cache_mode=cache_mode,
+        model_tier=model_tier,
+        user_id=user["user_id"],
         temperature=request.temperature,
         max_tokens=request.max_tokens
     )
     return ChatResponse(reply=reply)
 
 
-@router.post("/chat/image", response_model=ChatResponse, summary="Chat with LLM and Image",
-             dependencies=[Depends(get_current_user_payload)])
-async def chat_with_image_endpoint(request: ChatWithImageRequest):
+@router.post("/chat/image", response_model=ChatResponse, summary="Chat with LLM and Image")
+async def chat_with_image_endpoint(
+    request: ChatWithImageRequest,
+    cache_mode: Optional[str] = Depends(get_cache_mode),
+    model_tier: Optional[str] = Depends(get_model_tier),
+    user: dict = Depends(get_current_user_payload)
+):
     """
     Endpoint to send a message with image(s) to the LLM.
     Supports base64 encoded images in the request body.
     """
-    logger.info(f"Received chat request with {len(request.images)} image(s)")
+    logger.info("Received chat request with %d image(s)", len(request.images))
     
     try:
-        # Convert base64 images to ImageContent objects
+        # Reuse the bytes decoded during request validation
         image_contents = []
         for img in request.images:
-            image_content = ImageContent.from_base64(img.data, img.mime_type)
+            image_content = ImageContent(data=img.decoded, mime_type=img.mime_type)
             image_contents.append(image_content)
         
         # Create content message
         content = ContentMessage(text=request.message, images=image_contents)
         
         # Send to LLM
+        if request.stream:
+            events = await llm_service.open_chat_stream(
+                content,
+                use_search=request.use_search,
+                model_tier=model_tier,
+                user_id=user["user_id"],
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            )
+            return sse_response(events)
+
         reply = await llm_service.chat_with_llm(
             content, 
             use_search=request.use_search,
+            cache_mode=cache_mode,
+            model_tier=model_tier,
+            user_id=user["user_id"],
             temperature=request.temperature,
             max_tokens=request.max_tokens
         )
         return ChatResponse(reply=reply)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing image chat request: {e}")
         raise HTTPException(
@@ -84,42 +350,28 @@ async def chat_with_image_endpoint(request: ChatWithImageRequest):
         )
 
 
-@router.post("/chat/upload", response_model=ChatResponse, summary="Chat with LLM and Upload Image",
-             dependencies=[Depends(get_current_user_payload)])
+@router.post("/chat/upload", response_model=ChatResponse, summary="Chat with LLM and Upload Image")
 async def chat_with_upload_endpoint(
     message: str = Form(...),
     use_search: bool = Form(False),
     temperature: Optional[float] = Form(0.7),
     max_tokens: Optional[int] = Form(None),
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    cache_mode: Optional[str] = Depends(get_cache_mode),
+    model_tier: Optional[str] = Depends(get_model_tier),
+    user: dict = Depends(get_current_user_payload)
 ):
     """
     Endpoint to upload image files and chat with the LLM.
     Supports multiple image uploads via multipart/form-data.
     """
-    logger.info(f"Received chat request with {len(files)} uploaded file(s)")
+    logger.info("Received chat request with %d uploaded file(s)", len(files))
     
     try:
-        # Validate and process uploaded files
+        # Size and type limits were enforced while the form was parsed (see BoundedUploadRoute)
         image_contents = []
-        allowed_types = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
-        
         for file in files:
-            if file.content_type not in allowed_types:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Unsupported file type: {file.content_type}. Allowed: {allowed_types}"
-                )
-            
-            # Read file data
-            file_data = await file.read()
-            if len(file_data) > 10 * 1024 * 1024:  # 10MB limit
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"File {file.filename} is too large. Maximum size is 10MB."
-                )
-            
-            image_content = ImageContent(data=file_data, mime_type=file.content_type)
+            image_content = ImageContent(data=await file.read(), mime_type=file.content_type)
             image_contents.append(image_content)
         
         # Create content message
@@ -129,6 +381,9 @@ async def chat_with_upload_endpoint(
         reply = await llm_service.chat_with_llm(
             content, 
             use_search=use_search,
+            cache_mode=cache_mode,
+            model_tier=model_tier,
+            user_id=user["user_id"],
             temperature=temperature,
             max_tokens=max_tokens
         )
@@ -144,61 +399,57 @@ async def chat_with_upload_endpoint(
         )
 
 
-@router.post("/chat/advanced", response_model=ChatResponse, summary="Advanced Chat with All Features",
-             dependencies=[Depends(get_current_user_payload)])
+@router.post("/chat/advanced", response_model=ChatResponse, summary="Advanced Chat with All Features")
 async def advanced_chat_endpoint(
     message: str = Form(...),
     use_search: bool = Form(False),
     temperature: Optional[float] = Form(0.7),
     max_tokens: Optional[int] = Form(None),
+    stream: bool = Form(False),
     files: Optional[List[UploadFile]] = File(None),
-    base64_images: Optional[str] = Form(None)  # JSON string of base64 images
+    base64_images: Optional[str] = Form(None),  # JSON string of base64 images
+    cache_mode: Optional[str] = Depends(get_cache_mode),
+    model_tier: Optional[str] = Depends(get_model_tier),
+    user: dict = Depends(get_current_user_payload)
 ):
     """
     Advanced endpoint that supports both uploaded files and base64 images,
     along with optional search functionality.
     """
-    logger.info(f"Received advanced chat request")
+    logger.info("Received advanced chat request")
     
     try:
         image_contents = []
         
-        # Process uploaded files
+        # Process uploaded files; size and type limits were enforced while the form was parsed
         if files:
-            allowed_types = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
             for file in files:
-                if file.content_type not in allowed_types:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Unsupported file type: {file.content_type}"
-                    )
-                
-                file_data = await file.read()
-                if len(file_data) > 10 * 1024 * 1024:  # 10MB limit
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"File {file.filename} is too large"
-                    )
-                
-                image_content = ImageContent(data=file_data, mime_type=file.content_type)
+                image_content = ImageContent(data=await file.read(), mime_type=file.content_type)
                 image_contents.append(image_content)
         
-        # Process base64 images
+        # Process base64 images, validated and decoded in one pass
         if base64_images:
-            import json
             try:
-                b64_images = json.loads(base64_images)
-                for img_data in b64_images:
-                    image_content = ImageContent.from_base64(
-                        img_data['data'], 
-                        img_data['mime_type']
-                    )
-                    image_contents.append(image_content)
-            except (json.JSONDecodeError, KeyError) as e:
+                b64_images = base64_images_adapter.validate_json(base64_images)
+            except ValidationError as e:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Invalid base64_images format: {e}"
+                    detail=f"Invalid base64_images format: {e.errors(include_url=False, include_context=False)}"
                 )
+            for img in b64_images:
+                mime_type = sniff_image_mime(img.decoded[:SNIFF_BYTES])
+                if mime_type not in ALLOWED_IMAGE_TYPES:
+                    raise HTTPException(
+                        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        detail=f"base64_images contains data that is not a supported image. Allowed: {ALLOWED_IMAGE_TYPES}"
+                    )
+                image_contents.append(ImageContent(data=img.decoded, mime_type=mime_type))
+
+        if len(image_contents) > settings.UPLOAD_MAX_FILES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Maximum {settings.UPLOAD_MAX_FILES} images allowed per request"
+            )
         
         # Create content
         if image_contents:
@@ -207,9 +458,23 @@ async def advanced_chat_endpoint(
             content = message
         
         # Send to LLM
+        if stream:
+            events = await llm_service.open_chat_stream(
+                content,
+                use_search=use_search,
+                model_tier=model_tier,
+                user_id=user["user_id"],
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            return sse_response(events)
+
         reply = await llm_service.chat_with_llm(
             content, 
             use_search=use_search,
+            cache_mode=cache_mode,
+            model_tier=model_tier,
+            user_id=user["user_id"],
             temperature=temperature,
             max_tokens=max_tokens
         )
@@ -225,23 +490,99 @@ async def advanced_chat_endpoint(
         )
 
 
+@router.post("/chat/batch", response_model=ChatBatchResponse, summary="Run many chat requests in one call")
+async def chat_batch_endpoint(
+    request: ChatBatchRequest,
+    cache_mode: Optional[str] = Depends(get_cache_mode),
+    model_tier: Optional[str] = Depends(get_model_tier),
+    user: dict = Depends(get_current_user_payload)
+):
+    """
+    Run independent chat requests concurrently, at most LLM_BATCH_CONCURRENCY
+    at a time. Each item has its own result and error; identical items are
+    sent upstream once. With stream=true the results are returned as NDJSON,
+    one line per item in completion order; otherwise as one response in item
+    order. The request deadline covers the whole batch.
+    """
+    if len(request.items) > settings.LLM_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maximum {settings.LLM_BATCH_MAX_ITEMS} items allowed per batch"
+        )
+    logger.info("Received batch chat request with %d item(s)", len(request.items))
+
+    items = []
+    for item in request.items:
+        images = [ImageContent(data=img.decoded, mime_type=img.mime_type) for img in item.images or []]
+        call = {
+            "content": ContentMessage(text=item.message, images=images) if images else item.message,
+            "use_search": item.use_search,
+            "cache_mode": cache_mode,
+            "model_tier": model_tier,
+            "user_id": user["user_id"],
+            "temperature": item.temperature,
+            "max_tokens": item.max_tokens,
+        }
+        if item.stop_sequences:
+            call["stop_sequences"] = item.stop_sequences
+        items.append(call)
+
+    results = llm_service.chat_batch(items, concurrency=settings.LLM_BATCH_CONCURRENCY)
+
+    def to_response(result) -> ChatBatchItemResult:
+        return ChatBatchItemResult(index=result.index, status_code=result.status_code, reply=result.reply, error=result.detail)
+
+    if request.stream:
+        async def ndjson_lines():
+            async for result in results:
+                yield to_response(result).model_dump_json() + "\n"
+
+        return StreamingResponse(
+            ndjson_lines(),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    collected = [to_response(result) async for result in results]
+    return ChatBatchResponse(results=sorted(collected, key=lambda result: result.index))
+
+
+@router.get("/health/live", summary="Liveness")
+async def liveness():
+    """The process is up and serving requests. Never touches the LLM or the database."""
+    return {"status": "alive"}
+
+
 @router.get("/health", summary="Health Check")
+@router.get("/health/ready", summary="Readiness")
 async def health_check():
     """
-    Health check endpoint for the LLM service.
+    Readiness of the LLM service, from cached signals only: circuit states,
+    the live success rate of real traffic and, when traffic is too light to
+    judge from, the last background probe. Until the first of those arrives
+    it reports "starting" with a 200. No upstream call is made here.
+    Also reports every upstream circuit breaker's state, so clients can back
+    off straight away while a circuit is open, and each API key's estimated
+    headroom and each provider's live latency and error rate.
     """
-    try:
-        is_healthy = await llm_service.health_check()
-        if is_healthy:
-            return {"status": "healthy", "service": "llm"}
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="LLM service is unhealthy"
-            )
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Health check failed"
-        )
\ No newline at end of file
+    is_healthy, reason, probe = health_monitor.status()
+
+    circuits = llm_service.circuit_breakers.snapshot() if llm_service.circuit_breakers else {}
+    api_keys = llm_service.client_pool.snapshot() if llm_service.client_pool else {}
+    body = {
+        "status": "starting" if reason == "starting" else "healthy" if is_healthy else "unhealthy",
+        "service": "llm",
+        "reason": reason,
+        "probe": probe,
+        "circuits": circuits,
+        "api_keys": api_keys,
+        "providers": llm_service.providers.snapshot()
+    }
+    if is_healthy:
+        return body
+
+    headers = {}
+    retry_after = [circuit["retry_after"] for circuit in circuits.values() if circuit["retry_after"]]
+    if retry_after:
+        headers["Retry-After"] = str(max(retry_after))
+    return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
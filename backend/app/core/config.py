@@ -2,7 +2,7 @@ import os
 
 from pydantic import HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Any, Dict, List
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -31,6 +31,165 @@ class Settings(BaseSettings):
     LLM_READ_TIMEOUT: float = 60.0
     LLM_WRITE_TIMEOUT: float = 10.0
 
+    # LLM providers, in order of preference; the first is the primary
+    LLM_PROVIDERS: str = "gemini"  # Comma-separated: "gemini", "openai_compat"
+    OPENAI_COMPAT_BASE_URL: str = "http://localhost:8000/v1"
+    OPENAI_COMPAT_API_KEY: str = ""
+    OPENAI_COMPAT_MODEL: str = ""
+    LLM_FAILOVER_ERROR_RATE: float = 0.5  # A provider at or above this error rate is degraded
+    LLM_FAILOVER_P95_SECONDS: float = 20.0  # A provider whose p95 latency is above this is degraded
+    LLM_PROVIDER_STATS_WINDOW_SECONDS: float = 60.0
+    LLM_PROVIDER_MIN_SAMPLES: int = 10  # Fewer calls than this in the window never count as degraded
+
+    # Gemini model tiers, cheapest first; a request goes to the first tier that fits it
+    LLM_MODEL_ROUTING_ENABLED: bool = True
+    LLM_MODEL_TIERS: List[Dict[str, Any]] = [
+        {"name": "lite", "model": "gemini-2.0-flash-lite", "max_input_chars": 2000, "images": False, "search": False},
+        {"name": "standard", "model": "gemini-2.0-flash"},
+    ]
+    LLM_DEFAULT_MODEL_TIER: str = "standard"  # Used without routing, and for context caches
+    LLM_ROUTE_MODEL_TIERS: Dict[str, str] = {}  # Route path -> tier, e.g. {"/chat/advanced": "standard"}; X-LLM-Model-Tier overrides
+
+    # /chat/batch
+    LLM_BATCH_MAX_ITEMS: int = 500
+    LLM_BATCH_CONCURRENCY: int = 8  # Items of one batch in flight at a time; keeps room for interactive traffic
+
+    # Offline LLM job queue; workers run scripts/run_job_worker.py
+    LLM_JOB_MAX_ATTEMPTS: int = 5
+    LLM_JOB_BATCH_SIZE: int = 32  # Jobs a worker claims per poll
+    LLM_JOB_CONCURRENCY: int = 4  # Upstream calls in flight per worker
+    LLM_JOB_POLL_SECONDS: float = 5.0  # Idle wait between polls
+    LLM_JOB_BATCH_TIMEOUT_SECONDS: float = 600.0
+    LLM_JOB_LEASE_SECONDS: float = 900.0  # Must exceed the batch timeout; expired leases are claimed again
+    LLM_JOB_RETRY_BASE_SECONDS: float = 30.0
+    LLM_JOB_RETRY_MAX_SECONDS: float = 3600.0
+    LLM_JOB_WORKER_LOG_FILE: str = "job_worker.log"  # Kept apart from the API's LOG_FILE; rotation and format follow the LOG_* settings
+
+    # Readiness; /health and /health/ready never call upstream themselves
+    LLM_HEALTH_PROBE_INTERVAL_SECONDS: float = 30.0  # Background probes run only when traffic is too light to judge from
+    LLM_HEALTH_STALE_SECONDS: float = 120.0  # An older probe result no longer counts
+    LLM_HEALTH_PROBE_TIMEOUT_SECONDS: float = 10.0
+
+    # Metrics
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.5  # How often the event loop's wake-up delay is sampled
+
+    # Logging; records are written by a background thread
+    LOG_FILE: str = "app.log"
+    LOG_JSON: bool = True  # One JSON object per line; False for plain text
+    LOG_MAX_BYTES: int = 50 * 1024 * 1024  # The log file is rotated at this size
+    LOG_BACKUP_COUNT: int = 5
+    LOG_QUEUE_SIZE: int = 10000  # Records waiting to be written before new ones are dropped
+    LOG_MAX_MESSAGE_CHARS: int = 2000  # Longer messages and fields are truncated
+    LOG_SAMPLE_RATES: Dict[str, float] = {"uvicorn.access": 0.1, "httpx": 0.1, "app.api.llm": 0.1, "app.services.llm_service": 0.1}  # Fraction of INFO/DEBUG records kept per logger; warnings are always kept
+
+    # Tracing; spans are propagated with W3C traceparent headers
+    TRACING_EXPORTER: str = "none"  # "jsonl", "memory" or "none"
+    TRACING_JSONL_PATH: str = "traces.jsonl"
+    TRACING_SAMPLE_RATIO: float = 1.0  # Fraction of traces started here that are recorded
+    TRACING_MAX_QUEUED_SPANS: int = 10000  # Spans waiting for the jsonl writer (or kept in memory) before new ones are dropped
+
+    # Pre-flight token accounting
+    LLM_TOKEN_BUDGET_ENABLED: bool = True
+    LLM_CONTEXT_TOKEN_LIMITS: Dict[str, int] = {"gemini-2.0-flash": 1048576, "gemini-2.0-flash-lite": 1048576}
+    LLM_DEFAULT_CONTEXT_TOKEN_LIMIT: int = 128000  # Models not listed above
+    LLM_TRIM_ORDER: List[str] = ["page_state", "context"]  # Prompt sections trimmed, in order, when a request is too large
+    LLM_USER_INPUT_TOKENS_PER_HOUR: int = 0  # 0 disables per-user budgets
+    LLM_COUNT_TOKENS_ENABLED: bool = False  # Ask Gemini's count_tokens when an estimate is near a limit
+    LLM_COUNT_TOKENS_MARGIN: float = 0.2  # "Near" as a fraction of the limit
+    LLM_COUNT_TOKENS_CACHE_MAX_ENTRIES: int = 1024
+
+    # Gemini API key pool; GEMINI_API_KEY is always the primary key
+    GEMINI_EXTRA_API_KEYS: str = ""  # Comma-separated, each "key" or "label=key" (e.g. the project name)
+    LLM_KEY_REQUESTS_PER_MINUTE: float = 60.0  # Local estimate of each key's quota
+    LLM_KEY_DRAIN_SECONDS: float = 30.0  # How long a rate-limited key gets no traffic when upstream gives no hint
+    LLM_HTTP_MAX_CONNECTIONS: int = 100  # Per key
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.2  # Only requests at or below this temperature are cached by default
+    LLM_CACHE_SHARED_ENABLED: bool = False  # Also use the Postgres llm_response_cache table
+
+    # Coalesce identical in-flight LLM requests into one upstream call
+    LLM_SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Agent sessions
+    AGENT_SESSION_TTL_SECONDS: int = 900
+    AGENT_SESSION_MAX_SESSIONS: int = 1000
+    AGENT_SESSION_CONTEXT_CACHE_MIN_CHARS: int = 16000  # Gemini only caches prefixes above a minimum token count
+    AGENT_SESSION_CONTEXT_CACHE_TIMEOUT_SECONDS: float = 15.0  # Give up on caching and send the prefix inline after this
+
+    # Agent WebSocket transport
+    WS_AUTH_TIMEOUT_SECONDS: float = 10.0
+    WS_IDLE_TIMEOUT_SECONDS: float = 300.0
+    WS_HEARTBEAT_INTERVAL_SECONDS: float = 20.0
+    WS_HEARTBEAT_TIMEOUT_SECONDS: float = 60.0
+    WS_SEND_QUEUE_SIZE: int = 64
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    WS_MAX_MESSAGE_BYTES: int = 4 * 1024 * 1024  # Keep in step with uvicorn's --ws-max-size, which rejects larger frames before buffering them
+
+    # Total time budget per request; clients can ask for less (or more, up to the max) with X-Request-Timeout
+    REQUEST_TIMEOUT_DEFAULT_SECONDS: float = 60.0
+    REQUEST_TIMEOUT_MAX_SECONDS: float = 120.0
+    REQUEST_TIMEOUT_ROUTE_SECONDS: Dict[str, float] = {"/chat/stream": 30.0, "/chat/batch": 120.0}  # Streams: time to first chunk
+
+    # Request body and upload limits
+    MAX_REQUEST_BODY_BYTES: int = 80 * 1024 * 1024  # Whole body, checked before parsing; fits 5 base64 images on /chat/image
+    UPLOAD_MAX_FILES: int = 5
+    UPLOAD_MAX_FILE_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_MAX_FIELD_BYTES: int = 14 * 1024 * 1024  # Non-file form fields; base64_images must fit one encoded image
+    UPLOAD_MAX_TOTAL_BYTES: int = 50 * 1024 * 1024  # All parts of one multipart request
+
+    # Image downscaling and recompression before images are sent to the LLM
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1536  # Longest edge in pixels
+    IMAGE_OUTPUT_FORMAT: str = "webp"  # "webp" or "jpeg"
+    IMAGE_OUTPUT_QUALITY: int = 80
+    IMAGE_PREPROCESS_CACHE_MAX_ENTRIES: int = 256
+    IMAGE_PREPROCESS_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Upload repeated images once through the Gemini Files API and reference them by URI
+    LLM_FILE_REGISTRY_ENABLED: bool = True
+    LLM_FILE_REGISTRY_MAX_ENTRIES: int = 512
+    LLM_FILE_REGISTRY_MIN_BYTES: int = 32 * 1024  # Compared after downscaling; smaller images are cheaper to send inline than to upload
+    LLM_FILE_REGISTRY_EXPIRY_MARGIN_SECONDS: int = 3600  # Stop using a file this long before it expires upstream
+
+    # Adaptive concurrency limit on upstream LLM calls
+    LLM_CONCURRENCY_ENABLED: bool = True
+    LLM_CONCURRENCY_INITIAL_LIMIT: int = 16
+    LLM_CONCURRENCY_MIN_LIMIT: int = 2
+    LLM_CONCURRENCY_MAX_LIMIT: int = 128
+    LLM_CONCURRENCY_MAX_QUEUE: int = 64
+    LLM_CONCURRENCY_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    LLM_CONCURRENCY_LATENCY_TOLERANCE: float = 2.5  # Latency above this multiple of the baseline lowers the limit
+
+    # Hedge slow non-streaming LLM calls with a second identical call
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.95  # Hedge calls slower than this percentile of recent latency
+    LLM_HEDGE_BUDGET_RATIO: float = 0.05  # At most this fraction of extra calls
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 0.25
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+
+    # Circuit breakers per model and endpoint type
+    LLM_CIRCUIT_BREAKER_ENABLED: bool = True
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive upstream failures that open the circuit
+    LLM_CIRCUIT_RECOVERY_SECONDS: float = 30.0  # How long the circuit stays open before probing
+    LLM_CIRCUIT_HALF_OPEN_PROBES: int = 2
+
+    # Retries of failed upstream calls
+    RETRY_BUDGET_RATIO: float = 0.1  # Retries allowed per first attempt, per upstream
+    RETRY_BUDGET_MAX_TOKENS: float = 10.0  # Retries available in a burst, e.g. after a quiet period
+    LLM_RETRY_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 1.0
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 5.0
+    LLM_RETRY_MAX_HINT_SECONDS: float = 30.0  # Longer Retry-After/RetryInfo hints are passed on to the client instead
+    LLM_RETRY_DEADLINE_SECONDS: float = 90.0  # No retry starts if it could not finish within this time of the first attempt
+    TRANSCRIPT_RETRY_DEADLINE_SECONDS: float = 60.0
+
     model_config = SettingsConfigDict(env_file=f'.env.{app_env}', extra='ignore')
 
 settings = Settings()
\ No newline at end of file
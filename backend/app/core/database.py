@@ -2,14 +2,21 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from app.utils import tracing
 
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Dependency
 def get_db():
+    # Not made the current span: FastAPI runs the two halves of this generator in separate threads
+    session_span = tracing.start_span("db.session")
     db = SessionLocal()
     try:
         yield db
+    except Exception as e:
+        session_span.record_error(e)
+        raise
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+        session_span.end() 
\ No newline at end of file
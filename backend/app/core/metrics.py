@@ -0,0 +1,350 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# --- LLM response cache ---
+LLM_CACHE_LOOKUPS = Counter(
+    "llm_cache_lookups_total",
+    "LLM response cache lookups by tier and outcome",
+    ["tier", "outcome"]
+)
+LLM_CACHE_EVICTIONS = Counter(
+    "llm_cache_evictions_total",
+    "Entries evicted from the in-process LLM response cache",
+    ["reason"]
+)
+LLM_CACHE_MEMORY_BYTES = Gauge(
+    "llm_cache_memory_bytes",
+    "Bytes held by the in-process LLM response cache"
+)
+
+# --- Single-flight coalescing ---
+LLM_SINGLE_FLIGHT_CALLS = Counter(
+    "llm_single_flight_calls_total",
+    "Calls that started (leader) or joined (follower) a coalesced upstream request",
+    ["name", "role"]
+)
+
+# --- Agent sessions ---
+AGENT_SESSIONS_ACTIVE = Gauge(
+    "agent_sessions_active",
+    "Agent sessions held in this worker"
+)
+AGENT_SESSION_CHARS = Counter(
+    "agent_session_chars_total",
+    "Characters of page state received from clients versus prompt characters rebuilt for upstream",
+    ["kind"]
+)
+AGENT_WS_CONNECTIONS_ACTIVE = Gauge(
+    "agent_ws_connections_active",
+    "Open agent WebSocket connections"
+)
+AGENT_WS_MESSAGES = Counter(
+    "agent_ws_messages_total",
+    "Agent WebSocket messages by direction and type",
+    ["direction", "type"]
+)
+AGENT_WS_CLOSES = Counter(
+    "agent_ws_closes_total",
+    "Agent WebSocket connections closed, by reason",
+    ["reason"]
+)
+
+# --- Request body and upload limits ---
+UPLOAD_REJECTIONS = Counter(
+    "upload_rejections_total",
+    "Requests rejected while the body or an uploaded file was being received",
+    ["reason"]
+)
+
+# --- Image preprocessing ---
+IMAGE_PREPROCESS_BYTES = Counter(
+    "image_preprocess_bytes_total",
+    "Image bytes before (in) and after (out) downscaling and recompression",
+    ["stage"]
+)
+IMAGE_PREPROCESS_CACHE = Counter(
+    "image_preprocess_cache_total",
+    "Image preprocessing cache lookups by outcome",
+    ["outcome"]
+)
+IMAGE_PREPROCESS_SAVED_BYTES = Histogram(
+    "image_preprocess_saved_bytes",
+    "Image bytes saved per LLM request by preprocessing",
+    buckets=(0, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024)
+)
+
+# --- Gemini Files API registry ---
+LLM_FILE_REGISTRY_LOOKUPS = Counter(
+    "llm_file_registry_lookups_total",
+    "Uploaded-file registry lookups for images large enough to upload",
+    ["outcome"]
+)
+LLM_FILE_UPLOADS = Counter(
+    "llm_file_uploads_total",
+    "Images uploaded through the Files API",
+    ["outcome"]
+)
+LLM_FILE_REGISTRY_BYTES_REUSED = Counter(
+    "llm_file_registry_bytes_reused_total",
+    "Image bytes referenced by file URI instead of being sent inline again"
+)
+
+# --- Upstream concurrency limiting ---
+CONCURRENCY_LIMIT = Gauge(
+    "concurrency_limit",
+    "Current adaptive concurrency limit",
+    ["name"]
+)
+CONCURRENCY_IN_FLIGHT = Gauge(
+    "concurrency_in_flight",
+    "Calls currently holding a concurrency slot",
+    ["name"]
+)
+CONCURRENCY_QUEUE_DEPTH = Gauge(
+    "concurrency_queue_depth",
+    "Calls waiting for a concurrency slot",
+    ["name"]
+)
+CONCURRENCY_REJECTIONS = Counter(
+    "concurrency_rejections_total",
+    "Calls rejected by the concurrency limiter",
+    ["name", "reason"]
+)
+
+# --- Request hedging ---
+HEDGE_REQUESTS = Counter(
+    "hedge_requests_total",
+    "Hedgeable calls by outcome: finished before the hedge delay, hedged, or not hedged for lack of budget",
+    ["name", "outcome"]
+)
+HEDGE_WINS = Counter(
+    "hedge_wins_total",
+    "Which call of a hedged pair returned first",
+    ["name", "winner"]
+)
+
+# --- Circuit breakers ---
+CIRCUIT_STATE = Gauge(
+    "circuit_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["model", "endpoint"]
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "circuit_transitions_total",
+    "Circuit breaker state changes, by the state entered",
+    ["model", "endpoint", "state"]
+)
+CIRCUIT_REJECTIONS = Counter(
+    "circuit_rejections_total",
+    "Calls failed fast because the circuit was open",
+    ["model", "endpoint"]
+)
+
+# --- Retries ---
+RETRY_DECISIONS = Counter(
+    "retry_decisions_total",
+    "Retry decisions after a retryable failure: retried, or why retrying stopped",
+    ["name", "outcome"]
+)
+RETRY_ATTEMPTS = Counter(
+    "retry_attempts_total",
+    "Attempts made under each retry policy, as the first try of a call or a retry",
+    ["name", "attempt"]
+)
+RETRY_BUDGET_TOKENS = Gauge(
+    "retry_budget_tokens",
+    "Retries currently available in the retry budget",
+    ["name"]
+)
+
+# --- Request deadlines ---
+DEADLINE_EXCEEDED = Counter(
+    "deadline_exceeded_total",
+    "Requests stopped because their deadline ran out, by the stage about to run",
+    ["stage"]
+)
+
+# --- Client disconnects ---
+CLIENT_DISCONNECTS = Counter(
+    "client_disconnects_total",
+    "Requests whose client went away before the response was ready; their in-flight work was cancelled",
+    ["route"]
+)
+CLIENT_DISCONNECT_SAVED_SECONDS = Histogram(
+    "client_disconnect_saved_seconds",
+    "Time budget each cancelled request still had left, an upper bound on the upstream time saved",
+    ["route"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+)
+
+# --- Gemini API key pool ---
+LLM_KEY_REQUESTS = Counter(
+    "llm_key_requests_total",
+    "Upstream attempts routed to each API key",
+    ["key"]
+)
+LLM_KEY_RATE_LIMITED = Counter(
+    "llm_key_rate_limited_total",
+    "429 responses per API key",
+    ["key"]
+)
+LLM_KEY_HEADROOM = Gauge(
+    "llm_key_headroom",
+    "Estimated requests each API key can still make this minute",
+    ["key"]
+)
+LLM_KEY_DRAINED = Gauge(
+    "llm_key_drained",
+    "Whether an API key is drained after being rate limited (1) or in use (0)",
+    ["key"]
+)
+
+# --- LLM providers ---
+LLM_PROVIDER_SELECTED = Counter(
+    "llm_provider_selected_total",
+    "Upstream attempts routed to each provider, as primary or as fallback",
+    ["provider", "role"]
+)
+LLM_PROVIDER_CALLS = Counter(
+    "llm_provider_calls_total",
+    "Upstream attempts per provider that succeeded or failed upstream",
+    ["provider", "outcome"]
+)
+LLM_PROVIDER_LATENCY = Histogram(
+    "llm_provider_latency_seconds",
+    "Latency of successful upstream attempts per provider (time to first chunk for streams)",
+    ["provider", "model"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+LLM_UPSTREAM_ATTEMPT_SECONDS = Histogram(
+    "llm_upstream_attempt_seconds",
+    "Duration of every upstream attempt, failed ones included (time to first chunk for streams)",
+    ["provider", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+LLM_IMAGE_BYTES = Counter(
+    "llm_image_bytes_total",
+    "Image bytes in LLM requests, by how they were sent upstream",
+    ["transport"]
+)
+
+# --- Token accounting ---
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM input and output tokens: pre-flight estimates, and actual counts from usage_metadata",
+    ["model", "kind"]
+)
+LLM_TOKEN_ESTIMATE_RATIO = Histogram(
+    "llm_token_estimate_ratio",
+    "Actual prompt tokens divided by the pre-flight estimate",
+    ["source"],
+    buckets=(0.25, 0.5, 0.75, 0.9, 1.0, 1.1, 1.25, 1.5, 2, 4)
+)
+LLM_TOKENS_TRIMMED = Counter(
+    "llm_tokens_trimmed_total",
+    "Estimated tokens trimmed from oversized requests, by prompt section",
+    ["section"]
+)
+LLM_TOKEN_BUDGET_REJECTED = Counter(
+    "llm_token_budget_rejected_total",
+    "Requests rejected before going upstream for their size",
+    ["reason"]
+)
+
+# --- Batch chat ---
+LLM_BATCH_ITEMS = Counter(
+    "llm_batch_items_total",
+    "Items in /chat/batch requests by outcome; duplicates were answered by an identical item in the same batch",
+    ["outcome"]
+)
+
+# --- Offline job queue ---
+LLM_JOBS = Gauge(
+    "llm_jobs",
+    "Jobs in the llm_jobs table by status, as last seen by a worker",
+    ["status"]
+)
+LLM_JOBS_FINISHED = Counter(
+    "llm_jobs_finished_total",
+    "Job attempts finished by a worker: succeeded, retried later, or dead-lettered",
+    ["outcome"]
+)
+LLM_JOB_QUEUE_SECONDS = Histogram(
+    "llm_job_completion_seconds",
+    "Time from enqueueing a job to its successful completion",
+    buckets=(10, 30, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 24 * 3600)
+)
+
+# --- Health ---
+LLM_HEALTH_PROBES = Counter(
+    "llm_health_probes_total",
+    "Background LLM health probes; only run when there is too little traffic to judge from",
+    ["outcome"]
+)
+LLM_READY = Gauge(
+    "llm_ready",
+    "1 if the last readiness check found the LLM path ready, else 0"
+)
+
+# --- HTTP requests ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "Time from receiving a request to the end of its response, by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled"
+)
+REQUEST_VALIDATION_SECONDS = Histogram(
+    "request_validation_seconds",
+    "Time spent validating request bodies, by model",
+    ["model"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+JWT_VERIFY_SECONDS = Histogram(
+    "jwt_verify_seconds",
+    "Time spent verifying session JWTs, by outcome",
+    ["outcome"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke a sleeping task; time it spent blocked by synchronous work",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+# --- YouTube transcripts ---
+TRANSCRIPT_FETCH_SECONDS = Histogram(
+    "transcript_fetch_seconds",
+    "Time to fetch a video transcript, retries included, by source and outcome",
+    ["source", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+
+# --- Tracing ---
+TRACE_SPANS = Counter(
+    "trace_spans_total",
+    "Finished spans written by the span exporter, or dropped because it fell behind",
+    ["outcome"]
+)
+
+# --- Logging ---
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records not written: sampled out, or dropped because the writer thread fell behind",
+    ["reason"]
+)
+
+# --- Model tiers ---
+LLM_MODEL_ROUTING = Counter(
+    "llm_model_routing_total",
+    "Model tier chosen per request, and why (auto, override, context_cache, fallback)",
+    ["tier", "reason"]
+)
+LLM_MODEL_INPUT_CHARS = Histogram(
+    "llm_model_input_chars",
+    "Estimated input size of requests routed to each model tier, in characters",
+    ["tier"],
+    buckets=(100, 500, 2000, 8000, 32000, 128000, 512000)
+)
@@ -0,0 +1,214 @@
+import math
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT, UPLOAD_REJECTIONS
+from app.utils import tracing
+from app.utils.deadline import deadline_scope
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Anything else is reported as "other" so odd clients cannot create label values
+KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies larger than max_body_bytes before they are parsed.
+
+    A declared Content-Length above the limit is answered with 413 without
+    reading the body at all. Bodies without a usable Content-Length (chunked
+    transfer, or a client that lies) are counted as they are received and the
+    request is aborted as soon as the limit is crossed.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None:
+            try:
+                declared_bytes = int(content_length)
+            except ValueError:
+                response = JSONResponse({"detail": "Invalid Content-Length header"}, status_code=status.HTTP_400_BAD_REQUEST)
+                await response(scope, receive, send)
+                return
+
+            if declared_bytes > self.max_body_bytes:
+                logger.warning(f"Rejected {scope['path']}: Content-Length {declared_bytes} exceeds {self.max_body_bytes} bytes")
+                UPLOAD_REJECTIONS.labels(reason="body_too_large").inc()
+                response = JSONResponse({"detail": self._too_large_detail()}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                await response(scope, receive, send)
+                return
+
+        received_bytes = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                received_bytes += len(message.get("body", b""))
+                if received_bytes > self.max_body_bytes:
+                    logger.warning(f"Aborted {scope['path']}: body exceeded {self.max_body_bytes} bytes while streaming")
+                    UPLOAD_REJECTIONS.labels(reason="body_too_large").inc()
+                    # Raised inside body parsing, so the app's exception handling turns it into a 413
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=self._too_large_detail()
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _too_large_detail(self) -> str:
+        return f"Request body too large. Maximum size is {self.max_body_bytes // (1024 * 1024)}MB."
+
+
+class RequestDeadlineMiddleware:
+    """
+    Give every HTTP request a total time budget.
+
+    The budget comes from the client's X-Request-Timeout header (seconds),
+    capped at max_seconds, or else from the per-path default in
+    route_seconds, or else default_seconds. It starts when the request
+    arrives, so body upload and validation count against it, and every later
+    stage (concurrency queue wait, retries, upstream HTTP timeout) only gets
+    what is left. Streaming responses are bounded until their first chunk;
+    once committed they run on the upstream read timeout.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_seconds: float,
+        max_seconds: float,
+        route_seconds: Optional[Dict[str, float]] = None
+    ):
+        self.app = app
+        self.default_seconds = default_seconds
+        self.max_seconds = max_seconds
+        self.route_seconds = route_seconds or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        seconds = self.route_seconds.get(scope["path"], self.default_seconds)
+        requested = Headers(scope=scope).get("x-request-timeout")
+        if requested is not None:
+            try:
+                seconds = float(requested)
+            except ValueError:
+                seconds = math.nan
+            if not math.isfinite(seconds) or seconds <= 0:
+                response = JSONResponse({"detail": "Invalid X-Request-Timeout header"}, status_code=status.HTTP_400_BAD_REQUEST)
+                await response(scope, receive, send)
+                return
+            seconds = min(seconds, self.max_seconds)
+
+        with deadline_scope(seconds):
+            await self.app(scope, receive, send)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the latency of every HTTP request by method, route and status class.
+
+    Routes are labelled with their template (e.g. /jobs/{job_id}) once the
+    router has matched them, and "unmatched" otherwise, so label values stay
+    bounded whatever paths clients ask for. Streaming responses are timed to
+    their last chunk.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # Reported if the app fails before starting a response
+
+        async def recording_send(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            method = scope["method"] if scope["method"] in KNOWN_METHODS else "other"
+            HTTP_REQUEST_SECONDS.labels(
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=f"{status_code // 100}xx"
+            ).observe(time.perf_counter() - started_at)
+
+
+class TracingMiddleware:
+    """
+    Open the root span of every HTTP request.
+
+    A W3C traceparent header from the client makes the request part of the
+    client's trace; otherwise a new trace starts here. The response carries
+    a traceparent header naming the request's span so the client can find
+    it. Reading the request body gets its own child span, which separates
+    upload and multipart parsing from the handler's work.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = tracing.parse_traceparent(Headers(scope=scope).get("traceparent"))
+        with tracing.span(f"{scope['method']} request", parent=parent, **{"http.method": scope["method"]}) as request_span:
+            body_span: Optional[tracing.Span] = None
+
+            async def traced_receive() -> Message:
+                nonlocal body_span
+                if body_span is None:
+                    body_span = tracing.start_span("http.receive_body")
+                message = await receive()
+                if message["type"] != "http.request" or not message.get("more_body", False):
+                    body_span.end()
+                return message
+
+            async def traced_send(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    request_span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        request_span.status = "error"
+                    MutableHeaders(scope=message).append("traceparent", request_span.context.traceparent())
+                await send(message)
+
+            try:
+                await self.app(scope, traced_receive, traced_send)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    request_span.name = f"{scope['method']} {route.path}"
+                    request_span.set_attribute("http.route", route.path)
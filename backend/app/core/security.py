@@ -1,9 +1,12 @@
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 from fastapi import HTTPException, status
+import time
 
 import jwt
 
+from app.core.metrics import JWT_VERIFY_SECONDS
+
 class Security:
     def __init__(self, secret_key: str):
         self.secret_key = secret_key
@@ -21,15 +24,19 @@ class Security:
         return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
 
     def verify_jwt_token(self, token: str) -> dict:
+        started_at = time.perf_counter()
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            JWT_VERIFY_SECONDS.labels(outcome="valid").observe(time.perf_counter() - started_at)
             return payload
         except jwt.ExpiredSignatureError:
+            JWT_VERIFY_SECONDS.labels(outcome="expired").observe(time.perf_counter() - started_at)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token has expired"
             )
         except jwt.InvalidTokenError:
+            JWT_VERIFY_SECONDS.labels(outcome="invalid").observe(time.perf_counter() - started_at)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
@@ -1,26 +1,71 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 import logging
 
 from app.core.config import settings
-from app.api import auth, llm
+from app.core.middleware import BodySizeLimitMiddleware, RequestDeadlineMiddleware, RequestMetricsMiddleware, TracingMiddleware
+from app.api import auth, llm, agent, agent_ws, jobs
+from app.utils.deadline import DeadlineExceeded
+from app.utils.loop_monitor import EventLoopLagMonitor
+from app.utils.tracing import InMemorySpanExporter, JsonLinesSpanExporter, setup_tracing, shutdown_tracing
 from app.utils.logger import setup_logging, get_logger
 
 # Setup logging before anything else
-setup_logging(log_file="app.log", level=logging.INFO)
+setup_logging(
+    log_file=settings.LOG_FILE,
+    level=logging.INFO,
+    json_format=settings.LOG_JSON,
+    max_bytes=settings.LOG_MAX_BYTES,
+    backup_count=settings.LOG_BACKUP_COUNT,
+    queue_size=settings.LOG_QUEUE_SIZE,
+    max_message_chars=settings.LOG_MAX_MESSAGE_CHARS,
+    sample_rates=settings.LOG_SAMPLE_RATES
+)
 logger = get_logger(__name__)
 
 load_dotenv()  # Load environment variables from .env file
 
+if settings.TRACING_EXPORTER == "jsonl":
+    setup_tracing(JsonLinesSpanExporter(settings.TRACING_JSONL_PATH, max_queue=settings.TRACING_MAX_QUEUED_SPANS), settings.TRACING_SAMPLE_RATIO)
+elif settings.TRACING_EXPORTER == "memory":
+    setup_tracing(InMemorySpanExporter(max_spans=settings.TRACING_MAX_QUEUED_SPANS), settings.TRACING_SAMPLE_RATIO)
+
+loop_lag_monitor = EventLoopLagMonitor(interval=settings.EVENT_LOOP_LAG_INTERVAL_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Probe the LLM in the background so health checks can answer from cache
+    llm.health_monitor.start()
+    loop_lag_monitor.start()
+    yield
+    await loop_lag_monitor.stop()
+    await llm.health_monitor.stop()
+    shutdown_tracing()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API to download YouTube videos and fetch their transcripts.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 print(settings.BACKEND_CORS_ORIGINS)
 
+# Reject oversized bodies before they are parsed (added first so CORS headers still wrap the 413)
+app.add_middleware(BodySizeLimitMiddleware, max_body_bytes=settings.MAX_REQUEST_BODY_BYTES)
+
+# Start each request's time budget as soon as it arrives
+app.add_middleware(
+    RequestDeadlineMiddleware,
+    default_seconds=settings.REQUEST_TIMEOUT_DEFAULT_SECONDS,
+    max_seconds=settings.REQUEST_TIMEOUT_MAX_SECONDS,
+    route_seconds=settings.REQUEST_TIMEOUT_ROUTE_SECONDS
+)
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -28,14 +73,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent"],
 )
 
+# Time every request end to end
+app.add_middleware(RequestMetricsMiddleware)
+
+# Open each request's root span (added last so it is the outermost middleware)
+app.add_middleware(TracingMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse({"detail": str(exc)}, status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(llm.router, tags=["Llm Processing"])
+app.include_router(agent.router, prefix="/agent", tags=["Agent"])
+app.include_router(agent_ws.router, tags=["Agent"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
 
 # Example of a root endpoint (optional)
 @app.get("/")
 async def read_root():
     logger.info("Root endpoint accessed.")
-    return {"message": "Welcome to the Taber API!"}
\ No newline at end of file
+    return {"message": "Welcome to the Taber API!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
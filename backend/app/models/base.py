@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -14,4 +15,34 @@ class User(Base):
     full_name = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    session_token = Column(String, unique=True, index=True, nullable=True)
\ No newline at end of file
+    session_token = Column(String, unique=True, index=True, nullable=True)
+
+class LlmResponseCacheEntry(Base):
+    __tablename__ = "llm_response_cache"
+
+    key = Column(String(64), primary_key=True)
+    model_name = Column(String, nullable=False)
+    reply = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True, nullable=False)
+
+class LlmJob(Base):
+    __tablename__ = "llm_jobs"
+    # Workers claim by (status, run_after); running jobs are also found by expired lease
+    __table_args__ = (Index("ix_llm_jobs_status_run_after", "status", "run_after"),)
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(String, index=True, nullable=False)
+    status = Column(String(16), nullable=False)  # queued, running, succeeded, dead
+    payload = Column(JSONB, nullable=False)  # Keyword arguments for LlmService.chat_with_llm
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    error_status = Column(Integer, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,19 +1,36 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, PrivateAttr, model_validator, validator
 import base64
-from typing import Optional, List
+import time
+from typing import Optional, List, Dict, Any
 
-class GoogleVerifyTokenRequest(BaseModel):
+from app.core.metrics import REQUEST_VALIDATION_SECONDS
+
+
+class TimedRequest(BaseModel):
+    """Base for request bodies; records how long each model takes to validate, nested models included."""
+
+    @model_validator(mode='wrap')
+    @classmethod
+    def _time_validation(cls, data, handler):
+        started_at = time.perf_counter()
+        try:
+            return handler(data)
+        finally:
+            REQUEST_VALIDATION_SECONDS.labels(model=cls.__name__).observe(time.perf_counter() - started_at)
+
+
+class GoogleVerifyTokenRequest(TimedRequest):
     id_token: str
 
-class GoogleAccessTokenRequest(BaseModel):
+class GoogleAccessTokenRequest(TimedRequest):
     access_token: str
 
-class ChatRequest(BaseModel):
+class ChatRequest(TimedRequest):
     """Basic chat request with text message only."""
     message: str = Field(..., description="The message to send to the LLM", min_length=1)
 
 
-class ChatWithSearchRequest(BaseModel):
+class ChatWithSearchRequest(TimedRequest):
     """Chat request with search functionality enabled."""
     message: str = Field(..., description="The message to send to the LLM", min_length=1)
     temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0, description="Sampling temperature")
@@ -24,6 +41,9 @@ class ImageData(BaseModel):
     """Represents image data in base64 format."""
     data: str = Field(..., description="Base64 encoded image data")
     mime_type: str = Field(..., description="MIME type of the image (e.g., 'image/jpeg')")
+
+    # Bytes decoded during validation, kept so the image is never decoded twice
+    _decoded: bytes = PrivateAttr(default=b"")
     
     @validator('mime_type')
     def validate_mime_type(cls, v):
@@ -32,11 +52,11 @@ class ImageData(BaseModel):
             raise ValueError(f"Invalid MIME type. Allowed: {allowed_types}")
         return v
     
-    @validator('data')
-    def validate_base64(cls, v):
+    @model_validator(mode='after')
+    def validate_base64(self):
         try:
-            # Try to decode to validate it's proper base64
-            decoded = base64.b64decode(v)
+            # Decode once to validate it's proper base64 and keep the result
+            decoded = base64.b64decode(self.data)
             # Basic validation - check if it's not empty
             if len(decoded) == 0:
                 raise ValueError("Empty image data")
@@ -45,16 +65,23 @@ class ImageData(BaseModel):
                 raise ValueError("Image too large (max 10MB)")
         except Exception as e:
             raise ValueError(f"Invalid base64 data: {e}")
-        return v
+        self._decoded = decoded
+        return self
 
+    @property
+    def decoded(self) -> bytes:
+        """The raw image bytes decoded during validation."""
+        return self._decoded
 
-class ChatWithImageRequest(BaseModel):
+
+class ChatWithImageRequest(TimedRequest):
     """Chat request with image(s) support."""
     message: str = Field(..., description="The message to send to the LLM", min_length=1)
     images: List[ImageData] = Field(..., description="List of images to send", min_items=1)
     use_search: bool = Field(False, description="Whether to enable Google Search")
     temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0, description="Sampling temperature")
     max_tokens: Optional[int] = Field(None, gt=0, description="Maximum tokens to generate")
+    stream: bool = Field(False, description="Stream the reply as Server-Sent Events")
     
     @validator('images')
     def validate_images_count(cls, v):
@@ -63,7 +90,7 @@ class ChatWithImageRequest(BaseModel):
         return v
 
 
-class ChatAdvancedRequest(BaseModel):
+class ChatAdvancedRequest(TimedRequest):
     """Advanced chat request supporting all features."""
     message: str = Field(..., description="The message to send to the LLM", min_length=1)
     images: Optional[List[ImageData]] = Field(None, description="List of base64 images")
@@ -82,4 +109,57 @@ class ChatAdvancedRequest(BaseModel):
     def validate_stop_sequences(cls, v):
         if v and len(v) > 10:
             raise ValueError("Maximum 10 stop sequences allowed")
-        return v
\ No newline at end of file
+        return v
+
+
+class ChatBatchRequest(TimedRequest):
+    """Independent chat requests answered in one call."""
+    items: List[ChatAdvancedRequest] = Field(..., description="Chat requests to run", min_items=1)
+    stream: bool = Field(False, description="Stream results as NDJSON, one line per item as it finishes")
+
+
+class JobCreateRequest(TimedRequest):
+    """A text chat request to run offline; poll the job for its reply."""
+    message: str = Field(..., description="The message to send to the LLM", min_length=1)
+    use_search: bool = Field(False, description="Whether to enable Google Search")
+    temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0, description="Sampling temperature")
+    max_tokens: Optional[int] = Field(None, gt=0, description="Maximum tokens to generate")
+    model_tier: Optional[str] = Field(None, description="Model tier override, e.g. 'lite'")
+
+
+class PageStateEdit(BaseModel):
+    """Replace lines [start, end) of the previous page state with `lines`."""
+    start: int = Field(..., ge=0, description="First line of the previous page state to replace (inclusive)")
+    end: int = Field(..., ge=0, description="Last line of the previous page state to replace (exclusive)")
+    lines: List[str] = Field(default_factory=list, description="Replacement lines")
+
+    @validator('end')
+    def validate_range(cls, v, values):
+        if 'start' in values and v < values['start']:
+            raise ValueError("end must not be before start")
+        return v
+
+
+class AgentSessionCreateRequest(TimedRequest):
+    """Open an agent session with the parts of the prompt that stay the same across turns."""
+    task: str = Field(..., description="The task the agent should complete", min_length=1)
+    context: Optional[str] = Field(None, description="File content shared with the agent")
+    instructions: Optional[str] = Field(None, description="Agent instructions included with every turn")
+    use_search: bool = Field(False, description="Whether to enable Google Search")
+    temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0, description="Sampling temperature")
+    max_tokens: Optional[int] = Field(None, gt=0, description="Maximum tokens to generate")
+
+
+class AgentTurnRequest(TimedRequest):
+    """One agent step. Send either the full page state or edits against the previous turn's page state."""
+    page_state: Optional[str] = Field(None, description="Full page state; use after navigation or to resync")
+    page_state_edits: Optional[List[PageStateEdit]] = Field(None, description="Line edits against the previous page state")
+    base_hash: Optional[str] = Field(None, description="page_state_hash from the previous turn; edits are rejected if it does not match")
+    actions_executed: Optional[List[Dict[str, Any]]] = Field(None, description="Actions executed since the previous turn")
+    message: Optional[str] = Field(None, description="Optional user message for this turn")
+
+    @validator('page_state_edits')
+    def validate_single_page_state_source(cls, v, values):
+        if v is not None and values.get('page_state') is not None:
+            raise ValueError("Send either page_state or page_state_edits, not both")
+        return v
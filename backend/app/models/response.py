@@ -1,5 +1,6 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional, List, Dict
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, HttpUrl
+from typing import Any, Optional, List, Dict
 
 class GoogleUserInfo(BaseModel):
     id: str
@@ -25,4 +26,40 @@ class YouTubeProcessResponse(BaseModel):
     video_download_status: str
 
 class ChatResponse(BaseModel):
-    reply: str
\ No newline at end of file
+    reply: str
+
+class ChatBatchItemResult(BaseModel):
+    index: int
+    status_code: int
+    reply: Optional[str] = None
+    error: Optional[Any] = None
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItemResult]
+
+class JobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    status: str
+    attempts: int
+    max_attempts: int
+    result: Optional[str] = None
+    error: Optional[str] = None
+    error_status: Optional[int] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobStatsResponse(BaseModel):
+    counts: Dict[str, int]
+    oldest_queued_seconds: Optional[float] = None
+
+class AgentSessionResponse(BaseModel):
+    session_id: str
+    context_cached: bool
+    expires_in: int
+
+class AgentTurnResponse(BaseModel):
+    reply: str
+    turn: int
+    page_state_hash: str
\ No newline at end of file
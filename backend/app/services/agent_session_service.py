@@ -0,0 +1,349 @@
+import asyncio
+import difflib
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.core.metrics import AGENT_SESSION_CHARS, AGENT_SESSIONS_ACTIVE
+from app.models.request import AgentSessionCreateRequest, AgentTurnRequest, PageStateEdit
+from app.services.llm_service import LlmService, LlmStreamEvent, mentions_cached_content
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def is_cache_rejection(error: HTTPException) -> bool:
+    """
+    Whether upstream refused a request because its cached prefix is gone.
+
+    Gemini answers a missing or expired CachedContent with a 404, or with a
+    403 or 400 that names the cache. Anything else (rate limits, token
+    budget, blocked content, server errors, and 403s for the API key's own
+    permissions) would fail the inline prompt too, so it is not treated as a
+    cache problem.
+    """
+    if error.status_code == status.HTTP_404_NOT_FOUND:
+        return True
+    if error.status_code == status.HTTP_403_FORBIDDEN:
+        return mentions_cached_content(str(error.detail))
+    return error.status_code == status.HTTP_400_BAD_REQUEST and "cache" in str(error.detail).lower()
+
+
+def hash_page_state(page_state: str) -> str:
+    """Short fingerprint the client echoes back as base_hash on its next turn."""
+    return hashlib.sha256(page_state.encode("utf-8")).hexdigest()[:16]
+
+
+def apply_page_state_edits(page_state: str, edits: List[PageStateEdit]) -> str:
+    """
+    Apply line edits to a page state.
+
+    All edit ranges refer to line numbers in the original page state and must
+    not overlap.
+
+    Raises:
+        ValueError: If an edit is out of range or overlaps another edit.
+    """
+    lines = page_state.split("\n")
+    result: List[str] = []
+    cursor = 0
+
+    for edit in sorted(edits, key=lambda e: (e.start, e.end)):
+        if edit.start < cursor:
+            raise ValueError(f"Overlapping page state edit at line {edit.start}")
+        if edit.end > len(lines):
+            raise ValueError(f"Page state edit [{edit.start}, {edit.end}) is past the last line ({len(lines)})")
+        result.extend(lines[cursor:edit.start])
+        result.extend(edit.lines)
+        cursor = edit.end
+
+    result.extend(lines[cursor:])
+    return "\n".join(result)
+
+
+def compute_page_state_edits(old_page_state: str, new_page_state: str) -> List[PageStateEdit]:
+    """Compute the line edits that turn one page state into another (the inverse of apply_page_state_edits)."""
+    old_lines = old_page_state.split("\n")
+    new_lines = new_page_state.split("\n")
+    matcher = difflib.SequenceMatcher(a=old_lines, b=new_lines, autojunk=False)
+    return [
+        PageStateEdit(start=i1, end=i2, lines=new_lines[j1:j2])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+@dataclass
+class AgentSession:
+    """Server-side state for one multi-step agent task."""
+    session_id: str
+    user_id: str
+    task: str
+    context: Optional[str]
+    instructions: Optional[str]
+    use_search: bool
+    generation_kwargs: Dict[str, Any]
+    cached_content: Optional[str] = None
+    page_state: str = ""
+    turn: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def page_state_hash(self) -> str:
+        return hash_page_state(self.page_state)
+
+    @property
+    def stable_prefix(self) -> str:
+        """The part of the prompt that never changes: task and file context."""
+        prefix = f"<task>{self.task}</task>"
+        if self.context:
+            prefix += f"<context>{self.context}</context>"
+        return prefix
+
+
+class AgentSessionService:
+    """
+    Keeps agent sessions in memory so each turn only has to carry what changed.
+
+    The task, file context and instructions are sent once when the session is
+    opened. Each turn carries the page state (or line edits against the
+    previous one) and the executed actions, and the full prompt is rebuilt
+    here. When the stable prefix is large enough it is stored with Gemini
+    context caching instead of being re-sent upstream on every turn.
+
+    Sessions live in this worker's memory; with several workers the client
+    must be routed to the same worker or reopen the session on a 404.
+    """
+
+    def __init__(
+        self,
+        llm_service: LlmService,
+        ttl_seconds: int = 900,
+        max_sessions: int = 1000,
+        context_cache_min_chars: int = 16000,
+        context_cache_timeout: float = 15.0
+    ):
+        self.llm_service = llm_service
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.context_cache_min_chars = context_cache_min_chars
+        self.context_cache_timeout = context_cache_timeout
+        self._sessions: "OrderedDict[str, AgentSession]" = OrderedDict()
+
+    async def create_session(self, user_id: str, request: AgentSessionCreateRequest) -> AgentSession:
+        await self._evict_expired()
+
+        generation_kwargs = {"temperature": request.temperature}
+        if request.max_tokens:
+            generation_kwargs["max_tokens"] = request.max_tokens
+
+        session = AgentSession(
+            session_id=uuid.uuid4().hex,
+            user_id=user_id,
+            task=request.task,
+            context=request.context,
+            instructions=request.instructions,
+            use_search=request.use_search,
+            generation_kwargs=generation_kwargs
+        )
+
+        # Cached content cannot be combined with per-request tools, so search sessions always send the prefix inline
+        prefix_chars = len(session.stable_prefix) + len(session.instructions or "")
+        if not session.use_search and prefix_chars >= self.context_cache_min_chars:
+            session.cached_content = await self.llm_service.create_context_cache(
+                prefix=session.stable_prefix,
+                system_instruction=session.instructions,
+                ttl_seconds=self.ttl_seconds,
+                display_name=f"agent-session-{session.session_id}",
+                timeout=self.context_cache_timeout
+            )
+
+        self._sessions[session.session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            _, oldest = self._sessions.popitem(last=False)
+            await self._release(oldest)
+        AGENT_SESSIONS_ACTIVE.set(len(self._sessions))
+
+        logger.info(f"Opened agent session {session.session_id} (prefix {prefix_chars} chars, context cached: {bool(session.cached_content)})")
+        return session
+
+    async def get_session(self, session_id: str, user_id: str) -> AgentSession:
+        await self._evict_expired()
+
+        session = self._sessions.get(session_id)
+        if session is None or session.user_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Agent session not found or expired"
+            )
+
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def run_turn(self, session_id: str, user_id: str, request: AgentTurnRequest) -> Tuple[str, AgentSession]:
+        """
+        Apply the turn's page state update, rebuild the prompt and ask the LLM for the next actions.
+
+        The session only advances when the LLM call succeeds, so a client can
+        safely retry a failed turn with the same edits and base_hash.
+        """
+        session = await self.get_session(session_id, user_id)
+
+        async with session.lock:
+            page_state, received_chars = self._resolve_page_state(session, request)
+            reply, content = await self._call_llm(session, page_state, request, self.llm_service.chat_with_llm)
+            self._commit_turn(session, page_state, received_chars, content)
+
+        return reply, session
+
+    async def run_turn_stream(self, session_id: str, user_id: str, request: AgentTurnRequest) -> AsyncIterator[LlmStreamEvent]:
+        """
+        Streaming variant of run_turn.
+
+        Errors before the first chunk are raised as HTTPException. The final
+        "done" event is extended with the new turn number and page_state_hash;
+        the session does not advance if the stream ends with an "error" event.
+        """
+        session = await self.get_session(session_id, user_id)
+
+        async with session.lock:
+            page_state, received_chars = self._resolve_page_state(session, request)
+            events, content = await self._call_llm(session, page_state, request, self.llm_service.open_chat_stream)
+
+            async for event in events:
+                if event.event == "done":
+                    self._commit_turn(session, page_state, received_chars, content)
+                    event.data.update(turn=session.turn, page_state_hash=session.page_state_hash)
+                yield event
+
+    async def _call_llm(
+        self,
+        session: AgentSession,
+        page_state: str,
+        request: AgentTurnRequest,
+        llm_call: Callable[..., Awaitable[Any]]
+    ) -> Tuple[Any, str]:
+        """Call the LLM with the cached prefix if there is one, falling back to the full inline prompt."""
+        continuation = session.turn > 0
+
+        if session.cached_content:
+            content = self._build_turn_suffix(page_state, request, continuation)
+            try:
+                result = await llm_call(
+                    content,
+                    use_search=session.use_search,
+                    cached_content=session.cached_content,
+                    user_id=session.user_id,
+                    **session.generation_kwargs
+                )
+                return result, content
+            except HTTPException as e:
+                if not is_cache_rejection(e):
+                    raise
+                # The cached content expired or was removed upstream; send the prefix inline from now on
+                logger.warning(f"Cached prefix rejected for session {session.session_id}, sending inline: {e.detail}")
+                await self.llm_service.delete_context_cache(session.cached_content)
+                session.cached_content = None
+
+        # Instructions go where the cached path has them (stored with the cache as the system instruction)
+        content = self._build_full_prompt(session, page_state, request, continuation)
+        result = await llm_call(
+            content,
+            use_search=session.use_search,
+            system_instruction=session.instructions,
+            user_id=session.user_id,
+            **session.generation_kwargs
+        )
+        return result, content
+
+    def _commit_turn(self, session: AgentSession, page_state: str, received_chars: int, content: str) -> None:
+        session.page_state = page_state
+        session.turn += 1
+        session.last_used = time.monotonic()
+
+        AGENT_SESSION_CHARS.labels(kind="received").inc(received_chars)
+        AGENT_SESSION_CHARS.labels(kind="prompt").inc(len(content))
+        logger.info(f"Agent session {session.session_id} turn {session.turn}: received {received_chars} chars, prompt {len(content)} chars")
+
+    async def close_session(self, session_id: str, user_id: str) -> None:
+        session = await self.get_session(session_id, user_id)
+        del self._sessions[session_id]
+        AGENT_SESSIONS_ACTIVE.set(len(self._sessions))
+        await self._release(session)
+        logger.info(f"Closed agent session {session_id}")
+
+    def _resolve_page_state(self, session: AgentSession, request: AgentTurnRequest) -> Tuple[str, int]:
+        """Return the page state for this turn and how many characters of it the client actually sent."""
+        if request.page_state is not None:
+            return request.page_state, len(request.page_state)
+
+        if not request.page_state_edits:
+            return session.page_state, 0
+
+        if request.base_hash is not None and request.base_hash != session.page_state_hash:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Page state out of sync with the session; resend the full page_state"
+            )
+
+        try:
+            page_state = apply_page_state_edits(session.page_state, request.page_state_edits)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid page_state_edits: {e}"
+            )
+
+        received_chars = sum(len(line) + 1 for edit in request.page_state_edits for line in edit.lines)
+        return page_state, received_chars
+
+    @staticmethod
+    def _build_turn_suffix(page_state: str, request: AgentTurnRequest, continuation: bool) -> str:
+        """The per-turn part of the prompt: everything after the stable prefix."""
+        suffix = ""
+        if continuation:
+            suffix += "<task>Page updated. Continue with task.</task>"
+        if request.message:
+            suffix += f"<user_message>{request.message}</user_message>"
+        suffix += f"<page_state>{page_state}</page_state>"
+        if request.actions_executed:
+            suffix += f"<action_executed>{json.dumps(request.actions_executed)}</action_executed>"
+        return suffix
+
+    def _build_full_prompt(self, session: AgentSession, page_state: str, request: AgentTurnRequest, continuation: bool) -> str:
+        """Rebuild the prompt the extension's PromptBuilder would send, minus the instructions (sent as the system instruction)."""
+        if continuation:
+            prompt = f"<task>Page updated. Continue with task: {session.task}</task>"
+            if session.context:
+                prompt += f"<context>{session.context}</context>"
+        else:
+            prompt = session.stable_prefix
+        if request.message:
+            prompt += f"<user_message>{request.message}</user_message>"
+        prompt += f"<page_state>{page_state}</page_state>"
+        if request.actions_executed:
+            prompt += f"<action_executed>{json.dumps(request.actions_executed)}</action_executed>"
+        return prompt
+
+    async def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [s for s in self._sessions.values() if now - s.last_used > self.ttl_seconds]
+        for session in expired:
+            del self._sessions[session.session_id]
+            await self._release(session)
+        if expired:
+            logger.info(f"Evicted {len(expired)} idle agent session(s)")
+            AGENT_SESSIONS_ACTIVE.set(len(self._sessions))
+
+    async def _release(self, session: AgentSession) -> None:
+        if session.cached_content:
+            await self.llm_service.delete_context_cache(session.cached_content)
+            session.cached_content = None
@@ -0,0 +1,105 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Set
+
+from google.genai import types
+
+from app.core.metrics import LLM_FILE_REGISTRY_LOOKUPS, LLM_FILE_UPLOADS, LLM_FILE_REGISTRY_BYTES_REUSED
+from app.utils.logger import get_logger
+from app.utils.single_flight import SingleFlight
+
+logger = get_logger(__name__)
+
+# Uploaded files are kept upstream for 48 hours; used when the API does not report an expiry
+DEFAULT_FILE_TTL_SECONDS = 48 * 3600
+
+FileUploader = Callable[[bytes, str], Awaitable[types.File]]
+
+
+@dataclass
+class RegisteredFile:
+    uri: str
+    name: Optional[str]
+    size: int
+    expires_at: float  # Unix timestamp
+
+
+class FileRegistry:
+    """
+    Content-addressed registry of images already uploaded through the Files API.
+
+    The first time an image of at least min_bytes (after preprocessing) is
+    seen it is uploaded once and later requests reference the returned file
+    URI instead of sending the bytes inline again. Entries are evicted least-recently-used beyond
+    max_entries, and dropped expiry_margin_seconds before the upstream file
+    expires so a request never references a file that is about to disappear.
+    Upload failures are logged and the image is sent inline.
+    """
+
+    def __init__(self, max_entries: int = 512, min_bytes: int = 32 * 1024, expiry_margin_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.min_bytes = min_bytes
+        self.expiry_margin_seconds = expiry_margin_seconds
+        self._entries: "OrderedDict[str, RegisteredFile]" = OrderedDict()
+        self._in_flight = SingleFlight(name="file_upload")
+
+    async def resolve(self, data: bytes, mime_type: str, upload: FileUploader) -> Optional[str]:
+        """Return a file URI for the image, uploading it if needed, or None to send it inline."""
+        if len(data) < self.min_bytes:
+            return None
+
+        key = f"{mime_type}:{hashlib.sha256(data).hexdigest()}"
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at - self.expiry_margin_seconds > time.time():
+                self._entries.move_to_end(key)
+                LLM_FILE_REGISTRY_LOOKUPS.labels(outcome="hit").inc()
+                LLM_FILE_REGISTRY_BYTES_REUSED.inc(entry.size)
+                return entry.uri
+            del self._entries[key]
+            LLM_FILE_REGISTRY_LOOKUPS.labels(outcome="expired").inc()
+        else:
+            LLM_FILE_REGISTRY_LOOKUPS.labels(outcome="miss").inc()
+
+        entry = await self._in_flight.do(key, lambda: self._upload(key, data, mime_type, upload))
+        return entry.uri if entry else None
+
+    async def _upload(self, key: str, data: bytes, mime_type: str, upload: FileUploader) -> Optional[RegisteredFile]:
+        try:
+            uploaded = await upload(data, mime_type)
+        except Exception as e:
+            logger.warning(f"File upload failed, sending image inline: {e}")
+            LLM_FILE_UPLOADS.labels(outcome="error").inc()
+            return None
+
+        if not uploaded.uri or uploaded.state == types.FileState.FAILED:
+            logger.warning(f"File upload {uploaded.name} did not produce a usable file (state: {uploaded.state})")
+            LLM_FILE_UPLOADS.labels(outcome="error").inc()
+            return None
+
+        if uploaded.expiration_time is not None:
+            expires_at = uploaded.expiration_time.timestamp()
+        else:
+            expires_at = time.time() + DEFAULT_FILE_TTL_SECONDS
+
+        entry = RegisteredFile(uri=uploaded.uri, name=uploaded.name, size=len(data), expires_at=expires_at)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        LLM_FILE_UPLOADS.labels(outcome="success").inc()
+        logger.info(f"Uploaded {mime_type} image ({len(data)} bytes) as {uploaded.name}")
+        return entry
+
+    def forget(self, uris: Set[str]) -> None:
+        """Drop entries whose file was rejected upstream so the image is uploaded again next time."""
+        stale = [key for key, entry in self._entries.items() if entry.uri in uris]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            logger.warning(f"Forgot {len(stale)} uploaded file(s) rejected upstream")
+
+    def __len__(self) -> int:
+        return len(self._entries)
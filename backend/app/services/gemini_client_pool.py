@@ -0,0 +1,179 @@
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from google import genai
+from google.genai import types
+
+from app.core.metrics import LLM_KEY_REQUESTS, LLM_KEY_RATE_LIMITED, LLM_KEY_HEADROOM, LLM_KEY_DRAINED
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class KeyPoolExhausted(Exception):
+    """Raised when every usable API key is drained after being rate limited."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Every Gemini API key is rate limited")
+        self.retry_after = retry_after
+
+
+def parse_api_keys(primary_key: str, extra_keys: str) -> List[Tuple[str, str]]:
+    """
+    Build (label, key) pairs from the primary key and a comma-separated list of extra keys.
+
+    Extra keys may be written as "label=key" (e.g. the project they belong
+    to); unlabelled keys are numbered. Labels end up in logs and metrics, keys
+    never do.
+    """
+    keys = [("primary", primary_key)]
+    for index, entry in enumerate(part.strip() for part in extra_keys.split(",")):
+        if not entry:
+            continue
+        label, separator, key = entry.partition("=")
+        if not separator:
+            label, key = f"key-{index + 1}", entry
+        keys.append((label.strip(), key.strip()))
+    return keys
+
+
+class PooledClient:
+    """One API key's client plus a local token-bucket estimate of its remaining quota."""
+
+    def __init__(self, label: str, client: genai.Client, requests_per_minute: float):
+        self.label = label
+        self.client = client
+        self.requests_per_minute = requests_per_minute
+        self.drained_until = 0.0
+        self._tokens = requests_per_minute
+        self._refilled_at = time.monotonic()
+
+    def headroom(self) -> float:
+        """Requests this key can still make in the current minute, by our estimate."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.requests_per_minute,
+            self._tokens + (now - self._refilled_at) * self.requests_per_minute / 60
+        )
+        self._refilled_at = now
+        return self._tokens
+
+    def take(self) -> None:
+        # May go negative: a key used beyond its estimate should be the last choice for a while
+        self._tokens = self.headroom() - 1
+        LLM_KEY_HEADROOM.labels(key=self.label).set(self._tokens)
+
+    def drained(self) -> bool:
+        return time.monotonic() < self.drained_until
+
+    def drain(self, seconds: float) -> None:
+        self.drained_until = max(self.drained_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        LLM_KEY_HEADROOM.labels(key=self.label).set(self._tokens)
+        LLM_KEY_DRAINED.labels(key=self.label).set(1)
+
+
+class GeminiClientPool:
+    """
+    genai clients for several API keys or projects, with quota-aware routing.
+
+    Each request goes to the key with the most estimated headroom. Headroom
+    comes from a per-key token bucket refilled at requests_per_minute. A key
+    that answers 429 is drained: it gets no traffic for the upstream's retry
+    hint, or drain_seconds without one. Each key has its own client, so its
+    own connection pool, configured explicitly with the given limits and
+    timeout.
+
+    Uploaded files and context caches belong to the project that created
+    them, so requests that reference them are pinned to the primary key.
+    """
+
+    def __init__(
+        self,
+        api_keys: List[Tuple[str, str]],
+        requests_per_minute: float = 60.0,
+        drain_seconds: float = 30.0,
+        timeout: float = 60.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0
+    ):
+        if not api_keys:
+            raise ValueError("At least one API key is required")
+        self.drain_seconds = drain_seconds
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._clients = [
+            PooledClient(
+                label,
+                genai.Client(
+                    api_key=key,
+                    http_options=types.HttpOptions(
+                        timeout=int(timeout * 1000),
+                        client_args={"limits": limits},
+                        async_client_args={"limits": limits}
+                    )
+                ),
+                requests_per_minute
+            )
+            for label, key in api_keys
+        ]
+        for pooled in self._clients:
+            LLM_KEY_HEADROOM.labels(key=pooled.label).set(requests_per_minute)
+            LLM_KEY_DRAINED.labels(key=pooled.label).set(0)
+
+    @property
+    def primary(self) -> PooledClient:
+        return self._clients[0]
+
+    def acquire(self, pinned: bool = False) -> PooledClient:
+        """
+        Pick the client for one upstream attempt.
+
+        Args:
+            pinned: Use the primary key, because the request references its files or caches
+
+        Raises:
+            KeyPoolExhausted: If every usable key is drained.
+        """
+        candidates = [self.primary] if pinned else self._clients
+        available = [pooled for pooled in candidates if not pooled.drained()]
+        if not available:
+            retry_after = min(pooled.drained_until for pooled in candidates) - time.monotonic()
+            raise KeyPoolExhausted(max(1, math.ceil(retry_after)))
+
+        pooled = max(available, key=lambda candidate: candidate.headroom())
+        pooled.take()
+        LLM_KEY_DRAINED.labels(key=pooled.label).set(0)
+        LLM_KEY_REQUESTS.labels(key=pooled.label).inc()
+        return pooled
+
+    def record_rate_limited(self, pooled: PooledClient, retry_after: Optional[float] = None) -> None:
+        seconds = retry_after if retry_after is not None else self.drain_seconds
+        logger.warning(f"Gemini key '{pooled.label}' rate limited; draining it for {seconds:.0f}s")
+        pooled.drain(seconds)
+        LLM_KEY_RATE_LIMITED.labels(key=pooled.label).inc()
+
+    async def count_tokens(self, model: str, text: str) -> int:
+        """Exact token count for the text; count_tokens has its own quota, so the primary key serves it."""
+        response = await self.primary.client.aio.models.count_tokens(model=model, contents=text)
+        return response.total_tokens
+
+    def has_available_key(self) -> bool:
+        return any(not pooled.drained() for pooled in self._clients)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Estimated headroom and drain state of every key, by label."""
+        now = time.monotonic()
+        return {
+            pooled.label: {
+                "headroom": round(pooled.headroom(), 1),
+                "drained_for": math.ceil(pooled.drained_until - now) if pooled.drained() else None,
+            }
+            for pooled in self._clients
+        }
@@ -6,6 +6,7 @@ import logging
 import requests
 
 from app.models.response import GoogleUserInfo
+from app.utils import tracing
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -16,11 +17,12 @@ class GoogleAuthService:
 
     def verify_and_get_user_info(self, id_token: str) -> GoogleUserInfo:
         try:
-            decoded_id_token = google_id_token.verify_oauth2_token(
-                id_token,
-                google_requests.Request(),
-                self.google_client_id
-            )
+            with tracing.span("google_auth.verify_id_token"):
+                decoded_id_token = google_id_token.verify_oauth2_token(
+                    id_token,
+                    google_requests.Request(),
+                    self.google_client_id
+                )
             logger.info("Google ID token verified successfully.")
 
             user_id = decoded_id_token.get("sub")
@@ -58,11 +60,13 @@ class GoogleAuthService:
         """Verify Google access token and extract user info (for Chrome extensions)"""
         try:
             # Call Google's userinfo endpoint to verify access token and get user data
-            response = requests.get(
-                "https://www.googleapis.com/oauth2/v2/userinfo",
-                headers={"Authorization": f"Bearer {access_token}"},
-                timeout=10
-            )
+            with tracing.span("google_auth.userinfo") as userinfo_span:
+                response = requests.get(
+                    "https://www.googleapis.com/oauth2/v2/userinfo",
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    timeout=10
+                )
+                userinfo_span.set_attribute("http.status_code", response.status_code)
             
             if not response.ok:
                 logger.error(f"Google userinfo API returned status {response.status_code}")
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.metrics import LLM_HEALTH_PROBES, LLM_READY
+from app.services.llm_service import LlmService
+from app.utils.deadline import deadline_scope
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class LlmHealthMonitor:
+    """
+    Readiness of the LLM path from cached signals, so a probe request never calls upstream.
+
+    Three signals are combined, strongest first:
+    - Circuits: if every circuit for plain generation is open, the service is not ready.
+    - Traffic: if real calls in the provider router's window show a provider
+      answering well (or all of them failing), that decides.
+    - Probe: otherwise the last background probe decides, as long as it is
+      younger than stale_seconds.
+    Between traffic drying up and the next probe, the last verdict from
+    either stands until it too is stale_seconds old. Before the first
+    verdict (from process start until traffic or the first probe decides)
+    the service reports "starting" and counts as ready, so a fresh instance
+    is not failed before anything has had a chance to answer.
+
+    The background task only probes when there is too little traffic to
+    judge from, so a busy service spends no quota on health checks.
+    """
+
+    def __init__(self, llm_service: LlmService, probe_interval: float = 30.0, stale_seconds: float = 120.0, probe_timeout: float = 10.0):
+        self.llm_service = llm_service
+        self.probe_interval = probe_interval
+        self.stale_seconds = stale_seconds
+        self.probe_timeout = probe_timeout
+        self._last_probe: Optional[Tuple[float, bool]] = None  # (monotonic time, healthy)
+        self._last_verdict: Optional[Tuple[float, bool]] = None  # Last readiness decided by traffic or a probe
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            if self.llm_service.providers.serving() is None:
+                await self.probe()
+            await asyncio.sleep(self.probe_interval)
+
+    async def probe(self) -> bool:
+        """Run one small live generation and remember the outcome."""
+        try:
+            with deadline_scope(self.probe_timeout):
+                healthy = await self.llm_service.health_check()
+        except Exception as e:
+            logger.warning(f"LLM health probe failed: {e}")
+            healthy = False
+        self._last_probe = (time.monotonic(), healthy)
+        LLM_HEALTH_PROBES.labels(outcome="healthy" if healthy else "unhealthy").inc()
+        return healthy
+
+    def status(self) -> Tuple[bool, str, Dict[str, Any]]:
+        """
+        Current readiness; cheap enough to call on every probe request.
+
+        Returns:
+            Tuple: (ready, the signal that decided it, probe details)
+        """
+        now = time.monotonic()
+        probe = {"age_seconds": None, "healthy": None}
+        if self._last_probe is not None:
+            probed_at, probe_healthy = self._last_probe
+            probe = {"age_seconds": round(now - probed_at, 1), "healthy": probe_healthy}
+
+        circuit_breakers = self.llm_service.circuit_breakers
+        if circuit_breakers is not None and circuit_breakers.all_open("generate"):
+            ready, reason = False, "circuit_open"
+        else:
+            serving = self.llm_service.providers.serving()
+            if serving is not None:
+                ready, reason = serving, "traffic"
+            elif probe["age_seconds"] is not None and probe["age_seconds"] <= self.stale_seconds:
+                ready, reason = probe["healthy"], "probe"
+            elif self._last_verdict is None:
+                ready, reason = True, "starting"
+            elif now - self._last_verdict[0] <= self.stale_seconds:
+                ready, reason = self._last_verdict[1], "last_known"
+            else:
+                ready, reason = False, "stale"
+            if reason in ("traffic", "probe"):
+                self._last_verdict = (now, ready)
+
+        LLM_READY.set(1 if ready else 0)
+        return ready, reason, probe
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import io
+from collections import OrderedDict
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.metrics import IMAGE_PREPROCESS_BYTES, IMAGE_PREPROCESS_CACHE
+from app.utils.logger import get_logger
+from app.utils.single_flight import SingleFlight
+
+logger = get_logger(__name__)
+
+OUTPUT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+
+class ImagePreprocessor:
+    """
+    Downscale and recompress images before they are sent to the LLM.
+
+    Screenshots usually arrive as full-resolution PNGs, far above the
+    resolution the model actually sees. Images whose longest edge exceeds
+    max_edge are resized and every image is re-encoded at the target format
+    and quality; the original is kept whenever re-encoding would not make it
+    smaller. Results are cached by content hash, and concurrent requests for
+    the same image share one transform, so a screenshot that is sent again is
+    only processed once. Decoding and encoding run in a worker thread to keep
+    them off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_edge: int = 1536,
+        output_format: str = "webp",
+        quality: int = 80,
+        cache_max_entries: int = 256,
+        cache_max_bytes: int = 64 * 1024 * 1024
+    ):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}. Allowed: {set(OUTPUT_FORMATS)}")
+        self.max_edge = max_edge
+        self.output_format = output_format
+        self.quality = quality
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
+        self._cache: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._in_flight = SingleFlight(name="image_preprocess")
+
+    async def process(self, data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        """Return the (possibly) smaller image bytes and their MIME type."""
+        key = hashlib.sha256(data).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            IMAGE_PREPROCESS_CACHE.labels(outcome="hit").inc()
+            return cached
+        IMAGE_PREPROCESS_CACHE.labels(outcome="miss").inc()
+
+        return await self._in_flight.do(key, lambda: self._process_uncached(key, data, mime_type))
+
+    async def _process_uncached(self, key: str, data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        try:
+            result = await asyncio.to_thread(self._transform, data, mime_type)
+        except Exception as e:
+            # Never fail a request because of preprocessing; Gemini accepts the original
+            logger.warning(f"Image preprocessing failed, sending original ({mime_type}, {len(data)} bytes): {e}")
+            result = (data, mime_type)
+
+        IMAGE_PREPROCESS_BYTES.labels(stage="in").inc(len(data))
+        IMAGE_PREPROCESS_BYTES.labels(stage="out").inc(len(result[0]))
+        self._remember(key, result)
+        return result
+
+    def _transform(self, data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        with Image.open(io.BytesIO(data)) as image:
+            if getattr(image, "is_animated", False):
+                # Re-encoding would drop every frame but the first
+                return data, mime_type
+
+            # Let the JPEG decoder downscale while decoding when the target is much smaller
+            image.draft("RGB", (self.max_edge, self.max_edge))
+            image = ImageOps.exif_transpose(image)
+            if max(image.size) > self.max_edge:
+                image.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+
+            pil_format, output_mime_type = OUTPUT_FORMATS[self.output_format]
+            image = self._convert_mode(image, pil_format)
+
+            buffer = io.BytesIO()
+            image.save(buffer, format=pil_format, quality=self.quality)
+
+        output = buffer.getvalue()
+        if len(output) >= len(data):
+            return data, mime_type
+        return output, output_mime_type
+
+    @staticmethod
+    def _convert_mode(image: Image.Image, pil_format: str) -> Image.Image:
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if pil_format == "WEBP" and has_alpha:
+            return image.convert("RGBA")
+        if has_alpha:
+            # JPEG has no alpha channel; flatten onto white like a browser would
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            return background
+        if image.mode != "RGB":
+            return image.convert("RGB")
+        return image
+
+    def _remember(self, key: str, result: Tuple[bytes, str]) -> None:
+        size = len(result[0])
+        if size > self.cache_max_bytes:
+            return
+
+        self._cache[key] = result
+        self._cache_bytes += size
+        while len(self._cache) > self.cache_max_entries or self._cache_bytes > self.cache_max_bytes:
+            _, (evicted, _) = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
@@ -0,0 +1,211 @@
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.core.metrics import LLM_JOBS_FINISHED
+from app.models.base import LlmJob
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_DEAD = "dead"
+JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_DEAD)
+
+# Status codes a job may succeed on later: rate limits, overload, upstream failures and timeouts
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class ClaimedJob:
+    """A job a worker has leased, detached from its database session."""
+    id: str
+    user_id: str
+    payload: Dict[str, Any]
+    attempts: int
+    max_attempts: int
+    created_at: datetime
+
+
+class JobQueue:
+    """
+    Durable queue of offline LLM jobs in the llm_jobs table.
+
+    Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+    of them can poll the table without handing out a job twice. A claim is a
+    lease: a job whose worker died is claimed again once locked_until has
+    passed, unless that was its last attempt. Failed jobs are retried with exponential backoff while the error
+    is retryable and attempts remain, and are dead-lettered (status "dead")
+    otherwise, where they stay until retried by hand.
+
+    Methods block on the database; call them from a thread in async code.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_attempts: int = 5,
+        lease_seconds: float = 900.0,
+        retry_base_seconds: float = 30.0,
+        retry_max_seconds: float = 3600.0
+    ):
+        self.session_factory = session_factory
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+    def enqueue(self, user_id: str, payload: Dict[str, Any]) -> LlmJob:
+        job = LlmJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            status=JOB_QUEUED,
+            payload=payload,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            run_after=datetime.utcnow()
+        )
+        db = self.session_factory()
+        try:
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            return job
+        finally:
+            db.close()
+
+    def get(self, job_id: str, user_id: str) -> Optional[LlmJob]:
+        db = self.session_factory()
+        try:
+            return db.query(LlmJob).filter(LlmJob.id == job_id, LlmJob.user_id == user_id).first()
+        finally:
+            db.close()
+
+    def claim(self, worker_id: str, limit: int) -> List[ClaimedJob]:
+        """Lease up to `limit` runnable jobs to this worker, oldest first."""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            jobs = db.query(LlmJob).filter(or_(
+                and_(LlmJob.status == JOB_QUEUED, LlmJob.run_after <= now),
+                and_(LlmJob.status == JOB_RUNNING, LlmJob.locked_until < now)
+            )).order_by(LlmJob.run_after).limit(limit).with_for_update(skip_locked=True).all()
+
+            claimed = []
+            for job in jobs:
+                if job.status == JOB_RUNNING:
+                    if job.attempts >= job.max_attempts:
+                        # Its last attempt killed or hung the worker; leasing it again would repeat that forever
+                        logger.warning(f"Dead-lettering job {job.id}; the lease on its last attempt expired (held by {job.locked_by})")
+                        job.status = JOB_DEAD
+                        job.error = f"Worker lease expired on attempt {job.attempts} of {job.max_attempts}"
+                        job.error_status = 504
+                        job.locked_by = None
+                        job.locked_until = None
+                        job.finished_at = now
+                        LLM_JOBS_FINISHED.labels(outcome="dead").inc()
+                        continue
+                    logger.warning(f"Reclaiming job {job.id}; its lease held by {job.locked_by} expired")
+                job.status = JOB_RUNNING
+                job.locked_by = worker_id
+                job.locked_until = now + timedelta(seconds=self.lease_seconds)
+                job.attempts += 1
+                job.started_at = now
+                claimed.append(ClaimedJob(
+                    id=job.id,
+                    user_id=job.user_id,
+                    payload=job.payload,
+                    attempts=job.attempts,
+                    max_attempts=job.max_attempts,
+                    created_at=job.created_at
+                ))
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def complete(self, job: ClaimedJob, worker_id: str, result: str) -> bool:
+        """Store the job's result. False if the lease was lost and another worker owns the job now."""
+        return self._finish(job, worker_id, {
+            LlmJob.status: JOB_SUCCEEDED,
+            LlmJob.result: result,
+            LlmJob.error: None,
+            LlmJob.error_status: None,
+        })
+
+    def fail(self, job: ClaimedJob, worker_id: str, status_code: int, error: str) -> str:
+        """Schedule a retry or dead-letter the job. Returns the job's new status."""
+        if status_code in RETRYABLE_STATUS_CODES and job.attempts < job.max_attempts:
+            # Full jitter, so jobs failed by the same outage do not come back together
+            backoff = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (job.attempts - 1))
+            new_status = JOB_QUEUED
+            values = {LlmJob.run_after: datetime.utcnow() + timedelta(seconds=random.uniform(backoff / 2, backoff))}
+        else:
+            new_status = JOB_DEAD
+            values = {}
+        values.update({LlmJob.status: new_status, LlmJob.error: error, LlmJob.error_status: status_code})
+        self._finish(job, worker_id, values)
+        return new_status
+
+    def _finish(self, job: ClaimedJob, worker_id: str, values: Dict[Any, Any]) -> bool:
+        values.update({LlmJob.locked_by: None, LlmJob.locked_until: None})
+        if values[LlmJob.status] != JOB_QUEUED:
+            values[LlmJob.finished_at] = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            updated = db.query(LlmJob).filter(
+                LlmJob.id == job.id,
+                LlmJob.status == JOB_RUNNING,
+                LlmJob.locked_by == worker_id
+            ).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if not updated:
+            logger.warning(f"Lost the lease on job {job.id}; discarding this worker's outcome")
+        return bool(updated)
+
+    def retry_dead(self, job_id: str, user_id: str) -> bool:
+        """Put a dead-lettered job back in the queue with a fresh set of attempts."""
+        db = self.session_factory()
+        try:
+            updated = db.query(LlmJob).filter(
+                LlmJob.id == job_id,
+                LlmJob.user_id == user_id,
+                LlmJob.status == JOB_DEAD
+            ).update({
+                LlmJob.status: JOB_QUEUED,
+                LlmJob.attempts: 0,
+                LlmJob.run_after: datetime.utcnow(),
+                LlmJob.finished_at: None,
+            }, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Job counts by status and the age of the oldest queued job, for everyone or one user."""
+        db = self.session_factory()
+        try:
+            query = db.query(LlmJob.status, func.count(LlmJob.id), func.min(LlmJob.created_at))
+            if user_id is not None:
+                query = query.filter(LlmJob.user_id == user_id)
+            rows = query.group_by(LlmJob.status).all()
+        finally:
+            db.close()
+
+        counts = {job_status: 0 for job_status in JOB_STATUSES}
+        oldest_queued_seconds = None
+        for job_status, count, oldest in rows:
+            counts[job_status] = count
+            if job_status == JOB_QUEUED and oldest is not None:
+                oldest_queued_seconds = (datetime.utcnow() - oldest).total_seconds()
+        return {"counts": counts, "oldest_queued_seconds": oldest_queued_seconds}
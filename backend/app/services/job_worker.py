@@ -0,0 +1,98 @@
+import asyncio
+import os
+import socket
+from datetime import datetime
+from typing import Optional
+
+from app.core.metrics import LLM_JOBS_FINISHED, LLM_JOBS, LLM_JOB_QUEUE_SECONDS
+from app.services.job_queue import JOB_DEAD, ClaimedJob, JobQueue
+from app.services.llm_service import BatchChatResult, LlmService
+from app.utils.deadline import deadline_scope
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class JobWorker:
+    """
+    Runs queued LLM jobs outside the request path.
+
+    Each poll claims up to batch_size jobs and sends them upstream together
+    through LlmService.chat_batch, at most `concurrency` at a time, so the
+    worker goes through the same key pool, providers, limiter, cache and
+    retries as interactive traffic. Results are stored as each job finishes;
+    failed jobs are handed back to the queue to retry or dead-letter.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        llm_service: LlmService,
+        batch_size: int = 32,
+        concurrency: int = 4,
+        poll_seconds: float = 5.0,
+        batch_timeout: Optional[float] = 600.0
+    ):
+        self.queue = queue
+        self.llm_service = llm_service
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.batch_timeout = batch_timeout
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    async def run_forever(self, stop: asyncio.Event) -> None:
+        """Poll until `stop` is set; the batch in progress is finished first."""
+        logger.info(f"Job worker {self.worker_id} started (batch {self.batch_size}, concurrency {self.concurrency})")
+        while not stop.is_set():
+            try:
+                processed = await self.run_once()
+                await self._publish_stats()
+            except Exception as e:
+                logger.error(f"Job worker poll failed: {e}", exc_info=True)
+                processed = 0
+            if processed == 0:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    async def run_once(self) -> int:
+        """Claim and run one batch. Returns how many jobs were claimed."""
+        jobs = await asyncio.to_thread(self.queue.claim, self.worker_id, self.batch_size)
+        if not jobs:
+            return 0
+
+        logger.info(f"Claimed {len(jobs)} job(s)")
+        items = [dict(job.payload, user_id=job.user_id) for job in jobs]
+        # Jobs still running at the batch deadline fail with a retryable 504 well before their lease ends
+        with deadline_scope(self.batch_timeout):
+            async for result in self.llm_service.chat_batch(items, concurrency=self.concurrency):
+                job = jobs[result.index]
+                try:
+                    await self._record(job, result)
+                except Exception as e:
+                    # Leaving the loop would cancel the rest of the batch; this job alone runs again when its lease expires
+                    logger.error(f"Failed to record the result of job {job.id}: {e}", exc_info=True)
+        return len(jobs)
+
+    async def _record(self, job: ClaimedJob, result: BatchChatResult) -> None:
+        if result.reply is not None:
+            if await asyncio.to_thread(self.queue.complete, job, self.worker_id, result.reply):
+                LLM_JOBS_FINISHED.labels(outcome="succeeded").inc()
+                LLM_JOB_QUEUE_SECONDS.observe((datetime.utcnow() - job.created_at).total_seconds())
+            return
+
+        new_status = await asyncio.to_thread(self.queue.fail, job, self.worker_id, result.status_code, str(result.detail))
+        if new_status == JOB_DEAD:
+            logger.warning(f"Job {job.id} dead-lettered after {job.attempts} attempt(s): {result.status_code} {result.detail}")
+            LLM_JOBS_FINISHED.labels(outcome="dead").inc()
+        else:
+            logger.info(f"Job {job.id} failed attempt {job.attempts} with {result.status_code}; retrying later")
+            LLM_JOBS_FINISHED.labels(outcome="retried").inc()
+
+    async def _publish_stats(self) -> None:
+        stats = await asyncio.to_thread(self.queue.stats)
+        for job_status, count in stats["counts"].items():
+            LLM_JOBS.labels(status=job_status).set(count)
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional, Tuple
+
+from google.genai import types
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.metrics import LLM_CACHE_LOOKUPS, LLM_CACHE_EVICTIONS, LLM_CACHE_MEMORY_BYTES
+from app.models.base import LlmResponseCacheEntry
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Values accepted in the X-LLM-Cache request header
+CACHE_MODE_BYPASS = "bypass"  # neither read from nor write to the cache
+CACHE_MODE_ENABLE = "enable"  # cache even if the request is not low-temperature
+CACHE_MODES = {CACHE_MODE_BYPASS, CACHE_MODE_ENABLE}
+
+
+def build_request_key(
+    model_name: str,
+    segments: Iterable[bytes],
+    config: Optional[types.GenerateContentConfig],
+    use_search: bool
+) -> str:
+    """Hash the model, every content segment (text and raw image bytes) and the generation config."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\x00search=1" if use_search else b"\x00search=0")
+    config_json = config.model_dump_json(exclude_none=True) if config else "{}"
+    digest.update(b"\x00config=" + config_json.encode("utf-8"))
+    for segment in segments:
+        # Length-prefix each segment so boundaries are unambiguous
+        digest.update(len(segment).to_bytes(8, "big"))
+        digest.update(segment)
+    return digest.hexdigest()
+
+
+class LruTtlCache:
+    """In-process LRU cache with a TTL and both entry-count and byte-size limits."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._total_bytes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            LLM_CACHE_EVICTIONS.labels(reason="expired").inc()
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = time.monotonic() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        self._entries[key] = (value, expires_at, size)
+        self._total_bytes += size
+
+        while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            LLM_CACHE_EVICTIONS.labels(reason="capacity").inc()
+
+        LLM_CACHE_MEMORY_BYTES.set(self._total_bytes)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._total_bytes -= size
+        LLM_CACHE_MEMORY_BYTES.set(self._total_bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PostgresCacheTier:
+    """Shared cache tier stored in the llm_response_cache table so all workers can use it."""
+
+    def __init__(self, session_factory: Callable[[], Session], ttl_seconds: float):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return the cached reply and its remaining TTL in seconds, if present."""
+        db = self.session_factory()
+        try:
+            entry = db.query(LlmResponseCacheEntry).filter(
+                LlmResponseCacheEntry.key == key,
+                LlmResponseCacheEntry.expires_at > datetime.utcnow()
+            ).first()
+            if entry is None:
+                return None
+            return entry.reply, (entry.expires_at - datetime.utcnow()).total_seconds()
+        finally:
+            db.close()
+
+    def set(self, key: str, model_name: str, value: str) -> None:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        statement = pg_insert(LlmResponseCacheEntry).values(
+            key=key,
+            model_name=model_name,
+            reply=value,
+            created_at=now,
+            expires_at=expires_at
+        ).on_conflict_do_update(
+            index_elements=[LlmResponseCacheEntry.key],
+            set_={"reply": value, "created_at": now, "expires_at": expires_at}
+        )
+        db = self.session_factory()
+        try:
+            db.execute(statement)
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        db = self.session_factory()
+        try:
+            deleted = db.query(LlmResponseCacheEntry).filter(
+                LlmResponseCacheEntry.expires_at <= datetime.utcnow()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+class LlmResponseCache:
+    """
+    Two-tier cache for deterministic LLM replies.
+
+    The in-process LRU is always consulted first; the optional Postgres tier is
+    shared between workers and backfills the LRU on a hit. Errors from the
+    shared tier are logged and treated as a miss so the cache can never fail a
+    request.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+        max_temperature: float = 0.2,
+        shared_tier: Optional[PostgresCacheTier] = None
+    ):
+        self.memory = LruTtlCache(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.max_temperature = max_temperature
+        self.shared_tier = shared_tier
+
+    def is_cacheable(self, config: Optional[types.GenerateContentConfig], cache_mode: Optional[str]) -> bool:
+        """Only low-temperature requests are cached unless the client explicitly opts in."""
+        if cache_mode == CACHE_MODE_BYPASS:
+            return False
+        if cache_mode == CACHE_MODE_ENABLE:
+            return True
+        if config is None or config.temperature is None:
+            return False
+        return config.temperature <= self.max_temperature
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            LLM_CACHE_LOOKUPS.labels(tier="memory", outcome="hit").inc()
+            return value
+        LLM_CACHE_LOOKUPS.labels(tier="memory", outcome="miss").inc()
+
+        if self.shared_tier is None:
+            return None
+
+        try:
+            shared_entry = await asyncio.to_thread(self.shared_tier.get, key)
+        except Exception as e:
+            logger.warning(f"Shared LLM cache lookup failed: {e}")
+            LLM_CACHE_LOOKUPS.labels(tier="shared", outcome="error").inc()
+            return None
+
+        if shared_entry is None:
+            LLM_CACHE_LOOKUPS.labels(tier="shared", outcome="miss").inc()
+            return None
+
+        LLM_CACHE_LOOKUPS.labels(tier="shared", outcome="hit").inc()
+        value, remaining_ttl = shared_entry
+        self.memory.set(key, value, ttl_seconds=remaining_ttl)
+        return value
+
+    async def set(self, key: str, model_name: str, value: str) -> None:
+        self.memory.set(key, value)
+
+        if self.shared_tier is None:
+            return
+
+        try:
+            await asyncio.to_thread(self.shared_tier.set, key, model_name, value)
+        except Exception as e:
+            logger.warning(f"Shared LLM cache write failed: {e}")
@@ -0,0 +1,412 @@
+import base64
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+from google import genai
+from google.api_core import exceptions as google_exceptions
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from app.core.metrics import LLM_PROVIDER_CALLS, LLM_PROVIDER_LATENCY, LLM_PROVIDER_SELECTED
+from app.services.gemini_client_pool import GeminiClientPool, KeyPoolExhausted
+from app.utils.logger import get_logger
+from app.utils.retry_policy import retry_hint
+
+logger = get_logger(__name__)
+
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash"
+
+
+def is_rate_limited(exception: BaseException) -> bool:
+    """Whether upstream rejected the request because the API key is over its quota."""
+    if isinstance(exception, google_exceptions.ResourceExhausted):
+        return True
+    return isinstance(exception, genai_errors.APIError) and exception.code == 429
+
+
+class LlmProvider(ABC):
+    """
+    One LLM backend. Subclasses implement generate and generate_stream.
+
+    Providers take the keyword arguments of a genai generate_content call
+    (model, contents, config) and return genai GenerateContentResponse
+    objects, and raise google.genai errors for HTTP failures. The rest of
+    LlmService (retries, circuit breakers, blocked-content checks, error
+    mapping) therefore works the same whichever provider served the call.
+    """
+
+    name: str
+    model_name: str
+
+    def supports(self, request_params: Dict[str, Any]) -> bool:
+        """Whether this provider can serve the request at all."""
+        return True
+
+    def model_for(self, request_params: Dict[str, Any]) -> str:
+        """The model this provider would call for the request."""
+        return self.model_name
+
+    @abstractmethod
+    async def generate(self, request_params: Dict[str, Any]) -> types.GenerateContentResponse:
+        """One complete response."""
+
+    @abstractmethod
+    async def generate_stream(self, request_params: Dict[str, Any]) -> AsyncIterator[types.GenerateContentResponse]:
+        """Response chunks as they arrive."""
+
+
+class GeminiProvider(LlmProvider):
+    """Gemini through google-genai, spread across the API key pool when there is one."""
+
+    def __init__(self, client: genai.Client, model_name: str, client_pool: Optional[GeminiClientPool] = None):
+        self.name = "gemini"
+        self.client = client
+        self.model_name = model_name
+        self.client_pool = client_pool
+
+    def model_for(self, request_params: Dict[str, Any]) -> str:
+        # The request's model is the Gemini tier LlmService routed it to
+        return request_params.get("model") or self.model_name
+
+    async def generate(self, request_params: Dict[str, Any]) -> types.GenerateContentResponse:
+        client, on_error = self._pick_client(request_params)
+        try:
+            return await client.aio.models.generate_content(**{**request_params, "model": self.model_for(request_params)})
+        except Exception as e:
+            on_error(e)
+            raise
+
+    async def generate_stream(self, request_params: Dict[str, Any]) -> AsyncIterator[types.GenerateContentResponse]:
+        client, on_error = self._pick_client(request_params)
+        try:
+            stream = await client.aio.models.generate_content_stream(**{**request_params, "model": self.model_for(request_params)})
+        except Exception as e:
+            on_error(e)
+            raise
+        return self._report_stream_errors(stream, on_error)
+
+    @staticmethod
+    async def _report_stream_errors(
+        stream: AsyncIterator[types.GenerateContentResponse],
+        on_error: Callable[[Exception], None]
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        # The SDK's stream is lazy: the HTTP request, and so a 429, happens on the first __anext__
+        try:
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            on_error(e)
+            raise
+
+    def _pick_client(self, request_params: Dict[str, Any]) -> Tuple[genai.Client, Callable[[Exception], None]]:
+        """Pick the API key for one attempt; the callback drains it if upstream says it is rate limited."""
+        if self.client_pool is None:
+            return self.client, lambda e: None
+
+        # Uploaded files and context caches only exist in the primary key's project
+        config = request_params.get("config")
+        pinned = bool(config and config.cached_content) or any(
+            part.file_data for content in request_params["contents"] for part in content.parts
+        )
+        try:
+            pooled = self.client_pool.acquire(pinned=pinned)
+        except KeyPoolExhausted as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Please try again later.",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+
+        def on_error(e: Exception) -> None:
+            if is_rate_limited(e):
+                self.client_pool.record_rate_limited(pooled, retry_hint(e))
+
+        return pooled.client, on_error
+
+
+# OpenAI finish reasons mapped onto the genai FinishReason names LlmService understands
+OPENAI_FINISH_REASONS = {
+    "stop": "STOP",
+    "length": "MAX_TOKENS",
+    "content_filter": "SAFETY",
+    "tool_calls": "STOP",
+}
+
+
+class OpenAICompatibleProvider(LlmProvider):
+    """
+    Any server speaking the OpenAI chat completions API, e.g. a local
+    inference server.
+
+    Text and inline images are translated into chat messages. Requests that
+    need Gemini-only features (Google Search grounding, uploaded files,
+    context caches) are not supported and are left to Gemini.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model_name: str,
+        api_key: Optional[str] = None,
+        timeout: float = 60.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20
+    ):
+        self.name = "openai_compat"
+        self.model_name = model_name
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        )
+
+    def supports(self, request_params: Dict[str, Any]) -> bool:
+        config = request_params.get("config")
+        if config and (config.tools or config.cached_content):
+            return False
+        return not any(part.file_data for content in request_params["contents"] for part in content.parts)
+
+    async def generate(self, request_params: Dict[str, Any]) -> types.GenerateContentResponse:
+        response = await self.client.post(
+            "/chat/completions",
+            json=self._build_body(request_params, stream=False),
+            timeout=self._timeout(request_params)
+        )
+        await genai_errors.APIError.raise_for_async_response(response)
+        body = response.json()
+        choice = body["choices"][0]
+        return self._to_genai_response(choice["message"].get("content"), choice.get("finish_reason"), body.get("usage"))
+
+    async def generate_stream(self, request_params: Dict[str, Any]) -> AsyncIterator[types.GenerateContentResponse]:
+        request = self.client.build_request(
+            "POST",
+            "/chat/completions",
+            json=self._build_body(request_params, stream=True),
+            timeout=self._timeout(request_params)
+        )
+        response = await self.client.send(request, stream=True)
+        try:
+            await genai_errors.APIError.raise_for_async_response(response)
+        except Exception:
+            await response.aclose()
+            raise
+        return self._iterate_events(response)
+
+    async def _iterate_events(self, response: httpx.Response) -> AsyncIterator[types.GenerateContentResponse]:
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                chunk = json.loads(data)
+                choice = chunk["choices"][0] if chunk.get("choices") else {}
+                text = (choice.get("delta") or {}).get("content")
+                yield self._to_genai_response(text, choice.get("finish_reason"), chunk.get("usage"))
+        finally:
+            await response.aclose()
+
+    def _build_body(self, request_params: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        config: Optional[types.GenerateContentConfig] = request_params.get("config")
+        messages: List[Dict[str, Any]] = []
+
+        system_instruction = config.system_instruction if config else None
+        if isinstance(system_instruction, types.Content):
+            system_instruction = "".join(part.text or "" for part in system_instruction.parts)
+        if system_instruction:
+            messages.append({"role": "system", "content": system_instruction})
+
+        for content in request_params["contents"]:
+            parts = []
+            for part in content.parts:
+                if part.text:
+                    parts.append({"type": "text", "text": part.text})
+                elif part.inline_data:
+                    data_uri = f"data:{part.inline_data.mime_type};base64,{base64.b64encode(part.inline_data.data).decode('ascii')}"
+                    parts.append({"type": "image_url", "image_url": {"url": data_uri}})
+            messages.append({"role": "assistant" if content.role == "model" else "user", "content": parts})
+
+        body: Dict[str, Any] = {"model": self.model_name, "messages": messages, "stream": stream}
+        if stream:
+            body["stream_options"] = {"include_usage": True}
+        if config:
+            if config.temperature is not None:
+                body["temperature"] = config.temperature
+            if config.top_p is not None:
+                body["top_p"] = config.top_p
+            if config.max_output_tokens is not None:
+                body["max_tokens"] = config.max_output_tokens
+            if config.stop_sequences:
+                body["stop"] = config.stop_sequences
+        return body
+
+    @staticmethod
+    def _timeout(request_params: Dict[str, Any]) -> Any:
+        # Honour the per-request timeout LlmService derives from the request deadline
+        config = request_params.get("config")
+        if config and config.http_options and config.http_options.timeout:
+            return config.http_options.timeout / 1000
+        return httpx.USE_CLIENT_DEFAULT
+
+    @staticmethod
+    def _to_genai_response(
+        text: Optional[str],
+        finish_reason: Optional[str],
+        usage: Optional[Dict[str, int]]
+    ) -> types.GenerateContentResponse:
+        candidate = types.Candidate(
+            content=types.Content(role="model", parts=[types.Part(text=text)] if text else []),
+            finish_reason=types.FinishReason(OPENAI_FINISH_REASONS.get(finish_reason, "OTHER")) if finish_reason else None
+        )
+        usage_metadata = None
+        if usage:
+            usage_metadata = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=usage.get("prompt_tokens"),
+                candidates_token_count=usage.get("completion_tokens"),
+                total_token_count=usage.get("total_tokens")
+            )
+        return types.GenerateContentResponse(candidates=[candidate], usage_metadata=usage_metadata)
+
+
+class _ProviderStats:
+    """
+    Time-windowed latency and outcome samples for one provider.
+
+    The summary is computed once and reused until a sample is added or
+    ages out, so ranking providers on every attempt does not re-sort the
+    window each time it is consulted.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, float, bool]] = deque()  # (recorded_at, latency, ok)
+        self._summary: Optional[Tuple[int, float, Optional[float], Optional[float]]] = None
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._samples.append((time.monotonic(), latency, ok))
+        self._summary = None
+        self._expire()
+
+    def summary(self) -> Tuple[int, float, Optional[float], Optional[float]]:
+        """(samples, error rate, p50 latency, p95 latency) over the window; latencies of successes only."""
+        self._expire()
+        if self._summary is None:
+            self._summary = self._compute()
+        return self._summary
+
+    def _compute(self) -> Tuple[int, float, Optional[float], Optional[float]]:
+        if not self._samples:
+            return 0, 0.0, None, None
+        errors = sum(1 for _, _, ok in self._samples if not ok)
+        latencies = sorted(latency for _, latency, ok in self._samples if ok)
+        p50 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.5))] if latencies else None
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        return len(self._samples), errors / len(self._samples), p50, p95
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+            self._summary = None
+
+
+class ProviderRouter:
+    """
+    Pick a provider for each upstream attempt from live latency and error rate.
+
+    Providers are listed in order of preference; the first is the primary.
+    A provider is degraded when, over the last window_seconds and with at
+    least min_samples calls, its error rate reaches max_error_rate or its p95
+    latency exceeds max_p95_seconds. Healthy providers keep their order, so
+    traffic stays on the primary until it degrades and then moves to the
+    healthy fallback with the lowest p50. If every provider is degraded the
+    one with the lowest error rate is used. Samples expire with the window,
+    so a degraded primary gets traffic again once its bad samples age out.
+    """
+
+    def __init__(
+        self,
+        providers: List[LlmProvider],
+        max_error_rate: float = 0.5,
+        max_p95_seconds: float = 20.0,
+        window_seconds: float = 60.0,
+        min_samples: int = 10
+    ):
+        if not providers:
+            raise ValueError("At least one provider is required")
+        self.providers = providers
+        self.max_error_rate = max_error_rate
+        self.max_p95_seconds = max_p95_seconds
+        self.min_samples = min_samples
+        self._stats = {provider.name: _ProviderStats(window_seconds) for provider in providers}
+
+    @property
+    def primary(self) -> LlmProvider:
+        return self.providers[0]
+
+    def ranked(self, request_params: Dict[str, Any]) -> List[LlmProvider]:
+        """
+        Providers that can serve the request, best first. Never empty: if no
+        provider claims the request, the primary gets it, so the caller's
+        circuit checks and Retry-After still apply.
+        """
+        candidates = [provider for provider in self.providers if provider.supports(request_params)] or [self.primary]
+        primary, fallbacks = candidates[:1], candidates[1:]
+        healthy = [provider for provider in primary if not self._degraded(provider)]
+        healthy += sorted(
+            (provider for provider in fallbacks if not self._degraded(provider)),
+            key=lambda provider: self._stats[provider.name].summary()[2] or 0.0
+        )
+        degraded = sorted(
+            (provider for provider in candidates if provider not in healthy),
+            key=lambda provider: self._stats[provider.name].summary()[1]
+        )
+        return healthy + degraded
+
+    def record(self, provider: LlmProvider, latency: float, ok: bool, model: Optional[str] = None) -> None:
+        self._stats[provider.name].record(latency, ok)
+        LLM_PROVIDER_CALLS.labels(provider=provider.name, outcome="success" if ok else "failure").inc()
+        if ok:
+            LLM_PROVIDER_LATENCY.labels(provider=provider.name, model=model or provider.model_name).observe(latency)
+
+    def record_selected(self, provider: LlmProvider) -> None:
+        LLM_PROVIDER_SELECTED.labels(provider=provider.name, role="primary" if provider is self.primary else "fallback").inc()
+        if provider is not self.primary:
+            logger.info(f"Routing LLM call to fallback provider '{provider.name}'")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        snapshot = {}
+        for provider in self.providers:
+            samples, error_rate, p50, p95 = self._stats[provider.name].summary()
+            snapshot[provider.name] = {
+                "model": provider.model_name,
+                "degraded": self._degraded(provider),
+                "samples": samples,
+                "error_rate": round(error_rate, 3),
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            }
+        return snapshot
+
+    def serving(self) -> Optional[bool]:
+        """Whether recent calls show some provider answering well; None without enough recent calls to tell."""
+        verdicts = [
+            not self._degraded(provider)
+            for provider in self.providers
+            if self._stats[provider.name].summary()[0] >= self.min_samples
+        ]
+        return any(verdicts) if verdicts else None
+
+    def _degraded(self, provider: LlmProvider) -> bool:
+        samples, error_rate, _, p95 = self._stats[provider.name].summary()
+        if samples < self.min_samples:
+            return False
+        return error_rate >= self.max_error_rate or (p95 is not None and p95 > self.max_p95_seconds)
@@ -1,23 +1,38 @@
-import logging
+import asyncio
+import httpx
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
 from google.api_core import exceptions as google_exceptions
 
 from fastapi import HTTPException, status
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception,
-    before_sleep_log
-)
-
-from typing import Optional, Union, List, Dict, Any
+
+from typing import Optional, Union, List, Dict, Any, AsyncIterator, Tuple, Iterator
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 import base64
+import hashlib
+import io
+import math
+import time
 from pathlib import Path
 
+from app.core.metrics import IMAGE_PREPROCESS_SAVED_BYTES, LLM_BATCH_ITEMS, LLM_IMAGE_BYTES, LLM_TOKENS, LLM_UPSTREAM_ATTEMPT_SECONDS
+from app.services.file_registry import FileRegistry
+from app.services.gemini_client_pool import GeminiClientPool
+from app.services.llm_providers import DEFAULT_GEMINI_MODEL, GeminiProvider, LlmProvider, ProviderRouter, is_rate_limited
+from app.services.image_preprocessor import ImagePreprocessor
+from app.services.model_router import ModelRouter
+from app.services.token_budget import TokenBudget, TokenEstimate
+from app.services.llm_cache import LlmResponseCache, build_request_key, CACHE_MODE_BYPASS
+from app.utils.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+from app.utils.concurrency_limiter import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+from app.utils.deadline import DeadlineExceeded, check_deadline, expired, time_remaining
+from app.utils.hedging import RequestHedger
 from app.utils.logger import get_logger
+from app.utils.retry_policy import RetryPolicy, retry_hint
+from app.utils.single_flight import SingleFlight
+from app.utils import tracing
 
 logger = get_logger(__name__)
 
@@ -27,6 +42,7 @@ class ImageContent:
     """Represents image content that can be sent to the LLM."""
     data: bytes
     mime_type: str  # e.g., "image/jpeg", "image/png"
+    file_uri: Optional[str] = None  # Set when the bytes were already uploaded through the Files API
     
     @classmethod
     def from_file(cls, file_path: Union[str, Path]) -> "ImageContent":
@@ -69,6 +85,25 @@ class ContentMessage:
             self.images = []
 
 
+@dataclass
+class LlmStreamEvent:
+    """A single event produced while streaming an LLM response."""
+    event: str  # "delta", "error" or "done"
+    data: Dict[str, Any]
+
+
+@dataclass
+class BatchChatResult:
+    """Outcome of one batch item: its reply, or the error it would have got as a single request."""
+    index: int
+    status_code: int
+    reply: Optional[str] = None
+    detail: Optional[Any] = None
+
+
+BLOCKED_FINISH_REASONS = {'SAFETY', 'RECITATION', 'BLOCKLIST', 'PROHIBITED_CONTENT', 'SPII'}
+
+
 def is_retryable_genai_error(exception: BaseException) -> bool:
     """Custom predicate to decide if a Google GenAI exception is retryable."""
     # Network and timeout errors
@@ -84,121 +119,602 @@ def is_retryable_genai_error(exception: BaseException) -> bool:
     if isinstance(exception, google_exceptions.GoogleAPIError):
         if hasattr(exception, 'code'):
             return exception.code in [429, 500, 502, 503, 504]
+
+    # The google-genai client raises its own errors
+    if isinstance(exception, genai_errors.APIError):
+        return exception.code in [429, 500, 502, 503, 504]
     
     return False
 
 
+def is_overload_error(exception: BaseException) -> bool:
+    """Whether an upstream error means the service is overloaded: rate limited, unavailable or too slow."""
+    if isinstance(exception, (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        asyncio.TimeoutError,
+        httpx.TimeoutException,
+    )):
+        return True
+    if isinstance(exception, genai_errors.APIError):
+        return exception.code in [429, 503, 504]
+    return False
+
+
+def is_upstream_failure(exception: BaseException) -> bool:
+    """Whether an error means the upstream service itself is failing, as opposed to rejecting or rate limiting this request."""
+    return isinstance(exception, (
+        google_exceptions.ServerError,
+        genai_errors.ServerError,
+        asyncio.TimeoutError,
+        httpx.TransportError,
+    ))
+
+
+def mentions_cached_content(message: Optional[str]) -> bool:
+    """Whether an upstream error message is about a CachedContent (e.g. "CachedContent not found (or permission denied)")."""
+    normalized = (message or "").lower().replace(" ", "").replace("_", "")
+    return "cachedcontent" in normalized
+
+
 class LlmService:
-    def __init__(self, gemini_api_key: str, connect_timeout: float = 30.0, read_timeout: float = 60.0, write_timeout: float = 30.0):
+    def __init__(
+        self,
+        gemini_api_key: str,
+        connect_timeout: float = 30.0,
+        read_timeout: float = 60.0,
+        write_timeout: float = 30.0,
+        response_cache: Optional[LlmResponseCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        image_preprocessor: Optional[ImagePreprocessor] = None,
+        file_registry: Optional[FileRegistry] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        hedger: Optional[RequestHedger] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        client_pool: Optional[GeminiClientPool] = None,
+        providers: Optional[ProviderRouter] = None,
+        model_router: Optional[ModelRouter] = None,
+        token_budget: Optional[TokenBudget] = None
+    ):
         self.gemini_api_key = gemini_api_key
-        self.model_name = "gemini-2.0-flash"
-        
-        # Initialize the Google GenAI client
-        self.client = genai.Client(api_key=self.gemini_api_key)
+        # The default tier's model; it also owns the context caches
+        self.model_router = model_router
+        self.model_name = model_router.default.model if model_router is not None else DEFAULT_GEMINI_MODEL
         
         # Store timeout values for reference
         self.connect_timeout = connect_timeout
         self.read_timeout = read_timeout
         self.write_timeout = write_timeout
 
-    def _prepare_content_parts(self, content: Union[str, ContentMessage]) -> List[Dict[str, Any]]:
-        """Convert content to the format expected by the GenAI API."""
+        # Initialize the Google GenAI client. It takes a single timeout that
+        # httpx applies to each phase, so the longest phase timeout is used.
+        # With a key pool, the primary key's client owns uploaded files and context caches.
+        self.client_pool = client_pool
+        if client_pool is not None:
+            self.client = client_pool.primary.client
+        else:
+            self.client = genai.Client(
+                api_key=self.gemini_api_key,
+                http_options=types.HttpOptions(timeout=int(max(connect_timeout, read_timeout, write_timeout) * 1000))
+            )
+
+        self.response_cache = response_cache
+        self.single_flight = single_flight
+        self.image_preprocessor = image_preprocessor
+        self.file_registry = file_registry
+        self.concurrency_limiter = concurrency_limiter
+        self.hedger = hedger
+        self.circuit_breakers = circuit_breakers
+        self.retry_policy = retry_policy or RetryPolicy(name="llm", retryable=is_retryable_genai_error, log=logger)
+        self.providers = providers or ProviderRouter([GeminiProvider(self.client, self.model_name, client_pool)])
+        self.token_budget = token_budget
+
+    async def _preprocess_images(self, content: Union[str, ContentMessage]) -> Union[str, ContentMessage]:
+        """Downscale and recompress any images in the content, logging the bytes saved for this request."""
+        if self.image_preprocessor is None or isinstance(content, str) or not content.images:
+            return content
+
+        images = []
+        for image in content.images:
+            data, mime_type = await self.image_preprocessor.process(image.data, image.mime_type)
+            images.append(ImageContent(data=data, mime_type=mime_type))
+
+        bytes_in = sum(len(image.data) for image in content.images)
+        bytes_out = sum(len(image.data) for image in images)
+        IMAGE_PREPROCESS_SAVED_BYTES.observe(bytes_in - bytes_out)
+        logger.info("Image preprocessing saved %d bytes (%d -> %d) across %d image(s)", bytes_in - bytes_out, bytes_in, bytes_out, len(images))
+        return ContentMessage(text=content.text, images=images)
+
+    async def _attach_file_uris(self, content: Union[str, ContentMessage]) -> Union[str, ContentMessage]:
+        """Reference previously uploaded images by file URI instead of sending their bytes inline."""
+        if isinstance(content, str) or not content.images:
+            return content
+
+        if self.file_registry is not None:
+            images = []
+            for image in content.images:
+                file_uri = await self.file_registry.resolve(image.data, image.mime_type, self._upload_file)
+                images.append(ImageContent(data=image.data, mime_type=image.mime_type, file_uri=file_uri))
+            content = ContentMessage(text=content.text, images=images)
+
+        for image in content.images:
+            LLM_IMAGE_BYTES.labels(transport="file_uri" if image.file_uri else "inline").inc(len(image.data))
+        return content
+
+    def _forget_rejected_files(self, content: Union[str, ContentMessage], error: Exception) -> None:
+        """A client error on a request that referenced uploaded files may mean a file is gone upstream."""
+        if self.file_registry is None or isinstance(content, str):
+            return
+        if isinstance(error, genai_errors.ClientError):
+            status_code = error.code
+        elif isinstance(error, (HTTPException, google_exceptions.GoogleAPIError)):
+            status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+        else:
+            return
+        if not status_code or not 400 <= status_code < 500 or status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+            return
+        file_uris = {image.file_uri for image in content.images if image.file_uri}
+        if file_uris:
+            self.file_registry.forget(file_uris)
+
+    async def _upload_file(self, data: bytes, mime_type: str) -> types.File:
+        return await self.client.aio.files.upload(
+            file=io.BytesIO(data),
+            config=types.UploadFileConfig(mime_type=mime_type)
+        )
+
+    def _prepare_content_parts(self, content: Union[str, ContentMessage]) -> List[types.Part]:
+        """
+        Convert content to the format expected by the GenAI API.
+        Image bytes are handed to the SDK as-is; it base64-encodes them once
+        when serialising the request, so nothing is re-encoded here.
+        """
         parts = []
         
         if isinstance(content, str):
             # Simple text content
-            parts.append({"text": content})
+            parts.append(types.Part(text=content))
         elif isinstance(content, ContentMessage):
             # Text part
             if content.text:
-                parts.append({"text": content.text})
+                parts.append(types.Part(text=content.text))
             
             # Image parts
             for image in content.images:
-                parts.append({
-                    "inline_data": {
-                        "mime_type": image.mime_type,
-                        "data": base64.b64encode(image.data).decode('utf-8')
-                    }
-                })
+                if image.file_uri:
+                    parts.append(types.Part.from_uri(file_uri=image.file_uri, mime_type=image.mime_type))
+                else:
+                    parts.append(types.Part.from_bytes(data=image.data, mime_type=image.mime_type))
         else:
             raise ValueError(f"Unsupported content type: {type(content)}")
         
         return parts
 
+    @staticmethod
+    def _iter_cache_segments(content: Union[str, ContentMessage]) -> Iterator[bytes]:
+        """Yield the raw text and image bytes that identify a request for caching."""
+        if isinstance(content, str):
+            yield content.encode('utf-8')
+            return
+        yield (content.text or '').encode('utf-8')
+        for image in content.images:
+            yield image.mime_type.encode('utf-8')
+            yield image.data
+
+    def _choose_model(
+        self,
+        content: Union[str, ContentMessage],
+        config: Optional[types.GenerateContentConfig],
+        use_search: bool,
+        model_tier: Optional[str]
+    ) -> str:
+        """Pick the Gemini model for a request from its estimated input size and features."""
+        if self.model_router is None:
+            return self.model_name
+        text = content if isinstance(content, str) else (content.text or '')
+        system_instruction = config.system_instruction if config else None
+        input_chars = len(text) + (len(system_instruction) if isinstance(system_instruction, str) else 0)
+        tier = self.model_router.choose(
+            input_chars,
+            has_images=isinstance(content, ContentMessage) and bool(content.images),
+            use_search=use_search,
+            uses_context_cache=bool(config and config.cached_content),
+            override=model_tier
+        )
+        return tier.model
+
+    async def _fit_tokens(
+        self,
+        content: Union[str, ContentMessage],
+        config: Optional[types.GenerateContentConfig],
+        model: str,
+        user_id: Optional[str]
+    ) -> Tuple[Union[str, ContentMessage], Optional[TokenEstimate]]:
+        """Estimate the request's input tokens and trim its text to the model's context limit."""
+        if self.token_budget is None:
+            return content, None
+        text = content if isinstance(content, str) else (content.text or '')
+        system_instruction = config.system_instruction if config else None
+        fitted_text, estimate = await self.token_budget.fit(
+            text,
+            model,
+            image_count=0 if isinstance(content, str) else len(content.images),
+            extra_chars=len(system_instruction) if isinstance(system_instruction, str) else 0,
+            user_id=user_id
+        )
+        if fitted_text is text:
+            return content, estimate
+        return (fitted_text if isinstance(content, str) else ContentMessage(text=fitted_text, images=content.images)), estimate
+
+    @staticmethod
+    def _endpoint_type(stream: bool, use_search: bool) -> str:
+        """Endpoint type used to key circuit breakers; search grounding can fail independently."""
+        endpoint = "stream" if stream else "generate"
+        return f"{endpoint}_search" if use_search else endpoint
+
+    def _choose_provider(self, endpoint: str, request_params: Dict[str, Any]) -> Tuple[LlmProvider, Optional[CircuitBreaker], bool]:
+        """
+        Pick the best-ranked provider whose circuit for this endpoint lets the call through.
+
+        Returns:
+            Tuple: The provider, its circuit breaker (or None) and the probe flag from before_call
+
+        Raises:
+            HTTPException: 503 if every candidate's circuit is open.
+        """
+        retry_after = None
+        for provider in self.providers.ranked(request_params):
+            breaker = self.circuit_breakers.get(provider.model_for(request_params), endpoint) if self.circuit_breakers else None
+            if breaker is None:
+                return provider, None, False
+            try:
+                return provider, breaker, breaker.before_call()
+            except CircuitOpenError as e:
+                retry_after = e.retry_after if retry_after is None else min(retry_after, e.retry_after)
+
+        # Every candidate's circuit is open: retry when the first of them lets a probe through
+        logger.warning("LLM request rejected, all provider circuits for %s are open (retry after %ss)", endpoint, retry_after)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="LLM service is temporarily unavailable, please retry later",
+            headers={"Retry-After": str(retry_after or 1)}
+        )
+
+    @asynccontextmanager
+    async def _upstream_slot(self, endpoint: str, request_params: Dict[str, Any]) -> AsyncIterator[LlmProvider]:
+        """
+        Guard one upstream attempt: pick a provider whose circuit is not
+        open, hold a concurrency slot, and report the outcome to the circuit
+        breaker, the limiter and the provider router.
+        """
+        with tracing.span("llm.attempt", endpoint=endpoint) as attempt_span:
+            check_deadline("upstream call")
+            provider, breaker, probe = self._choose_provider(endpoint, request_params)
+            self.providers.record_selected(provider)
+            model = provider.model_for(request_params)
+            attempt_span.set_attribute("provider", provider.name)
+            attempt_span.set_attribute("model", model)
+
+            if self.concurrency_limiter is not None:
+                try:
+                    with tracing.span("llm.concurrency_wait"):
+                        await self.concurrency_limiter.acquire(timeout=time_remaining())
+                except (ConcurrencyLimitExceeded, asyncio.CancelledError) as e:
+                    if breaker is not None:
+                        breaker.record_ignored(probe)
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    check_deadline("concurrency queue wait")
+                    logger.warning(f"LLM request rejected by concurrency limiter ({e.reason})")
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="LLM service is busy, please retry shortly",
+                        headers={"Retry-After": str(e.retry_after)}
+                    )
+
+            started_at = time.perf_counter()
+            try:
+                yield provider
+            except BaseException as e:
+                LLM_UPSTREAM_ATTEMPT_SECONDS.labels(
+                    provider=provider.name, outcome=self._attempt_outcome(e)
+                ).observe(time.perf_counter() - started_at)
+                if self.concurrency_limiter is not None:
+                    self.concurrency_limiter.release(overloaded=is_overload_error(e))
+                # A timeout cut short by the request's own deadline says nothing about upstream health
+                upstream_failed = is_upstream_failure(e) and not expired()
+                if breaker is not None:
+                    if upstream_failed:
+                        breaker.record_failure(probe)
+                    else:
+                        breaker.record_ignored(probe)
+                if upstream_failed or is_rate_limited(e):
+                    self.providers.record(provider, time.perf_counter() - started_at, ok=False, model=model)
+                raise
+
+            latency = time.perf_counter() - started_at
+            LLM_UPSTREAM_ATTEMPT_SECONDS.labels(provider=provider.name, outcome="success").observe(latency)
+            if self.concurrency_limiter is not None:
+                self.concurrency_limiter.release(latency=latency)
+            if breaker is not None:
+                breaker.record_success(probe)
+            self.providers.record(provider, latency, ok=True, model=model)
+
+    @staticmethod
+    def _attempt_outcome(error: BaseException) -> str:
+        """Bounded label for how an upstream attempt failed."""
+        if isinstance(error, asyncio.CancelledError):
+            return "cancelled"
+        if is_rate_limited(error):
+            return "rate_limited"
+        if is_upstream_failure(error):
+            return "upstream_error"
+        return "other"
+
+    @staticmethod
+    def _record_usage(model: str, usage: Optional[types.GenerateContentResponseUsageMetadata]) -> None:
+        """Count the tokens upstream reports for a call, whether or not the token budget is enabled."""
+        if usage is None or usage.prompt_token_count is None:
+            return
+        cached = usage.cached_content_token_count or 0
+        LLM_TOKENS.labels(model=model, kind="prompt").inc(usage.prompt_token_count - cached)
+        LLM_TOKENS.labels(model=model, kind="cached").inc(cached)
+        LLM_TOKENS.labels(model=model, kind="output").inc(usage.candidates_token_count or 0)
+
     def _create_search_tool(self) -> types.Tool:
         """Create Google Search tool configuration."""
         return types.Tool(
             google_search=types.GoogleSearch()
         )
 
-    @retry(
-        stop=stop_after_attempt(3),  # Max 3 attempts (1 initial + 2 retries)
-        wait=wait_exponential(multiplier=1, min=1, max=5),  # Wait 1s, then 2s, then 4s (max wait 5s)
-        retry=retry_if_exception(is_retryable_genai_error),  # Use our custom predicate
-        before_sleep=before_sleep_log(logger, logging.INFO)  # Log before sleeping/retrying
-    )
     async def _attempt_llm_chat(
         self, 
         content: Union[str, ContentMessage], 
         config: Optional[types.GenerateContentConfig] = None,
-        use_search: bool = False
+        use_search: bool = False,
+        model: Optional[str] = None
     ) -> types.GenerateContentResponse:
         """
-        A single attempt to call the LLM API using Google GenAI client.
-        This method is decorated for retries.
+        A single attempt to call the LLM through the provider router.
+        Callers run it under self.retry_policy.
         """
-        logger.debug(f"Attempting LLM API call with Google GenAI client (search: {use_search})")
+        logger.debug("Attempting LLM API call (search: %s)", use_search)
 
         try:
-            # Prepare content parts
-            content_parts = self._prepare_content_parts(content)
-            
-            # Prepare the request parameters
-            request_params = {
-                "model": self.model_name,
-                "contents": [{"parts": content_parts}]
-            }
-            
-            # Create or modify config for search
-            if use_search:
-                search_tool = self._create_search_tool()
-                
-                if config:
-                    # Merge existing config with search tool
-                    search_config = types.GenerateContentConfig(
-                        temperature=config.temperature,
-                        top_p=config.top_p,
-                        max_output_tokens=config.max_output_tokens,
-                        candidate_count=config.candidate_count,
-                        stop_sequences=config.stop_sequences,
-                        tools=[search_tool]
-                    )
-                else:
-                    # Create new config with search tool
-                    search_config = types.GenerateContentConfig(
-                        tools=[search_tool]
-                    )
-                
-                request_params["config"] = search_config
-            elif config:
-                # Use provided config without search
-                request_params["config"] = config
-            
-            logger.debug(f"Making API call with params: {request_params}")
-            response = await self.client.aio.models.generate_content(**request_params)
+            request_params = self._build_request_params(content, config, use_search, model)
+
+            # Summarise instead of formatting the params: their repr would copy every image payload.
+            # Lazy arguments, so nothing is formatted unless DEBUG is on.
+            logger.debug("Making API call with %d part(s), config: %s", len(request_params["contents"][0].parts), request_params.get("config"))
+            async def call_upstream() -> types.GenerateContentResponse:
+                async with self._upstream_slot(self._endpoint_type(stream=False, use_search=use_search), request_params) as provider:
+                    return await provider.generate(request_params)
+
+            if self.hedger is not None:
+                response = await self.hedger.run(call_upstream)
+            else:
+                response = await call_upstream()
             
-            logger.debug(f"API response received: {type(response)}")
+            logger.debug("API response received: %s", type(response))
             return response
             
         except Exception as e:
-            logger.error(f"Error in GenAI API call: {e}")
+            logger.error(f"Error in LLM API call: {e}")
             raise  # Re-raise for retry logic to handle
 
+    async def _attempt_llm_stream(
+        self,
+        content: Union[str, ContentMessage],
+        config: Optional[types.GenerateContentConfig] = None,
+        use_search: bool = False,
+        model: Optional[str] = None
+    ) -> Tuple[Optional[types.GenerateContentResponse], AsyncIterator[types.GenerateContentResponse]]:
+        """
+        Open a streaming call and wait for its first chunk.
+        Callers run it under self.retry_policy. Retries only cover the period
+        before the first chunk arrives; once anything has been received the
+        stream is committed.
+        """
+        logger.debug("Attempting LLM streaming call (search: %s)", use_search)
+
+        try:
+            request_params = self._build_request_params(content, config, use_search, model)
+            # The slot is only held until the first chunk; that is where upstream queues and rejects
+            async with self._upstream_slot(self._endpoint_type(stream=True, use_search=use_search), request_params) as provider:
+                stream = await provider.generate_stream(request_params)
+                iterator = stream.__aiter__()
+                try:
+                    first_chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    first_chunk = None
+            return first_chunk, iterator
+
+        except Exception as e:
+            logger.error(f"Error opening LLM stream: {e}")
+            raise
+
+    def _build_request_params(
+        self,
+        content: Union[str, ContentMessage],
+        config: Optional[types.GenerateContentConfig] = None,
+        use_search: bool = False,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the keyword arguments for a generate_content call."""
+        with tracing.span("llm.prepare_content") as prepare_span:
+            content_parts = self._prepare_content_parts(content)
+            prepare_span.set_attribute("parts", len(content_parts))
+        
+        request_params = {
+            "model": model or self.model_name,
+            "contents": [types.Content(role="user", parts=content_parts)]
+        }
+        
+        # Create or modify config for search
+        if use_search:
+            search_tool = self._create_search_tool()
+            
+            if config:
+                # Merge existing config with search tool
+                search_config = types.GenerateContentConfig(
+                    temperature=config.temperature,
+                    top_p=config.top_p,
+                    max_output_tokens=config.max_output_tokens,
+                    candidate_count=config.candidate_count,
+                    stop_sequences=config.stop_sequences,
+                    system_instruction=config.system_instruction,
+                    tools=[search_tool]
+                )
+            else:
+                # Create new config with search tool
+                search_config = types.GenerateContentConfig(
+                    tools=[search_tool]
+                )
+            
+            request_params["config"] = search_config
+        elif config:
+            # Use provided config without search
+            request_params["config"] = config
+
+        # Never wait on upstream longer than the request has left
+        time_left = time_remaining()
+        if time_left is not None and time_left < max(self.connect_timeout, self.read_timeout, self.write_timeout):
+            http_options = types.HttpOptions(timeout=max(1, int(time_left * 1000)))
+            request_config = request_params.get("config")
+            request_params["config"] = (
+                request_config.model_copy(update={"http_options": http_options})
+                if request_config else types.GenerateContentConfig(http_options=http_options)
+            )
+
+        return request_params
+
+    def _build_generation_config(self, kwargs: Dict[str, Any]) -> Optional[types.GenerateContentConfig]:
+        """Create generation config if custom parameters are provided."""
+        if not kwargs:
+            return None
+        return types.GenerateContentConfig(
+            temperature=kwargs.get('temperature', 0.7),
+            top_p=kwargs.get('top_p', 0.9),
+            max_output_tokens=kwargs.get('max_tokens', None),
+            candidate_count=1,
+            stop_sequences=kwargs.get('stop_sequences', []),
+            system_instruction=kwargs.get('system_instruction', None),
+            cached_content=kwargs.get('cached_content', None),
+        )
+
+    @staticmethod
+    def _get_blocked_reason(response: types.GenerateContentResponse) -> Optional[str]:
+        """Return the block reason if the prompt or the candidate was blocked."""
+        prompt_feedback = getattr(response, 'prompt_feedback', None)
+        if prompt_feedback and prompt_feedback.block_reason:
+            return prompt_feedback.block_reason.name
+        if response.candidates:
+            candidate = response.candidates[0]
+            if candidate.finish_reason and candidate.finish_reason.name in BLOCKED_FINISH_REASONS:
+                return candidate.finish_reason.name
+        return None
+
+    @staticmethod
+    def _usage_to_dict(usage: Optional[types.GenerateContentResponseUsageMetadata]) -> Dict[str, Optional[int]]:
+        """Flatten usage metadata into a JSON-friendly dict."""
+        if usage is None:
+            return {}
+        return {
+            "prompt_tokens": usage.prompt_token_count,
+            "output_tokens": usage.candidates_token_count,
+            "total_tokens": usage.total_token_count,
+        }
+
+    def _to_http_exception(self, e: Exception) -> HTTPException:
+        """Map an upstream or internal error onto the HTTP error we return to clients."""
+        if isinstance(e, HTTPException):
+            return e
+        if isinstance(e, DeadlineExceeded) or (
+            isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)) and expired()
+        ):
+            logger.warning(f"Request deadline exceeded: {e}")
+            return HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=str(e) if isinstance(e, DeadlineExceeded) else "Request deadline exceeded while waiting for the LLM"
+            )
+        if isinstance(e, google_exceptions.InvalidArgument):
+            logger.error(f"Invalid argument error: {e}")
+            return HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid request: {e}"
+            )
+        if isinstance(e, google_exceptions.Unauthenticated):
+            logger.error(f"Authentication error: {e}")
+            return HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid API key or authentication failed"
+            )
+        if isinstance(e, google_exceptions.PermissionDenied):
+            logger.error(f"Permission denied: {e}")
+            if mentions_cached_content(e.message):
+                return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Cached content unavailable: {e.message}")
+            return HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Permission denied - check API key permissions"
+            )
+        if isinstance(e, google_exceptions.ResourceExhausted) or (
+            isinstance(e, genai_errors.APIError) and e.code == status.HTTP_429_TOO_MANY_REQUESTS
+        ):
+            logger.error(f"Rate limit exceeded: {e}")
+            # Pass on how long upstream asked us to back off
+            hint = retry_hint(e)
+            return HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Please try again later.",
+                headers={"Retry-After": str(math.ceil(hint))} if hint is not None else None
+            )
+        if isinstance(e, genai_errors.ClientError):
+            # Raised by every provider for 4xx answers
+            logger.error(f"LLM provider rejected the request: {e}")
+            if e.code == status.HTTP_401_UNAUTHORIZED:
+                return HTTPException(status_code=e.code, detail="Invalid API key or authentication failed")
+            if e.code == status.HTTP_403_FORBIDDEN:
+                # Gemini answers a deleted or expired context cache with a 403 naming the CachedContent
+                if mentions_cached_content(e.message):
+                    return HTTPException(status_code=e.code, detail=f"Cached content unavailable: {e.message}")
+                return HTTPException(status_code=e.code, detail="Permission denied - check API key permissions")
+            return HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid request: {e.message or e}"
+            )
+        if isinstance(e, genai_errors.APIError):
+            logger.error(f"LLM provider error: {e}")
+            return HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"LLM provider error: {e.message or e.code}"
+            )
+        if isinstance(e, httpx.TransportError):
+            logger.error(f"LLM provider unreachable: {e}")
+            return HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="LLM provider is unreachable"
+            )
+        if isinstance(e, google_exceptions.GoogleAPIError):
+            logger.error(f"Google API error: {e}")
+            return HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Google API error: {e}"
+            )
+        logger.error(f"Unexpected error during LLM chat: {e}", exc_info=True)
+        return HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred: {e}"
+        )
+
     async def chat_with_llm(
         self, 
         content: Union[str, ContentMessage], 
         use_search: bool = False,
+        cache_mode: Optional[str] = None,
+        model_tier: Optional[str] = None,
+        user_id: Optional[str] = None,
         **kwargs
     ) -> str:
         """
@@ -207,43 +723,72 @@ class LlmService:
         Args:
             content: The content to send (text string or ContentMessage with images)
             use_search: Whether to enable Google Search tool
+            cache_mode: Optional response cache override ("bypass" or "enable")
+            model_tier: Optional model tier override; otherwise the tier is chosen from the request
+            user_id: The user whose input token budget is charged, or None for internal calls
             **kwargs: Additional parameters like temperature, max_tokens, etc.
         
         Returns:
             str: The LLM's response text
         """
         content_preview = content if isinstance(content, str) else content.text
-        logger.info(f"Sending chat request to LLM with content: {content_preview[:100]}... (search: {use_search})")
-
-        # Create generation config if custom parameters are provided
-        config = None
-        if kwargs:
-            config = types.GenerateContentConfig(
-                temperature=kwargs.get('temperature', 0.7),
-                top_p=kwargs.get('top_p', 0.9),
-                max_output_tokens=kwargs.get('max_tokens', None),
-                candidate_count=1,
-                stop_sequences=kwargs.get('stop_sequences', []),
+        logger.info("Sending chat request to LLM with content: %s... (search: %s)", content_preview[:100], use_search)
+        check_deadline("request validation")
+
+        content = await self._preprocess_images(content)
+        config = self._build_generation_config(kwargs)
+        model = self._choose_model(content, config, use_search, model_tier)
+        content, token_estimate = await self._fit_tokens(content, config, model, user_id)
+
+        use_cache = self.response_cache is not None and self.response_cache.is_cacheable(config, cache_mode)
+        request_key = None
+        if use_cache or self.single_flight is not None:
+            request_key = build_request_key(
+                model, self._iter_cache_segments(content), config, use_search
             )
 
+        if use_cache:
+            cached_reply = await self.response_cache.get(request_key)
+            if cached_reply is not None:
+                logger.info("LLM response served from cache")
+                return cached_reply
+
+        if token_estimate is not None:
+            self.token_budget.charge(token_estimate)
+
         try:
-            response = await self._attempt_llm_chat(content, config, use_search)
+            content = await self._attach_file_uris(content)
+            if self.single_flight is not None:
+                # Identical concurrent requests share one upstream call and retry chain. That call runs
+                # without any one caller's deadline, so each caller bounds its own wait by its deadline.
+                response = await asyncio.wait_for(
+                    self.single_flight.do(
+                        request_key, lambda: self.retry_policy.call(self._attempt_llm_chat, content, config, use_search, model)
+                    ),
+                    timeout=time_remaining()
+                )
+            else:
+                response = await self.retry_policy.call(self._attempt_llm_chat, content, config, use_search, model)
+            self._record_usage(model, response.usage_metadata)
+            if token_estimate is not None:
+                self.token_budget.settle(token_estimate, response.usage_metadata)
+                token_estimate = None
 
             # Extract text from response
             if response.text:
-                logger.info(f"LLM responded: {response.text[:100]}...")
+                logger.info("LLM responded: %s...", response.text[:100])
+                if use_cache:
+                    await self.response_cache.set(request_key, model, response.text)
                 return response.text
             else:
                 # Check if response was blocked or had other issues
-                if hasattr(response, 'candidates') and response.candidates:
-                    candidate = response.candidates[0]
-                    if hasattr(candidate, 'finish_reason') and candidate.finish_reason:
-                        if candidate.finish_reason.name in ['SAFETY', 'RECITATION']:
-                            logger.warning(f"Response blocked: {candidate.finish_reason.name}")
-                            raise HTTPException(
-                                status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Content blocked: {candidate.finish_reason.name}"
-                            )
+                blocked_reason = self._get_blocked_reason(response)
+                if blocked_reason:
+                    logger.warning(f"Response blocked: {blocked_reason}")
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Content blocked: {blocked_reason}"
+                    )
                 
                 logger.error(f"No text in LLM response: {response}")
                 raise HTTPException(
@@ -251,42 +796,186 @@ class LlmService:
                     detail="LLM returned empty response"
                 )
 
-        except google_exceptions.InvalidArgument as e:
-            logger.error(f"Invalid argument error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid request: {e}"
-            )
-        except google_exceptions.Unauthenticated as e:
-            logger.error(f"Authentication error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid API key or authentication failed"
-            )
-        except google_exceptions.PermissionDenied as e:
-            logger.error(f"Permission denied: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Permission denied - check API key permissions"
-            )
-        except google_exceptions.ResourceExhausted as e:
-            logger.error(f"Rate limit exceeded: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please try again later."
-            )
-        except google_exceptions.GoogleAPIError as e:
-            logger.error(f"Google API error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Google API error: {e}"
-            )
         except Exception as e:
-            logger.error(f"Unexpected error during LLM chat: {e}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"An unexpected error occurred: {e}"
+            if token_estimate is not None:
+                self.token_budget.refund(token_estimate)
+            self._forget_rejected_files(content, e)
+            raise self._to_http_exception(e)
+
+    async def open_chat_stream(
+        self,
+        content: Union[str, ContentMessage],
+        use_search: bool = False,
+        model_tier: Optional[str] = None,
+        user_id: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[LlmStreamEvent]:
+        """
+        Open a streaming chat with the LLM.
+
+        Errors before the first chunk (including exhausted retries) are raised
+        as HTTPException so the route can still answer with a normal status code.
+        Errors after that are reported in-band as an "error" event.
+
+        Args:
+            content: The content to send (text string or ContentMessage with images)
+            use_search: Whether to enable Google Search tool
+            model_tier: Optional model tier override; otherwise the tier is chosen from the request
+            user_id: The user whose input token budget is charged, or None for internal calls
+            **kwargs: Additional parameters like temperature, max_tokens, etc.
+
+        Returns:
+            AsyncIterator[LlmStreamEvent]: "delta" events followed by a single "done" or "error" event
+        """
+        content_preview = content if isinstance(content, str) else content.text
+        logger.info("Opening chat stream to LLM with content: %s... (search: %s)", content_preview[:100], use_search)
+        check_deadline("request validation")
+
+        content = await self._preprocess_images(content)
+        config = self._build_generation_config(kwargs)
+        model = self._choose_model(content, config, use_search, model_tier)
+        content, token_estimate = await self._fit_tokens(content, config, model, user_id)
+        if token_estimate is not None:
+            self.token_budget.charge(token_estimate)
+        started_at = time.perf_counter()
+
+        try:
+            content = await self._attach_file_uris(content)
+            first_chunk, iterator = await self.retry_policy.call(self._attempt_llm_stream, content, config, use_search, model)
+        except Exception as e:
+            if token_estimate is not None:
+                self.token_budget.refund(token_estimate)
+            self._forget_rejected_files(content, e)
+            raise self._to_http_exception(e)
+
+        ttft_ms = (time.perf_counter() - started_at) * 1000
+        logger.info("LLM stream time to first token: %.0fms", ttft_ms)
+        return self._iterate_stream(first_chunk, iterator, model, started_at, ttft_ms, token_estimate)
+
+    async def _iterate_stream(
+        self,
+        first_chunk: Optional[types.GenerateContentResponse],
+        iterator: AsyncIterator[types.GenerateContentResponse],
+        model: str,
+        started_at: float,
+        ttft_ms: float,
+        token_estimate: Optional[TokenEstimate] = None
+    ) -> AsyncIterator[LlmStreamEvent]:
+        """Translate GenAI stream chunks into LlmStreamEvents."""
+        chunk = first_chunk
+        usage = None
+        finish_reason = None
+        output_chars = 0
+
+        try:
+            while chunk is not None:
+                if chunk.text:
+                    output_chars += len(chunk.text)
+                    yield LlmStreamEvent(event="delta", data={"text": chunk.text})
+
+                if chunk.usage_metadata:
+                    usage = chunk.usage_metadata
+                if chunk.candidates and chunk.candidates[0].finish_reason:
+                    finish_reason = chunk.candidates[0].finish_reason.name
+
+                blocked_reason = self._get_blocked_reason(chunk)
+                if blocked_reason:
+                    logger.warning(f"Streamed response blocked: {blocked_reason}")
+                    yield LlmStreamEvent(event="error", data={
+                        "status_code": status.HTTP_400_BAD_REQUEST,
+                        "detail": f"Content blocked: {blocked_reason}",
+                        "usage": self._usage_to_dict(usage),
+                    })
+                    return
+
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    chunk = None
+
+        except Exception as e:
+            http_exception = self._to_http_exception(e)
+            yield LlmStreamEvent(event="error", data={
+                "status_code": http_exception.status_code,
+                "detail": http_exception.detail,
+                "usage": self._usage_to_dict(usage),
+            })
+            return
+
+        finally:
+            # Also runs when the client goes away mid-stream; whatever usage arrived is what was billed
+            self._record_usage(model, usage)
+            if token_estimate is not None:
+                self.token_budget.settle(token_estimate, usage)
+
+        if output_chars == 0:
+            logger.error("No text in streamed LLM response")
+            yield LlmStreamEvent(event="error", data={
+                "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "detail": "LLM returned empty response",
+                "usage": self._usage_to_dict(usage),
+            })
+            return
+
+        total_ms = (time.perf_counter() - started_at) * 1000
+        logger.info("LLM stream finished: %d chars in %.0fms (ttft %.0fms)", output_chars, total_ms, ttft_ms)
+        yield LlmStreamEvent(event="done", data={
+            "finish_reason": finish_reason,
+            "usage": self._usage_to_dict(usage),
+            "ttft_ms": round(ttft_ms),
+            "total_ms": round(total_ms),
+        })
+
+    async def create_context_cache(
+        self,
+        prefix: str,
+        system_instruction: Optional[str] = None,
+        ttl_seconds: int = 900,
+        display_name: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Store a stable prompt prefix with Gemini context caching.
+
+        Args:
+            prefix: Text that every later request starts with
+            system_instruction: Optional system instruction stored with the prefix
+            ttl_seconds: How long Gemini keeps the cached content
+            display_name: Optional label shown in the caches API
+            timeout: Seconds to wait for the cache to be created before giving up on it
+
+        Returns:
+            Optional[str]: The cached content name to pass as `cached_content`, or None if caching failed
+        """
+        try:
+            cached_content = await asyncio.wait_for(
+                self.client.aio.caches.create(
+                    model=self.model_name,
+                    config=types.CreateCachedContentConfig(
+                        contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                        system_instruction=system_instruction,
+                        ttl=f"{int(ttl_seconds)}s",
+                        display_name=display_name
+                    )
+                ),
+                timeout=timeout
             )
+            logger.info(f"Created context cache {cached_content.name} ({len(prefix)} chars)")
+            return cached_content.name
+        except asyncio.TimeoutError:
+            logger.warning(f"Context caching took longer than {timeout}s, falling back to inline prefix")
+            return None
+        except Exception as e:
+            logger.warning(f"Context caching failed, falling back to inline prefix: {e}")
+            return None
+
+    async def delete_context_cache(self, name: str) -> None:
+        """Delete cached content created by create_context_cache. Failures are only logged."""
+        try:
+            await self.client.aio.caches.delete(name=name)
+            logger.info(f"Deleted context cache {name}")
+        except Exception as e:
+            logger.warning(f"Failed to delete context cache {name}: {e}")
 
     async def chat_with_image(
         self, 
@@ -334,6 +1023,66 @@ class LlmService:
         """
         return await self.chat_with_llm(content, use_search=True, **kwargs)
 
+    async def chat_batch(self, items: List[Dict[str, Any]], concurrency: int = 8) -> AsyncIterator[BatchChatResult]:
+        """
+        Run independent chat requests concurrently, yielding each result as it finishes.
+
+        Items with identical arguments are sent once and their reply is
+        yielded for every index. Each unique item goes through chat_with_llm,
+        so the response cache, token budget and retries apply to it as usual,
+        and at most `concurrency` of them are in flight at a time. A failing
+        item yields its own error and never fails the batch.
+
+        Args:
+            items: Keyword arguments for chat_with_llm, one dict per item (including "content")
+            concurrency: Maximum number of items in flight
+
+        Returns:
+            AsyncIterator[BatchChatResult]: One result per item, in completion order
+        """
+        indices_by_key: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            indices_by_key.setdefault(self._batch_item_key(item), []).append(index)
+        duplicates = len(items) - len(indices_by_key)
+        if duplicates:
+            LLM_BATCH_ITEMS.labels(outcome="duplicate").inc(duplicates)
+        logger.info("Running batch of %d item(s), %d unique, %d at a time", len(items), len(indices_by_key), concurrency)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(indices: List[int]) -> Tuple[List[int], int, Optional[str], Optional[Any]]:
+            async with semaphore:
+                try:
+                    return indices, status.HTTP_200_OK, await self.chat_with_llm(**items[indices[0]]), None
+                except HTTPException as e:
+                    return indices, e.status_code, None, e.detail
+                except DeadlineExceeded as e:
+                    return indices, status.HTTP_504_GATEWAY_TIMEOUT, None, str(e)
+                except Exception as e:
+                    logger.error(f"Unexpected error in batch item: {e}", exc_info=True)
+                    return indices, status.HTTP_500_INTERNAL_SERVER_ERROR, None, f"An unexpected error occurred: {e}"
+
+        tasks = [asyncio.ensure_future(run(indices)) for indices in indices_by_key.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indices, status_code, reply, detail = await next_done
+                LLM_BATCH_ITEMS.labels(outcome="success" if reply is not None else "error").inc()
+                for index in indices:
+                    yield BatchChatResult(index=index, status_code=status_code, reply=reply, detail=detail)
+        finally:
+            # The caller stopped reading (e.g. the client went away); drop the remaining items
+            for task in tasks:
+                task.cancel()
+
+    def _batch_item_key(self, item: Dict[str, Any]) -> str:
+        """Fingerprint of a batch item's content and arguments, to send identical items once."""
+        digest = hashlib.sha256()
+        for segment in self._iter_cache_segments(item["content"]):
+            digest.update(len(segment).to_bytes(8, "big"))
+            digest.update(segment)
+        digest.update(repr(sorted((key, value) for key, value in item.items() if key != "content")).encode("utf-8"))
+        return digest.hexdigest()
+
     async def health_check(self) -> bool:
         """
         Perform a health check on the LLM service.
@@ -342,7 +1091,7 @@ class LlmService:
             bool: True if service is healthy
         """
         try:
-            response = await self.chat_with_llm("Hello", temperature=0.1)
+            response = await self.chat_with_llm("Hello", cache_mode=CACHE_MODE_BYPASS, temperature=0.1)
             return bool(response.strip())
         except Exception as e:
             logger.warning(f"Health check failed: {e}")
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.metrics import LLM_MODEL_ROUTING, LLM_MODEL_INPUT_CHARS
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ModelTier:
+    """A model requests can be routed to, and the requests it is suitable for."""
+    name: str
+    model: str
+    max_input_chars: Optional[int] = None  # None means no limit
+    images: bool = True
+    search: bool = True
+
+    def fits(self, input_chars: int, has_images: bool, use_search: bool) -> bool:
+        if self.max_input_chars is not None and input_chars > self.max_input_chars:
+            return False
+        return (self.images or not has_images) and (self.search or not use_search)
+
+
+class ModelRouter:
+    """
+    Choose a model tier for each request from its size and features.
+
+    Tiers are listed from cheapest to most capable. Without an override the
+    first tier that fits the request's input size, images and search use is
+    chosen. An override (per-request or per-route) names a tier directly and
+    is honoured unless that tier cannot serve the request. Requests that use
+    a context cache always go to the default tier, whose model created the
+    cache. Every decision is counted with its reason.
+    """
+
+    def __init__(self, tiers: List[ModelTier], default_tier: str):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = {tier.name: tier for tier in tiers}
+        if default_tier not in self.tiers:
+            raise ValueError(f"Unknown default model tier: {default_tier}")
+        self._ordered = tiers
+        self.default = self.tiers[default_tier]
+
+    @classmethod
+    def from_settings(cls, tiers: List[Dict[str, Any]], default_tier: str) -> "ModelRouter":
+        return cls([ModelTier(**tier) for tier in tiers], default_tier)
+
+    def choose(
+        self,
+        input_chars: int,
+        has_images: bool = False,
+        use_search: bool = False,
+        uses_context_cache: bool = False,
+        override: Optional[str] = None
+    ) -> ModelTier:
+        tier, reason = self._choose(input_chars, has_images, use_search, uses_context_cache, override)
+        LLM_MODEL_ROUTING.labels(tier=tier.name, reason=reason).inc()
+        LLM_MODEL_INPUT_CHARS.labels(tier=tier.name).observe(input_chars)
+        logger.debug(f"Routed request ({input_chars} chars, images: {has_images}, search: {use_search}) to tier '{tier.name}' ({reason})")
+        return tier
+
+    def _choose(
+        self,
+        input_chars: int,
+        has_images: bool,
+        use_search: bool,
+        uses_context_cache: bool,
+        override: Optional[str]
+    ) -> Tuple[ModelTier, str]:
+        if uses_context_cache:
+            return self.default, "context_cache"
+
+        if override is not None:
+            tier = self.tiers.get(override)
+            if tier is not None and tier.fits(0, has_images, use_search):
+                return tier, "override"
+            logger.warning(f"Ignoring model tier override '{override}' for this request")
+
+        for tier in self._ordered:
+            if tier.fits(input_chars, has_images, use_search):
+                return tier, "auto"
+        # Nothing fits by size; the last tier is the most capable
+        return self._ordered[-1], "fallback"
@@ -0,0 +1,241 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from google.genai import types
+
+from app.core.metrics import LLM_TOKENS, LLM_TOKEN_ESTIMATE_RATIO, LLM_TOKENS_TRIMMED, LLM_TOKEN_BUDGET_REJECTED
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Gemini averages about 4 characters per token on English text and markup
+CHARS_PER_TOKEN = 4
+# Gemini counts an image of up to 384px per side as 258 tokens; larger images are tiled, so this is a lower bound
+IMAGE_TOKENS = 258
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local estimate of how many tokens Gemini will count for the text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def trim_sections(text: str, excess_chars: int, sections: List[str]) -> Tuple[str, Dict[str, int]]:
+    """
+    Cut up to excess_chars characters from the tagged sections of a prompt.
+
+    Sections are <name>...</name> blocks (e.g. <page_state>) and are trimmed
+    in the given order, each from its end, until enough has been removed. A
+    marker says how much of a section was cut. Text outside the sections is
+    never touched.
+
+    Returns:
+        Tuple: The trimmed text and the characters removed per section
+    """
+    trimmed: Dict[str, int] = {}
+    for section in sections:
+        if excess_chars <= 0:
+            break
+        open_tag, close_tag = f"<{section}>", f"</{section}>"
+        start = text.find(open_tag)
+        end = text.find(close_tag, start + len(open_tag)) if start != -1 else -1
+        if end == -1:
+            continue
+
+        body_start = start + len(open_tag)
+        body = text[body_start:end]
+        marker = f"\n[{section} truncated: {len(body)} chars]"
+        if len(body) <= len(marker):
+            continue
+        keep = max(0, len(body) - excess_chars - len(marker))
+        text = text[:body_start] + body[:keep] + marker + text[end:]
+        removed = len(body) - keep - len(marker)
+        trimmed[section] = removed
+        excess_chars -= removed
+    return text, trimmed
+
+
+@dataclass
+class TokenEstimate:
+    """Pre-flight token estimate for one request, settled against usage_metadata once upstream answers."""
+    model: str
+    tokens: int
+    source: str  # "heuristic" or "count_tokens"
+    user_id: Optional[str] = None
+    charged: int = 0
+    trimmed: Dict[str, int] = field(default_factory=dict)
+
+
+class TokenBudget:
+    """
+    Pre-flight token accounting and enforcement for LLM requests.
+
+    Every request's input is estimated locally before it goes upstream. When
+    the estimate is close to the model's context limit and a count_tokens
+    callable is configured, the exact count is asked for instead and cached
+    by content, so repeated prompts cost one call. Requests over the limit
+    have their tagged sections trimmed in trim_order (page state first, then
+    context) rather than being rejected by upstream after a round trip; only
+    what cannot be trimmed is rejected with 413.
+
+    Each user may also have an input token budget per window. Estimates are
+    charged up front, corrected with the actual prompt tokens from
+    usage_metadata and refunded if the call fails.
+    """
+
+    def __init__(
+        self,
+        context_limits: Dict[str, int],
+        default_context_limit: int,
+        trim_order: List[str],
+        user_tokens_per_window: int = 0,
+        window_seconds: float = 3600.0,
+        count_tokens: Optional[Callable[[str, str], Awaitable[int]]] = None,
+        count_margin: float = 0.2,
+        count_cache_max_entries: int = 1024
+    ):
+        self.context_limits = context_limits
+        self.default_context_limit = default_context_limit
+        self.trim_order = trim_order
+        self.user_tokens_per_window = user_tokens_per_window
+        self.window_seconds = window_seconds
+        self.count_tokens = count_tokens
+        self.count_margin = count_margin
+        self.count_cache_max_entries = count_cache_max_entries
+        self._counts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        # user_id -> (window start, tokens used in the window)
+        self._usage: Dict[str, Tuple[float, int]] = {}
+
+    def context_limit(self, model: str) -> int:
+        return self.context_limits.get(model, self.default_context_limit)
+
+    async def fit(
+        self,
+        text: str,
+        model: str,
+        image_count: int = 0,
+        extra_chars: int = 0,
+        user_id: Optional[str] = None
+    ) -> Tuple[str, TokenEstimate]:
+        """
+        Estimate the request's input tokens and trim it to the model's context limit.
+
+        Args:
+            text: The prompt text
+            model: The model the request is routed to
+            image_count: Number of images sent with the text
+            extra_chars: Other input sent with the request, e.g. the system instruction
+            user_id: The user to charge, or None for internal calls
+
+        Returns:
+            Tuple: The (possibly trimmed) text and its token estimate
+
+        Raises:
+            HTTPException: 413 if the request is still over the limit after trimming.
+        """
+        limit = self.context_limit(model)
+        fixed_tokens = image_count * IMAGE_TOKENS + math.ceil(extra_chars / CHARS_PER_TOKEN)
+        text_tokens, source = await self._count_text(text, model, limit - fixed_tokens)
+        trimmed: Dict[str, int] = {}
+
+        if text_tokens + fixed_tokens > limit:
+            # Scale the excess by this text's own chars per token, which count_tokens may have measured
+            chars_per_token = len(text) / max(1, text_tokens)
+            excess_chars = math.ceil((text_tokens + fixed_tokens - limit) * chars_per_token)
+            text, trimmed = trim_sections(text, excess_chars, self.trim_order)
+            for section, chars in trimmed.items():
+                LLM_TOKENS_TRIMMED.labels(section=section).inc(math.ceil(chars / chars_per_token))
+            if trimmed:
+                logger.warning(f"Trimmed request for {model} to fit {limit} tokens: {trimmed} chars removed")
+                text_tokens, source = await self._count_text(text, model, limit - fixed_tokens)
+
+        tokens = text_tokens + fixed_tokens
+        if tokens > limit:
+            LLM_TOKEN_BUDGET_REJECTED.labels(reason="context_limit").inc()
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Request is about {tokens} tokens; {model} accepts at most {limit}"
+            )
+
+        LLM_TOKENS.labels(model=model, kind="estimated").inc(tokens)
+        return text, TokenEstimate(model=model, tokens=tokens, source=source, user_id=user_id, trimmed=trimmed)
+
+    async def _count_text(self, text: str, model: str, limit: int) -> Tuple[int, str]:
+        """Estimate locally; ask count_tokens only when the estimate is close enough to the limit to matter."""
+        tokens = estimate_tokens(text)
+        if self.count_tokens is None or abs(tokens - limit) > limit * self.count_margin:
+            return tokens, "heuristic"
+
+        key = (model, hashlib.sha256(text.encode("utf-8")).hexdigest())
+        counted = self._counts.get(key)
+        if counted is None:
+            try:
+                counted = await self.count_tokens(model, text)
+            except Exception as e:
+                logger.warning(f"count_tokens failed, using the local estimate: {e}")
+                return tokens, "heuristic"
+            self._counts[key] = counted
+            while len(self._counts) > self.count_cache_max_entries:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(key)
+        return counted, "count_tokens"
+
+    def charge(self, estimate: TokenEstimate) -> None:
+        """
+        Charge the estimate to its user's budget before the call goes upstream.
+
+        Raises:
+            HTTPException: 429 with Retry-After if the user's budget for this window is spent.
+        """
+        if not self.user_tokens_per_window or estimate.user_id is None:
+            return
+        now = time.monotonic()
+        window_start, used = self._window(estimate.user_id, now)
+        if used + estimate.tokens > self.user_tokens_per_window:
+            LLM_TOKEN_BUDGET_REJECTED.labels(reason="user_budget").inc()
+            retry_after = max(1, math.ceil(window_start + self.window_seconds - now))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Input token budget exhausted. Please try again later.",
+                headers={"Retry-After": str(retry_after)}
+            )
+        self._usage[estimate.user_id] = (window_start, used + estimate.tokens)
+        estimate.charged = estimate.tokens
+
+    def settle(self, estimate: TokenEstimate, usage: Optional[types.GenerateContentResponseUsageMetadata]) -> None:
+        """Compare the actual tokens with the estimate and correct the user's charge; without usage the estimate stands."""
+        if usage is None or usage.prompt_token_count is None:
+            return
+        # Cached prefix tokens are not part of what was sent, so they are left out of the comparison
+        cached = usage.cached_content_token_count or 0
+        sent = usage.prompt_token_count - cached
+        output = usage.candidates_token_count or 0
+        if estimate.tokens:
+            LLM_TOKEN_ESTIMATE_RATIO.labels(source=estimate.source).observe(sent / estimate.tokens)
+        logger.info(f"Tokens for {estimate.model}: estimated {estimate.tokens} ({estimate.source}), sent {sent}, cached {cached}, output {output}")
+        self._adjust(estimate, sent)
+
+    def refund(self, estimate: TokenEstimate) -> None:
+        """Give back the charge for a call that failed before upstream billed it."""
+        self._adjust(estimate, 0)
+
+    def _adjust(self, estimate: TokenEstimate, actual: int) -> None:
+        if not estimate.charged or estimate.user_id not in self._usage:
+            return
+        window_start, used = self._usage[estimate.user_id]
+        self._usage[estimate.user_id] = (window_start, max(0, used + actual - estimate.charged))
+        estimate.charged = actual
+
+    def _window(self, user_id: str, now: float) -> Tuple[float, int]:
+        window_start, used = self._usage.get(user_id, (now, 0))
+        if now - window_start >= self.window_seconds:
+            window_start, used = now, 0
+            # Users whose window has also ended hold nothing worth keeping
+            for stale in [u for u, (start, _) in self._usage.items() if now - start >= self.window_seconds]:
+                del self._usage[stale]
+        return window_start, used
@@ -0,0 +1,177 @@
+import math
+import time
+from typing import Any, Dict, Tuple
+
+from app.core.metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS, CIRCUIT_REJECTIONS
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Gauge values for circuit_state
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while a circuit is open."""
+
+    def __init__(self, model: str, endpoint: str, retry_after: int):
+        super().__init__(f"Circuit for {model}/{endpoint} is open")
+        self.model = model
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for one model and endpoint type.
+
+    Closed: calls go through; failure_threshold consecutive upstream failures
+    open the circuit. Open: calls fail immediately until recovery_timeout has
+    passed. Half-open: up to half_open_probes calls are let through at a time;
+    that many successes close the circuit and any failure opens it again.
+
+    Every call allowed by before_call must be followed by exactly one of
+    record_success, record_failure or record_ignored (for outcomes that say
+    nothing about upstream health, such as a bad request or a cancellation),
+    passing back the probe flag before_call returned.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        endpoint: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_probes: int = 2
+    ):
+        self.model = model
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self.state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        CIRCUIT_STATE.labels(model=model, endpoint=endpoint).set(STATE_VALUES[self.state])
+
+    def before_call(self) -> bool:
+        """
+        Check whether a call may go upstream.
+
+        Returns:
+            bool: True if the call is a half-open probe; pass it back to the record_* method
+
+        Raises:
+            CircuitOpenError: If the call must not go upstream right now.
+        """
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.recovery_timeout:
+                self._reject()
+            self._transition(STATE_HALF_OPEN)
+
+        if self.state == STATE_HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self._reject()
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def record_success(self, probe: bool) -> None:
+        if probe:
+            if self.state != STATE_HALF_OPEN:
+                return
+            self._probes_in_flight -= 1
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self._transition(STATE_CLOSED)
+        elif self.state == STATE_CLOSED:
+            self._consecutive_failures = 0
+
+    def record_failure(self, probe: bool) -> None:
+        if probe:
+            if self.state == STATE_HALF_OPEN:
+                self._probes_in_flight -= 1
+                self._transition(STATE_OPEN)
+            return
+
+        # Results of calls that started before the circuit opened say nothing new
+        if self.state == STATE_CLOSED:
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.failure_threshold:
+                self._transition(STATE_OPEN)
+
+    def record_ignored(self, probe: bool) -> None:
+        if probe and self.state == STATE_HALF_OPEN:
+            self._probes_in_flight -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the circuit will let a probe through."""
+        if self.state != STATE_OPEN:
+            return 1
+        remaining = self.recovery_timeout - (time.monotonic() - self._opened_at)
+        return max(1, math.ceil(remaining))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "retry_after": self.retry_after() if self.state == STATE_OPEN else None,
+        }
+
+    def _reject(self) -> None:
+        CIRCUIT_REJECTIONS.labels(model=self.model, endpoint=self.endpoint).inc()
+        raise CircuitOpenError(self.model, self.endpoint, self.retry_after())
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"Circuit {self.model}/{self.endpoint}: {self.state} -> {state}")
+        self.state = state
+        if state == STATE_OPEN:
+            self._opened_at = time.monotonic()
+        if state == STATE_HALF_OPEN:
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        if state == STATE_CLOSED:
+            self._consecutive_failures = 0
+        CIRCUIT_STATE.labels(model=self.model, endpoint=self.endpoint).set(STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(model=self.model, endpoint=self.endpoint, state=state).inc()
+
+
+class CircuitBreakerRegistry:
+    """Creates and holds one CircuitBreaker per (model, endpoint type)."""
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_probes: int = 2):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, model: str, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get((model, endpoint))
+        if breaker is None:
+            breaker = CircuitBreaker(
+                model,
+                endpoint,
+                failure_threshold=self.failure_threshold,
+                recovery_timeout=self.recovery_timeout,
+                half_open_probes=self.half_open_probes
+            )
+            self._breakers[(model, endpoint)] = breaker
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current state of every circuit, keyed by "model/endpoint"."""
+        return {f"{model}/{endpoint}": breaker.snapshot() for (model, endpoint), breaker in self._breakers.items()}
+
+    def all_open(self, endpoint: str) -> bool:
+        """Whether this endpoint has circuits and every one of them (one per model) is open."""
+        breakers = [breaker for (_, breaker_endpoint), breaker in self._breakers.items() if breaker_endpoint == endpoint]
+        return bool(breakers) and all(breaker.state == STATE_OPEN for breaker in breakers)
+
+    def any_open(self) -> bool:
+        return any(breaker.state == STATE_OPEN for breaker in self._breakers.values())
@@ -0,0 +1,162 @@
+import asyncio
+import math
+from collections import deque
+from typing import Deque, Optional
+
+from app.core.metrics import (
+    CONCURRENCY_LIMIT,
+    CONCURRENCY_IN_FLIGHT,
+    CONCURRENCY_QUEUE_DEPTH,
+    CONCURRENCY_REJECTIONS
+)
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a caller cannot get a slot: the wait queue is full or the wait timed out."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Concurrency limit exceeded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limiter with a bounded FIFO wait queue.
+
+    The limit grows by roughly one slot per limit's worth of successful calls
+    and shrinks multiplicatively when a call signals overload (429, 503,
+    deadline exceeded) or when its latency exceeds latency_tolerance times the
+    baseline. The baseline tracks the lowest recent latency and drifts slowly
+    upward so it can follow a genuine change in upstream speed.
+
+    Callers over the limit wait in a queue of at most max_queue entries for up
+    to queue_timeout seconds. A full queue rejects immediately instead of
+    piling up coroutines.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 16,
+        min_limit: int = 2,
+        max_limit: int = 128,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+        latency_tolerance: float = 2.5,
+        backoff_ratio: float = 0.9
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._baseline_latency: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._update_gauges()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for a slot.
+
+        Args:
+            timeout: Optional shorter wait than queue_timeout, e.g. what is left of the request's deadline
+
+        Raises:
+            ConcurrencyLimitExceeded: If the wait queue is full or the wait times out.
+        """
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            self._update_gauges()
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            queue_timeout = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+            await asyncio.wait_for(waiter, timeout=queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release_slot()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._update_gauges()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("queue_timeout")
+        self._update_gauges()
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """
+        Return a slot and feed the outcome of the call into the limit.
+
+        Args:
+            latency: Seconds the call took, if it completed normally
+            overloaded: Whether the call failed with an overload signal
+        """
+        if overloaded:
+            self._decrease("overload")
+        elif latency is not None:
+            if self._baseline_latency is None or latency < self._baseline_latency:
+                self._baseline_latency = latency
+            else:
+                self._baseline_latency += (latency - self._baseline_latency) * 0.01
+
+            if latency > self._baseline_latency * self.latency_tolerance:
+                self._decrease("latency")
+            else:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+        self._release_slot()
+
+    def _decrease(self, reason: str) -> None:
+        previous = self.limit
+        self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+        if self.limit != previous:
+            logger.info(f"Concurrency limit '{self.name}' lowered to {self.limit} ({reason})")
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        # Hand freed slots directly to waiters so newcomers cannot jump the queue
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            waiter.set_result(None)
+            self._in_flight += 1
+        self._update_gauges()
+
+    def _reject(self, reason: str) -> None:
+        CONCURRENCY_REJECTIONS.labels(name=self.name, reason=reason).inc()
+        # Roughly how long until the queue ahead has drained through the current limit
+        expected_wait = (self._baseline_latency or 1.0) * (len(self._waiters) + 1) / max(self.limit, 1)
+        raise ConcurrencyLimitExceeded(reason, retry_after=max(1, math.ceil(expected_wait)))
+
+    def _update_gauges(self) -> None:
+        CONCURRENCY_LIMIT.labels(name=self.name).set(self.limit)
+        CONCURRENCY_IN_FLIGHT.labels(name=self.name).set(self._in_flight)
+        CONCURRENCY_QUEUE_DEPTH.labels(name=self.name).set(len(self._waiters))
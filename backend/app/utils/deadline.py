@@ -0,0 +1,85 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from app.core.metrics import DEADLINE_EXCEEDED
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Absolute time.monotonic() by which the current request must be answered
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget runs out before a stage can start or finish."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Give the code inside the block at most `seconds` to finish.
+
+    Nested scopes can only shorten the deadline, never extend it. None leaves
+    the current deadline as it is.
+    """
+    deadline = _deadline.get()
+    if seconds is not None:
+        new_deadline = time.monotonic() + seconds
+        deadline = new_deadline if deadline is None else min(deadline, new_deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """
+    Run the block without any request deadline.
+
+    For work started on behalf of several requests at once, which must not
+    fail because one of them has little time left; each request bounds its
+    own wait instead.
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is no deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def check_deadline(stage: str) -> None:
+    """
+    Raise DeadlineExceeded if the current deadline has passed.
+
+    Args:
+        stage: What was about to happen, reported in the error and metrics
+    """
+    if expired():
+        logger.warning(f"Request deadline exceeded before {stage}")
+        DEADLINE_EXCEEDED.labels(stage=stage).inc()
+        raise DeadlineExceeded(stage)
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, Callable, Coroutine
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.types import Message, Receive
+
+from app.core.metrics import CLIENT_DISCONNECTS, CLIENT_DISCONNECT_SAVED_SECONDS
+from app.utils.deadline import time_remaining
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Not a registered status code; the nginx convention for "client closed request"
+HTTP_499_CLIENT_CLOSED_REQUEST = 499
+
+
+async def _wait_for_disconnect(receive: Receive, body_received: asyncio.Event) -> None:
+    # Only listen once the endpoint has read the whole body, so no body message is taken from it
+    await body_received.wait()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class CancelOnDisconnectRoute(APIRoute):
+    """
+    Route class that cancels the endpoint when the client disconnects.
+
+    Once the request body has been read, a watcher waits for the client to go
+    away. If it does before the endpoint returns, the endpoint task is
+    cancelled. Cancellation runs through the retry loop, single-flight,
+    hedging and the upstream slot, which hands back its concurrency permit
+    and tells the circuit breaker to ignore the attempt. Streaming responses
+    are not covered once the endpoint has returned; Starlette already stops
+    them on disconnect.
+
+    Cooperates with other route classes through super(), e.g.
+    class Route(CancelOnDisconnectRoute, BoundedUploadRoute).
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original_route_handler = super().get_route_handler()
+
+        async def cancelling_route_handler(request: Request) -> Response:
+            body_received = asyncio.Event()
+
+            async def tracking_receive() -> Message:
+                message = await request.receive()
+                if message["type"] != "http.request" or not message.get("more_body", False):
+                    body_received.set()
+                return message
+
+            started_at = time.perf_counter()
+            handler = asyncio.ensure_future(original_route_handler(Request(request.scope, tracking_receive)))
+            watcher = asyncio.ensure_future(_wait_for_disconnect(request.receive, body_received))
+            try:
+                await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                watcher.cancel()
+                if not handler.done():
+                    handler.cancel()
+
+            if not handler.cancelled() and handler.done():
+                return handler.result()
+
+            # Upper bound: the time budget the request could still have spent upstream
+            saved_seconds = time_remaining() or 0.0
+            path = self.path_format
+            logger.info(f"Client disconnected from {path} after {time.perf_counter() - started_at:.2f}s; cancelled in-flight work")
+            CLIENT_DISCONNECTS.labels(route=path).inc()
+            CLIENT_DISCONNECT_SAVED_SECONDS.labels(route=path).observe(saved_seconds)
+
+            # Let cancellation clean up (release permits, close upstream streams) before answering
+            await asyncio.gather(handler, return_exceptions=True)
+            return Response(status_code=HTTP_499_CLIENT_CLOSED_REQUEST)
+
+        return cancelling_route_handler
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Set
+
+from app.core.metrics import HEDGE_REQUESTS, HEDGE_WINS
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class RequestHedger:
+    """
+    Start a second identical call when the first one is slower than usual.
+
+    The hedge delay is the given percentile of recent successful call
+    latencies; nothing is hedged until min_samples latencies have been seen.
+    Whichever call succeeds first wins and the other is cancelled. Hedges are
+    paid for from a token bucket that earns budget_ratio tokens per call, so
+    hedging adds at most that fraction of extra calls (plus a small burst)
+    and cannot double the load during an incident.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 0.95,
+        budget_ratio: float = 0.05,
+        min_delay: float = 0.25,
+        min_samples: int = 20,
+        window_size: int = 200,
+        max_burst: float = 10.0
+    ):
+        self.name = name
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_burst = max_burst
+        self._latencies: Deque[float] = deque(maxlen=window_size)
+        self._tokens = 0.0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is not enough latency history."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return max(self.min_delay, ordered[index])
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call, hedging it once if it outlives the hedge delay and the budget allows."""
+        self._tokens = min(self.max_burst, self._tokens + self.budget_ratio)
+        delay = self.hedge_delay()
+
+        primary = self._start(call)
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                HEDGE_REQUESTS.labels(name=self.name, outcome="not_needed").inc()
+                return self._finish(primary)
+
+            if self._tokens < 1:
+                HEDGE_REQUESTS.labels(name=self.name, outcome="budget_exhausted").inc()
+                await asyncio.wait(tasks)
+                return self._finish(primary)
+
+            self._tokens -= 1
+            HEDGE_REQUESTS.labels(name=self.name, outcome="hedged").inc()
+            logger.debug(f"Hedging '{self.name}' call after {delay:.2f}s")
+            hedge = self._start(call)
+            tasks.add(hedge)
+
+            first_error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        HEDGE_WINS.labels(name=self.name, winner="hedge" if task is hedge else "primary").inc()
+                        return self._finish(task)
+                    first_error = first_error or task.exception()
+            # Both calls failed
+            raise first_error
+        finally:
+            if tasks:
+                await self._cancel(tasks)
+
+    @staticmethod
+    async def _cancel(tasks: Set[asyncio.Task]) -> None:
+        """
+        Cancel the calls still running and wait for them to unwind, so their
+        cleanup (concurrency permit, circuit breaker, metrics) has finished
+        when run returns. A cancellation arriving meanwhile is re-raised only
+        after that.
+        """
+        for task in tasks:
+            task.cancel()
+        cleanup = asyncio.gather(*tasks, return_exceptions=True)
+        cancelled = False
+        while not cleanup.done():
+            try:
+                await asyncio.shield(cleanup)
+            except asyncio.CancelledError:
+                cancelled = True
+        if cancelled:
+            raise asyncio.CancelledError()
+
+    @staticmethod
+    def _start(call: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        async def timed() -> Any:
+            started_at = time.perf_counter()
+            result = await call()
+            return result, time.perf_counter() - started_at
+        return asyncio.ensure_future(timed())
+
+    def _finish(self, task: asyncio.Task) -> Any:
+        # Raises the call's exception if it failed; only successful latencies feed the window
+        result, latency = task.result()
+        self._latencies.append(latency)
+        return result
@@ -1,14 +1,204 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.core.metrics import LOG_RECORDS_DROPPED
+from app.utils import tracing
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "trace_id", "span_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _truncate(value: str, max_chars: int) -> str:
+    if len(value) <= max_chars:
+        return value
+    return f"{value[:max_chars]}... [{len(value) - max_chars} chars truncated]"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, trace ids and any `extra` fields."""
+
+    def __init__(self, max_field_chars: int = 2000):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+            entry["span_id"] = record.span_id
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (int, float, bool, type(None))) else _truncate(str(value), self.max_field_chars)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO and DEBUG records from high-volume loggers.
+
+    Rates are looked up by logger name, falling back to the nearest parent
+    listed. Records inside a trace are kept or dropped per trace, so a
+    sampled request keeps all of its lines. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        trace_id = getattr(record, "trace_id", None)
+        draw = int(trace_id[:8], 16) / 0x100000000 if trace_id else random.random()
+        if draw < rate:
+            return True
+        LOG_RECORDS_DROPPED.labels(reason="sampled").inc()
+        return False
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            parts = name.split(".")
+            rate = 1.0
+            for i in range(len(parts), 0, -1):
+                candidate = ".".join(parts[:i])
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+            self._resolved[name] = rate
+        return rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the listener thread without ever waiting.
+
+    The caller only tags the record with its trace, resolves the message
+    (bounded to max_message_chars) and the traceback text; JSON encoding and
+    all I/O happen on the listener thread. When the queue is full the record
+    is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_message_chars: int = 2000):
+        super().__init__(log_queue)
+        self.max_message_chars = max_message_chars
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # Tag before filtering so sampling can follow the trace
+        current = tracing.current_span()
+        if current is not None:
+            record.trace_id = current.context.trace_id
+            record.span_id = current.context.span_id
+        return super().handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve arguments now: they may change or be unpicklable by the time the listener runs
+        record.msg = _truncate(record.getMessage(), self.max_message_chars)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _truncate(logging.Formatter().formatException(record.exc_info), self.max_message_chars * 4)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(reason="queue_full").inc()
+
+
+def setup_logging(
+    log_file: Optional[str] = "app.log",
+    level=logging.INFO,
+    json_format: bool = True,
+    max_bytes: int = 50 * 1024 * 1024,
+    backup_count: int = 5,
+    queue_size: int = 10000,
+    max_message_chars: int = 2000,
+    sample_rates: Optional[Dict[str, float]] = None
+) -> None:
+    """
+    Route all logging through a queue to a background thread.
+
+    Loggers only put records on a bounded queue; a QueueListener thread
+    formats them and writes to stderr and a size-rotated log file, so a slow
+    disk or terminal never blocks the event loop. uvicorn's own loggers are
+    sent through the same pipeline.
+
+    Args:
+        log_file: Path of the rotated log file, or None for stderr only
+        level: Root log level
+        json_format: Write one JSON object per line instead of plain text
+        max_bytes: Size at which the log file is rotated
+        backup_count: Rotated files kept
+        queue_size: Records waiting for the writer thread before new ones are dropped
+        max_message_chars: Longest message (and `extra` field) kept; longer ones are truncated
+        sample_rates: Fraction of INFO/DEBUG records kept per logger name
+    """
+    global _listener
+    shutdown_logging()
+
+    if json_format:
+        formatter = JsonFormatter(max_field_chars=max_message_chars)
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue, max_message_chars=max_message_chars)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # uvicorn installs its own synchronous handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass  # The writer is too far behind to take the stop signal; it is a daemon thread and dies with the process
+        _listener = None
 
-def setup_logging(log_file: str = "app.log", level=logging.INFO):
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
 
 def get_logger(name: str):
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
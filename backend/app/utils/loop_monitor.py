@@ -0,0 +1,43 @@
+import asyncio
+import time
+from typing import Optional
+
+from app.core.metrics import EVENT_LOOP_LAG_SECONDS
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class EventLoopLagMonitor:
+    """
+    Sample how late the event loop wakes a sleeping task.
+
+    A task sleeps for `interval` and measures how much longer than that it
+    actually took to resume. The difference is time the loop spent running
+    other callbacks without yielding, usually synchronous work that should
+    be in a thread, and is what every other request on the loop waited too.
+    """
+
+    def __init__(self, interval: float = 0.5, warn_seconds: float = 1.0):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started_at - self.interval)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.warn_seconds:
+                logger.warning(f"Event loop was blocked for {lag:.2f}s")
@@ -0,0 +1,252 @@
+import logging
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from tenacity import AsyncRetrying, RetryCallState, Retrying, before_sleep_log, retry, retry_if_exception
+
+from app.core.metrics import RETRY_ATTEMPTS, RETRY_DECISIONS, RETRY_BUDGET_TOKENS
+from app.utils import tracing
+from app.utils.deadline import current_deadline
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+RETRY_INFO_TYPE = "type.googleapis.com/google.rpc.RetryInfo"
+
+_DURATION_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)s\s*$")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as delay seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _parse_duration(value: Any) -> Optional[float]:
+    """Parse a google.protobuf.Duration, either as its JSON string ("27s") or as a message."""
+    if isinstance(value, str):
+        match = _DURATION_PATTERN.match(value)
+        return float(match.group(1)) if match else None
+    if hasattr(value, "seconds"):
+        return value.seconds + getattr(value, "nanos", 0) / 1e9
+    return None
+
+
+def retry_hint(exception: BaseException) -> Optional[float]:
+    """
+    Seconds the upstream asked us to wait before retrying, if it said.
+
+    Looks for a Retry-After header on the error's HTTP response and for a
+    google.rpc.RetryInfo entry in its error details, which Gemini attaches to
+    429 responses. When both are present the longer wait wins.
+    """
+    hints = []
+
+    response = getattr(exception, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        hint = parse_retry_after(headers.get("Retry-After"))
+        if hint is not None:
+            hints.append(hint)
+
+    details = getattr(exception, "details", None)
+    if isinstance(details, dict):
+        # google.genai errors carry the JSON error body; "error" is usually an object but not always
+        error = details.get("error", details)
+        details = error.get("details") if isinstance(error, dict) else None
+    if isinstance(details, (list, tuple)):
+        for detail in details:
+            if isinstance(detail, dict):
+                if detail.get("@type") == RETRY_INFO_TYPE:
+                    hint = _parse_duration(detail.get("retryDelay"))
+                    if hint is not None:
+                        hints.append(hint)
+            elif hasattr(detail, "retry_delay"):
+                # google.api_core errors carry decoded protobuf messages
+                hint = _parse_duration(detail.retry_delay)
+                if hint is not None:
+                    hints.append(hint)
+
+    return max(hints) if hints else None
+
+
+class RetryBudget:
+    """
+    Process-wide token bucket that caps retries at a fraction of first attempts.
+
+    Every first attempt earns `ratio` tokens and every retry costs one, so
+    once the bucket is empty retries stop until enough new traffic has come
+    in. The bucket starts full so a cold or quiet process can still retry a
+    few transient errors. Shared by every caller of an upstream, including
+    transcript fetches running in worker threads, hence the lock.
+    """
+
+    def __init__(self, name: str, ratio: float = 0.1, max_tokens: float = 10.0):
+        self.name = name
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+        RETRY_BUDGET_TOKENS.labels(name=name).set(self._tokens)
+
+    def record_attempt(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+            RETRY_BUDGET_TOKENS.labels(name=self.name).set(self._tokens)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            RETRY_BUDGET_TOKENS.labels(name=self.name).set(self._tokens)
+            return True
+
+
+class RetryPolicy:
+    """
+    Shared retry policy for calls to an upstream service.
+
+    Waits use exponential backoff with full jitter (a uniform delay between
+    zero and the backoff cap), unless the upstream sent a retry hint, in which
+    case the hint is the minimum wait. A retry is only started if:
+    - fewer than max_attempts attempts have been made,
+    - the hint is no longer than max_hint_delay; otherwise the error is
+      raised so the caller can pass the hint on to its own client,
+    - the wait plus the average attempt duration so far still fits before
+      the deadline: the earliest of deadline_seconds after the first attempt,
+      an absolute time.monotonic() deadline passed to call, and the current
+      request's deadline,
+    - and the retry budget, if any, has a token left.
+
+    hint_applies can say a hint does not bind the next attempt, e.g. because
+    it will go to a different API key; the normal backoff is used instead.
+
+    The last error is re-raised as-is once retries stop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        retryable: Callable[[BaseException], bool],
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 5.0,
+        max_hint_delay: float = 30.0,
+        deadline_seconds: Optional[float] = None,
+        budget: Optional[RetryBudget] = None,
+        log: Optional[logging.Logger] = None,
+        log_exc_info: bool = False,
+        hint_applies: Optional[Callable[[BaseException], bool]] = None
+    ):
+        self.name = name
+        self.retryable = retryable
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_hint_delay = max_hint_delay
+        self.deadline_seconds = deadline_seconds
+        self.budget = budget
+        self.log = log or logger
+        self.log_exc_info = log_exc_info
+        self.hint_applies = hint_applies
+        self._log_before_sleep = before_sleep_log(self.log, logging.INFO, exc_info=self.log_exc_info)
+
+    def wraps(self, fn: Callable[..., T]) -> Callable[..., T]:
+        """Decorate a sync or async function so every call runs under this policy."""
+        return retry(**self._tenacity_kwargs(None))(fn)
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args, deadline: Optional[float] = None, **kwargs) -> T:
+        """Await fn(*args, **kwargs) under this policy, giving up on retries at the absolute deadline."""
+        return await AsyncRetrying(**self._tenacity_kwargs(deadline))(fn, *args, **kwargs)
+
+    def call_sync(self, fn: Callable[..., T], *args, deadline: Optional[float] = None, **kwargs) -> T:
+        """Call fn(*args, **kwargs) under this policy, giving up on retries at the absolute deadline."""
+        return Retrying(**self._tenacity_kwargs(deadline))(fn, *args, **kwargs)
+
+    def _tenacity_kwargs(self, deadline: Optional[float]) -> Dict[str, Any]:
+        return {
+            "retry": retry_if_exception(self.retryable),
+            "wait": self._wait,
+            "stop": lambda retry_state: self._should_stop(retry_state, deadline),
+            "before": self._before_attempt,
+            "before_sleep": self._before_sleep,
+            "reraise": True,
+        }
+
+    def _before_sleep(self, retry_state: RetryCallState) -> None:
+        self._log_before_sleep(retry_state)
+        # Ended when the next attempt starts; kept on the call's state since nothing else spans the sleep
+        retry_state.backoff_span = tracing.start_span(
+            "retry.backoff", policy=self.name, attempt=retry_state.attempt_number, seconds=round(retry_state.upcoming_sleep, 3)
+        )
+
+    def _before_attempt(self, retry_state: RetryCallState) -> None:
+        backoff_span = getattr(retry_state, "backoff_span", None)
+        if backoff_span is not None:
+            backoff_span.end()
+        first = retry_state.attempt_number == 1
+        RETRY_ATTEMPTS.labels(name=self.name, attempt="first" if first else "retry").inc()
+        if first and self.budget is not None:
+            self.budget.record_attempt()
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        backoff = min(self.max_delay, self.base_delay * 2 ** (retry_state.attempt_number - 1))
+        delay = random.uniform(0, backoff)
+        hint = self._hint(retry_state)
+        if hint is not None:
+            # Spread the retries of callers that all got the same hint
+            delay = hint + random.uniform(0, self.base_delay)
+        return delay
+
+    def _should_stop(self, retry_state: RetryCallState, deadline: Optional[float]) -> bool:
+        # tenacity computes the wait before asking whether to stop
+        if retry_state.attempt_number >= self.max_attempts:
+            return self._stop("attempts_exhausted")
+
+        hint = self._hint(retry_state)
+        if hint is not None and hint > self.max_hint_delay:
+            return self._stop("hint_too_long")
+
+        deadlines = [d for d in (deadline, current_deadline()) if d is not None]
+        if self.deadline_seconds is not None:
+            deadlines.append(retry_state.start_time + self.deadline_seconds)
+        if deadlines:
+            deadline = min(deadlines)
+            attempt_seconds = (retry_state.seconds_since_start - retry_state.idle_for) / retry_state.attempt_number
+            if time.monotonic() + retry_state.upcoming_sleep + attempt_seconds > deadline:
+                return self._stop("deadline")
+
+        if self.budget is not None and not self.budget.try_spend():
+            return self._stop("budget_exhausted")
+
+        RETRY_DECISIONS.labels(name=self.name, outcome="retried").inc()
+        return False
+
+    def _hint(self, retry_state: RetryCallState) -> Optional[float]:
+        exception = retry_state.outcome.exception()
+        if self.hint_applies is not None and not self.hint_applies(exception):
+            return None
+        return retry_hint(exception)
+
+    def _stop(self, reason: str) -> bool:
+        if reason != "attempts_exhausted":
+            self.log.warning(f"Not retrying '{self.name}' call: {reason}")
+        RETRY_DECISIONS.labels(name=self.name, outcome=reason).inc()
+        return True
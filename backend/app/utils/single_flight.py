@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.core.metrics import LLM_SINGLE_FLIGHT_CALLS
+from app.utils.deadline import no_deadline
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _InFlightCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one underlying task.
+
+    Every caller awaits the shared task through asyncio.shield, so cancelling
+    one caller never cancels the work other callers are still waiting on. The
+    shared task is only cancelled once its last waiter has gone away.
+
+    The shared task does not inherit the first caller's request deadline, so
+    a caller with a short budget cannot make the call fail for the others.
+    Callers with a deadline bound their own wait, e.g. with
+    asyncio.wait_for(..., time_remaining()).
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            with no_deadline():
+                call = _InFlightCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(self._make_done_callback(key, call))
+            self._calls[key] = call
+            LLM_SINGLE_FLIGHT_CALLS.labels(name=self.name, role="leader").inc()
+        else:
+            logger.debug(f"Joining in-flight call for key {key}")
+            LLM_SINGLE_FLIGHT_CALLS.labels(name=self.name, role="follower").inc()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left to read the result
+                logger.debug(f"Cancelling abandoned in-flight call for key {key}")
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+
+    def _make_done_callback(self, key: Hashable, call: _InFlightCall) -> Callable[[asyncio.Task], None]:
+        def _on_done(task: asyncio.Task) -> None:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            # Mark the exception as retrieved when every waiter has already left
+            if not task.cancelled():
+                task.exception()
+        return _on_done
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,17 @@
+import json
+from typing import Any, Dict
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """
+    Format a single Server-Sent Event.
+
+    Args:
+        event: The SSE event name (e.g. "delta", "done", "error")
+        data: JSON-serialisable payload for the event
+
+    Returns:
+        str: The encoded event, terminated by a blank line
+    """
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,224 @@
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from app.core.metrics import TRACE_SPANS
+
+# Not app.utils.logger.get_logger: the logging pipeline tags records with the current span, so it imports this module
+logger = logging.getLogger(__name__)
+
+# version-trace_id-parent_id-flags, see https://www.w3.org/TR/trace-context/#traceparent-header
+TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+SAMPLED_FLAG = 0x01
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """The identifiers a span passes on to its children, locally or in a traceparent header."""
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Read a W3C traceparent header; None if it is missing or malformed."""
+    if not value:
+        return None
+    match = TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    # Version ff is forbidden, and version 00 has exactly four fields
+    if version == "ff" or (version == "00" and rest):
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id=trace_id, span_id=span_id, sampled=bool(int(flags, 16) & SAMPLED_FLAG))
+
+
+@dataclass
+class Span:
+    """One timed operation. End it exactly once, directly or by leaving a span() block."""
+    name: str
+    context: SpanContext
+    parent_id: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    _started_at: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started_at
+        if self.context.sampled and _exporter is not None:
+            _exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class InMemorySpanExporter:
+    """Keeps the most recent finished spans in process, e.g. for tests or a debug view."""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+        TRACE_SPANS.labels(outcome="exported").inc()
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        return [span for span in self._spans if trace_id is None or span.context.trace_id == trace_id]
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonLinesSpanExporter:
+    """
+    Appends finished spans to a file, one JSON object per line.
+
+    Spans are handed to a writer thread through a bounded queue, so ending a
+    span never waits on the disk. If the writer falls behind and the queue
+    is full, new spans are dropped and counted rather than slowing requests.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._write_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            TRACE_SPANS.labels(outcome="dropped").inc()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Write out the spans already queued and stop the writer thread."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _write_loop(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                try:
+                    f.write(json.dumps(record, default=str) + "\n")
+                    # Flush once the queue is drained rather than per span
+                    if self._queue.empty():
+                        f.flush()
+                    TRACE_SPANS.labels(outcome="exported").inc()
+                except Exception as e:
+                    logger.error(f"Failed to write span: {e}")
+                    TRACE_SPANS.labels(outcome="dropped").inc()
+
+
+_exporter: Optional[Any] = None
+_sample_ratio: float = 1.0
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def setup_tracing(exporter: Optional[Any], sample_ratio: float = 1.0) -> None:
+    """
+    Choose where finished spans go. Without an exporter spans are still
+    created and propagated, so traceparent headers stay consistent, but
+    nothing is recorded.
+
+    Args:
+        exporter: An InMemorySpanExporter, JsonLinesSpanExporter or None
+        sample_ratio: Fraction of new traces to record; traces started by a
+            client keep the client's sampling decision
+    """
+    global _exporter, _sample_ratio
+    _exporter = exporter
+    _sample_ratio = sample_ratio
+
+
+def shutdown_tracing() -> None:
+    if _exporter is not None:
+        _exporter.shutdown()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, parent: Optional[SpanContext] = None, **attributes: Any) -> Span:
+    """
+    Start a span without making it current; call span.end() when it is done.
+
+    Use this when the span ends somewhere the start's context does not
+    reach, e.g. in a different thread or callback. Prefer span() otherwise.
+    """
+    if parent is None:
+        current = _current.get()
+        parent = current.context if current is not None else None
+    if parent is None:
+        context = SpanContext(
+            trace_id=f"{random.getrandbits(128):032x}",
+            span_id=f"{random.getrandbits(64):016x}",
+            sampled=random.random() < _sample_ratio
+        )
+    else:
+        context = SpanContext(trace_id=parent.trace_id, span_id=f"{random.getrandbits(64):016x}", sampled=parent.sampled)
+    return Span(name=name, context=context, parent_id=parent.span_id if parent else None, attributes=attributes)
+
+
+@contextmanager
+def span(name: str, parent: Optional[SpanContext] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Time the block as a child of the current span (or of `parent`) and make
+    it the current span inside the block. An exception marks it as failed.
+    """
+    new_span = start_span(name, parent, **attributes)
+    token = _current.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        new_span.end()
@@ -0,0 +1,166 @@
+from typing import Any, AsyncGenerator, Callable, Coroutine, Optional, Set
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from python_multipart.multipart import parse_options_header
+from starlette.datastructures import FormData, Headers
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from app.core.config import settings
+from app.core.metrics import UPLOAD_REJECTIONS
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+
+# Enough leading bytes to recognise every allowed image format
+SNIFF_BYTES = 12
+
+
+def sniff_image_mime(head: bytes) -> Optional[str]:
+    """Detect the image type from its leading magic bytes, ignoring whatever the client declared."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class UploadRejected(MultiPartException):
+    """An uploaded part broke a size or type limit while the body was being received."""
+
+    def __init__(self, message: str, status_code: int, reason: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+
+
+class BoundedMultiPartParser(MultiPartParser):
+    """
+    Multipart parser that enforces upload limits while the body streams in.
+
+    Starlette's parser spools every file part to a temporary file with no size
+    limit, so an oversized upload is only noticed after it has been received in
+    full. This subclass counts bytes per file and across the whole request, and
+    checks each file's magic bytes as soon as they arrive. Parsing stops at the
+    first violation, so the rest of the body is never read.
+    """
+
+    def __init__(
+        self,
+        headers: Headers,
+        stream: AsyncGenerator[bytes, None],
+        *,
+        max_files: int,
+        max_part_size: int,
+        max_file_bytes: int,
+        max_total_bytes: int,
+        allowed_types: Set[str]
+    ):
+        super().__init__(headers, stream, max_files=max_files, max_part_size=max_part_size)
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.allowed_types = allowed_types
+        self._total_bytes = 0
+        self._file_bytes = 0
+        self._head = bytearray()
+        self._type_checked = False
+
+    def on_part_begin(self) -> None:
+        super().on_part_begin()
+        self._file_bytes = 0
+        self._head = bytearray()
+        self._type_checked = False
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        size = end - start
+        self._total_bytes += size
+        if self._total_bytes > self.max_total_bytes:
+            raise UploadRejected(
+                f"Request too large. Maximum total upload size is {self.max_total_bytes // (1024 * 1024)}MB.",
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                "request_too_large"
+            )
+
+        upload = self._current_part.file
+        if upload is not None:
+            self._file_bytes += size
+            if self._file_bytes > self.max_file_bytes:
+                raise UploadRejected(
+                    f"File {upload.filename} is too large. Maximum size is {self.max_file_bytes // (1024 * 1024)}MB.",
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    "file_too_large"
+                )
+            if not self._type_checked:
+                self._head.extend(data[start:min(end, start + SNIFF_BYTES - len(self._head))])
+                if len(self._head) >= SNIFF_BYTES:
+                    self._check_type()
+
+        super().on_part_data(data, start, end)
+
+    def on_part_end(self) -> None:
+        # Files shorter than SNIFF_BYTES are checked once they end
+        if self._current_part.file is not None and not self._type_checked:
+            self._check_type()
+        super().on_part_end()
+
+    def _check_type(self) -> None:
+        self._type_checked = True
+        upload = self._current_part.file
+        mime_type = sniff_image_mime(bytes(self._head))
+        if mime_type not in self.allowed_types:
+            raise UploadRejected(
+                f"File {upload.filename} is not a supported image. Allowed: {self.allowed_types}",
+                status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                "unsupported_type"
+            )
+
+        # The detected type is authoritative; the declared one is whatever the client chose to send
+        if upload.content_type != mime_type:
+            logger.debug(f"Upload {upload.filename} declared as {upload.content_type}, detected {mime_type}")
+            raw_headers = [(k, v) for k, v in self._current_part.item_headers if k != b"content-type"]
+            upload.headers = Headers(raw=raw_headers + [(b"content-type", mime_type.encode("latin-1"))])
+
+
+class BoundedUploadRequest(Request):
+    """Request whose multipart form is parsed with BoundedMultiPartParser using the UPLOAD_* settings."""
+
+    async def _get_form(self, **kwargs) -> FormData:
+        if self._form is None:
+            content_type, _ = parse_options_header(self.headers.get("Content-Type"))
+            if content_type == b"multipart/form-data":
+                parser = BoundedMultiPartParser(
+                    self.headers,
+                    self.stream(),
+                    max_files=settings.UPLOAD_MAX_FILES,
+                    max_part_size=settings.UPLOAD_MAX_FIELD_BYTES,
+                    max_file_bytes=settings.UPLOAD_MAX_FILE_BYTES,
+                    max_total_bytes=settings.UPLOAD_MAX_TOTAL_BYTES,
+                    allowed_types=ALLOWED_IMAGE_TYPES
+                )
+                try:
+                    self._form = await parser.parse()
+                except UploadRejected as e:
+                    logger.warning(f"Rejected upload to {self.url.path}: {e.message}")
+                    UPLOAD_REJECTIONS.labels(reason=e.reason).inc()
+                    raise HTTPException(status_code=e.status_code, detail=e.message)
+                except MultiPartException as e:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.message)
+        return await super()._get_form(**kwargs)
+
+
+class BoundedUploadRoute(APIRoute):
+    """Route class that hands endpoints a BoundedUploadRequest so File/Form parameters are parsed within limits."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original_route_handler = super().get_route_handler()
+
+        async def bounded_route_handler(request: Request) -> Response:
+            return await original_route_handler(BoundedUploadRequest(request.scope, request.receive))
+
+        return bounded_route_handler
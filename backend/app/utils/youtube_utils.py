@@ -2,10 +2,12 @@ import logging
 import os
 import re
 import requests
+import time
 import yt_dlp
 
 from collections import defaultdict
-from typing import Dict, List, Optional, Any
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Any
 from urllib.parse import urlparse, parse_qs
 
 from fastapi import HTTPException
@@ -25,13 +27,10 @@ from youtube_transcript_api import (
 
 import requests.exceptions
 
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-    before_sleep_log
-)
+from app.core.config import settings
+from app.core.metrics import TRANSCRIPT_FETCH_SECONDS
+from app.utils import tracing
+from app.utils.retry_policy import RetryBudget, RetryPolicy
 
 logger = logging.getLogger(__name__)
 ytt_api = YouTubeTranscriptApi()
@@ -69,14 +68,72 @@ RETRYABLE_TRANSCRIPT_EXCEPTIONS = (
     # Add other specific requests exceptions if needed
 )
 
-ytt_api = YouTubeTranscriptApi()
+def is_retryable_transcript_error(exception: BaseException) -> bool:
+    return isinstance(exception, RETRYABLE_TRANSCRIPT_EXCEPTIONS)
+
+# Both fetch layers share one budget so nested retries cannot multiply load on YouTube
+transcript_retry_budget = RetryBudget(
+    name="youtube_transcript",
+    ratio=settings.RETRY_BUDGET_RATIO,
+    max_tokens=settings.RETRY_BUDGET_MAX_TOKENS
+)
+
+fetch_retry_policy = RetryPolicy(
+    name="youtube_transcript_fetch",
+    retryable=is_retryable_transcript_error,
+    max_attempts=5,
+    deadline_seconds=settings.TRANSCRIPT_RETRY_DEADLINE_SECONDS,
+    budget=transcript_retry_budget,
+    log=logger,
+    log_exc_info=True
+)
 
-@retry(
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=1, max=5),
-    retry=retry_if_exception_type(RETRYABLE_TRANSCRIPT_EXCEPTIONS),
-    before_sleep=before_sleep_log(logger, logging.INFO, exc_info=True)
+transcript_retry_policy = RetryPolicy(
+    name="youtube_transcript",
+    retryable=is_retryable_transcript_error,
+    max_attempts=3,
+    deadline_seconds=settings.TRANSCRIPT_RETRY_DEADLINE_SECONDS,
+    budget=transcript_retry_budget,
+    log=logger,
+    log_exc_info=True
 )
+
+ytt_api = YouTubeTranscriptApi()
+
+
+def _fetch_outcome(error: BaseException) -> str:
+    if isinstance(error, TranscriptUnavailableError):
+        return "unavailable"
+    if isinstance(error, VideoIdExtractionError):
+        return "invalid_url"
+    if isinstance(error, ExternalDependencyError):
+        return "external_error"
+    return "error"
+
+
+def timed_fetch(source: str) -> Callable:
+    """Trace a transcript fetch and record how long it took, retries included, and how it ended."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracing.span("youtube.transcript_fetch", source=source) as fetch_span:
+                started_at = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    outcome = _fetch_outcome(e)
+                    fetch_span.set_attribute("outcome", outcome)
+                    TRANSCRIPT_FETCH_SECONDS.labels(source=source, outcome=outcome).observe(time.perf_counter() - started_at)
+                    raise
+                outcome = "success" if result is not None else "not_found"
+                fetch_span.set_attribute("outcome", outcome)
+                TRANSCRIPT_FETCH_SECONDS.labels(source=source, outcome=outcome).observe(time.perf_counter() - started_at)
+                return result
+        return wrapper
+    return decorator
+
+
+@fetch_retry_policy.wraps
 def _fetch_transcript_with_retry(video_id: str, languages: List[str] = ['en']) -> List[Dict[str, Any]]:
     ytt_api = YouTubeTranscriptApi(
         proxy_config=WebshareProxyConfig(
@@ -90,7 +147,8 @@ def _fetch_transcript_with_retry(video_id: str, languages: List[str] = ['en']) -
     """
     logger.debug(f"Attempting to fetch transcript for video ID: {video_id}, languages: {languages}")
     # This call can raise TranscriptsDisabled, NoTranscriptFound, VideoUnavailable, TooManyRequests etc.
-    transcript_list = ytt_api.fetch(video_id, languages=languages)
+    with tracing.span("youtube.transcript_attempt", video_id=video_id):
+        transcript_list = ytt_api.fetch(video_id, languages=languages)
     return transcript_list
 
 def ms_to_timestamp(ms: int) -> str:
@@ -200,12 +258,8 @@ def extract_youtube_video_id(url: str) -> Optional[str]:
     )
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=1, max=5),
-    retry=retry_if_exception_type(RETRYABLE_TRANSCRIPT_EXCEPTIONS),
-    before_sleep=before_sleep_log(logger, logging.INFO, exc_info=True)
-)
+@timed_fetch("ytt_api")
+@transcript_retry_policy.wraps
 def get_transcript_with_ytt_api(youtube_url: str) -> Dict[str, Any]: # Changed Optional[Dict] to Dict, will raise on failure
     """
     Fetches and formats an English transcript for a YouTube video using youtube-transcript-api.
@@ -309,6 +363,7 @@ def format_transcript_ytdlp(json_data):
 
     return transcript_dict
 
+@timed_fetch("ytdlp")
 def get_transcript_with_ytdlp(youtube_url):
     """
     Fetches and formats English subtitles/captions for a given YouTube URL.
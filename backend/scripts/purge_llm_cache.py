@@ -0,0 +1,15 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.llm_cache import PostgresCacheTier
+
+def purge_llm_cache():
+    print("Purging expired LLM response cache entries...")
+    deleted = PostgresCacheTier(SessionLocal, settings.LLM_CACHE_TTL_SECONDS).purge_expired()
+    print(f"Deleted {deleted} expired entries.")
+
+if __name__ == "__main__":
+    purge_llm_cache()
@@ -0,0 +1,41 @@
+import asyncio
+import logging
+import signal
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.api.jobs import job_queue
+from app.api.llm import llm_service
+from app.services.job_worker import JobWorker
+from app.utils.logger import setup_logging
+
+async def run_job_worker():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    worker = JobWorker(
+        queue=job_queue,
+        llm_service=llm_service,
+        batch_size=settings.LLM_JOB_BATCH_SIZE,
+        concurrency=settings.LLM_JOB_CONCURRENCY,
+        poll_seconds=settings.LLM_JOB_POLL_SECONDS,
+        batch_timeout=settings.LLM_JOB_BATCH_TIMEOUT_SECONDS
+    )
+    await worker.run_forever(stop)
+
+if __name__ == "__main__":
+    setup_logging(
+        log_file=settings.LLM_JOB_WORKER_LOG_FILE,
+        level=logging.INFO,
+        json_format=settings.LOG_JSON,
+        max_bytes=settings.LOG_MAX_BYTES,
+        backup_count=settings.LOG_BACKUP_COUNT,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        max_message_chars=settings.LOG_MAX_MESSAGE_CHARS,
+        sample_rates=settings.LOG_SAMPLE_RATES
+    )
+    asyncio.run(run_job_worker())